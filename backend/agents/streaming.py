@@ -0,0 +1,89 @@
+"""Bridge blocking token iterators onto the asyncio event loop.
+
+``llama.cpp`` produces tokens from a plain (blocking) Python generator.
+Iterating it on the event loop stalls every other request, so
+:func:`iterate_in_thread` drives the generator in a worker thread and hands
+items to the async consumer through a bounded buffer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import AsyncGenerator, Callable, Iterable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+async def iterate_in_thread(
+    factory: Callable[[], Iterable[T]], *, maxsize: int = 32
+) -> AsyncGenerator[T, None]:
+    """Asynchronously yield the items produced by ``factory()``.
+
+    Parameters
+    ----------
+    factory:
+        Callable returning the blocking iterable.  It is invoked in the
+        worker thread, so expensive setup (e.g. prompt evaluation) does not
+        block the loop either.
+    maxsize:
+        Maximum number of items buffered ahead of the consumer.  The worker
+        pauses once the buffer is full, providing backpressure.
+
+    Closing the returned generator (or cancelling its consumer) stops the
+    worker after the item it is currently producing and closes the
+    underlying iterator.  The close waits for the worker to exit, so the
+    resource behind the iterator is idle once ``aclose()`` returns.
+    """
+
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Tuple[object, Optional[BaseException]]]" = asyncio.Queue()
+    slots = threading.Semaphore(maxsize)
+    stop = threading.Event()
+
+    def _send(item: object, exc: Optional[BaseException] = None) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, exc))
+        except RuntimeError:  # pragma: no cover - loop already closed
+            pass
+
+    def _produce() -> None:
+        iterator = None
+        error: Optional[BaseException] = None
+        try:
+            iterator = iter(factory())
+            for item in iterator:
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                _send(item)
+        except BaseException as exc:  # forwarded to the consumer
+            error = exc
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            _send(_DONE, error)
+
+    worker = threading.Thread(target=_produce, name="vex-stream", daemon=True)
+    worker.start()
+    finished = False
+    try:
+        while True:
+            item, exc = await queue.get()
+            if item is _DONE:
+                finished = True
+                if exc is not None:
+                    raise exc
+                return
+            slots.release()
+            yield item  # type: ignore[misc]
+    finally:
+        stop.set()
+        while not finished:
+            item, _ = await queue.get()
+            finished = item is _DONE
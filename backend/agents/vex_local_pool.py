@@ -0,0 +1,298 @@
+"""Multi-process pool of local ``llama.cpp`` model instances.
+
+A single API process can only drive one model handle per request and the
+Python parts of token generation compete with request handling for the
+GIL.  :class:`LocalModelPool` starts worker processes that each load the
+model once and stream tokens back over a pipe.  Every worker is exposed as
+a blocking callable with the same call signature as ``llama_cpp.Llama``,
+so the pool's :attr:`~LocalModelPool.instances` can be handed straight to
+the :class:`~backend.agents.vex_scheduler.InferenceScheduler`.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .vex_prefix_cache import PrefixCachedModel, PrefixStateCache
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[str, Optional[int]], Any]
+
+
+def load_llama(model_path: str, n_threads: Optional[int]) -> Any:
+    """Default loader used inside worker processes."""
+
+    from llama_cpp import Llama  # type: ignore
+
+    return Llama(model_path=model_path, n_threads=n_threads)
+
+
+def _worker_main(
+    conn: Any,
+    model_path: str,
+    n_threads: Optional[int],
+    loader: Loader,
+    prefix_cache_bytes: int = 0,
+) -> None:
+    """Entry point of a worker process.
+
+    Protocol (parent -> worker): ``("generate", prompt, stream)``,
+    ``("cancel",)`` while streaming, or ``None`` to exit.  The worker
+    answers with ``("ready", pid)`` once loaded, then ``("result", data)``,
+    a series of ``("chunk", data)`` followed by ``("done", None)``, or
+    ``("error", message)``.
+    """
+
+    try:
+        model = loader(model_path, n_threads)
+    except BaseException as exc:
+        conn.send(("error", repr(exc)))
+        return
+    if prefix_cache_bytes > 0:
+        model = PrefixCachedModel(model, PrefixStateCache(max_bytes=prefix_cache_bytes))
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if request is None:
+            return
+        if request[0] != "generate":
+            continue  # stale cancel for a stream that already finished
+        _, prompt, stream = request
+        try:
+            if not stream:
+                conn.send(("result", model(prompt, stream=False)))
+                continue
+            iterator = model(prompt, stream=True)
+            try:
+                for chunk in iterator:
+                    if conn.poll() and conn.recv()[0] == "cancel":
+                        break
+                    conn.send(("chunk", chunk))
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+            conn.send(("done", None))
+        except Exception as exc:
+            conn.send(("error", repr(exc)))
+
+
+class _WorkerHandle:
+    """Parent-side proxy for one worker process.
+
+    Calls are blocking and, like ``Llama.__call__``, return either the
+    completion dict or an iterator of chunk dicts.  A handle must only be
+    used by one request at a time; the scheduler guarantees this.
+    """
+
+    def __init__(self, pool: "LocalModelPool", index: int) -> None:
+        self._pool = pool
+        self.index = index
+        self.restarts = 0
+        self._process: Optional[multiprocessing.process.BaseProcess] = None
+        self._conn: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self._conn is not None
+            and self._process is not None
+            and self._process.is_alive()
+        )
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process is not None else None
+
+    def start(self) -> None:
+        ctx = self._pool._context
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(
+            target=_worker_main,
+            args=(
+                child_conn,
+                self._pool.model_path,
+                self._pool.n_threads,
+                self._pool.loader,
+                self._pool.prefix_cache_bytes,
+            ),
+            name=f"vex-llama-{self.index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        if not parent_conn.poll(self._pool.load_timeout):
+            process.terminate()
+            raise RuntimeError(f"Local model worker {self.index} did not start in time")
+        kind, value = parent_conn.recv()
+        if kind != "ready":
+            process.join(1)
+            raise RuntimeError(f"Local model worker {self.index} failed to load: {value}")
+        self._process, self._conn = process, parent_conn
+
+    def ensure_alive(self) -> None:
+        """Start the worker, restarting it if it has died."""
+
+        with self._lock:
+            if self.alive:
+                return
+            if self._process is not None:
+                self.restarts += 1
+                logger.warning("Restarting local model worker %d", self.index)
+                self._discard(kill=True)
+            self.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join(timeout)
+            self._discard()
+            self._process = None
+
+    # ------------------------------------------------------------------
+    def __call__(self, prompt: str, stream: bool = False) -> Any:
+        self.ensure_alive()
+        self._conn.send(("generate", prompt, stream))
+        if stream:
+            return self._stream()
+        kind, value = self._recv()
+        if kind != "result":
+            raise RuntimeError(f"Local model worker error: {value}")
+        return value
+
+    def _stream(self) -> Iterator[Dict[str, Any]]:
+        finished = False
+        try:
+            while True:
+                kind, value = self._recv()
+                if kind == "chunk":
+                    yield value
+                    continue
+                finished = True
+                if kind == "error":
+                    raise RuntimeError(f"Local model worker error: {value}")
+                return
+        finally:
+            if not finished:
+                self._cancel()
+
+    def _cancel(self) -> None:
+        """Stop an in-progress stream and wait until the worker is idle."""
+
+        if self._conn is None:
+            return
+        try:
+            self._conn.send(("cancel",))
+            while self._recv()[0] == "chunk":
+                pass
+        except (RuntimeError, OSError):
+            pass  # worker died; it is restarted on next use
+
+    def _recv(self) -> Any:
+        try:
+            return self._conn.recv()
+        except (EOFError, OSError) as exc:
+            self._discard(kill=True)
+            raise RuntimeError(f"Local model worker {self.index} exited") from exc
+
+    def _discard(self, kill: bool = False) -> None:
+        if kill and self._process is not None and self._process.is_alive():
+            self._process.kill()
+            self._process.join(5)
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+
+
+class LocalModelPool:
+    """Supervise worker processes that each hold one model instance.
+
+    Parameters
+    ----------
+    model_path:
+        Path of the model file loaded by every worker.
+    instances:
+        Number of worker processes.
+    n_threads:
+        Threads used by ``llama.cpp`` inside each worker.  ``None`` lets
+        ``llama.cpp`` decide; with several instances it is usually best to
+        split the available cores between them.
+    loader:
+        Picklable callable ``loader(model_path, n_threads)`` returning the
+        model.  Defaults to :func:`load_llama`.
+    load_timeout:
+        Seconds to wait for a worker to finish loading the model.
+    prefix_cache_bytes:
+        Per-worker budget for cached prompt-prefix states; ``0`` disables
+        the cache.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        *,
+        instances: int = 2,
+        n_threads: Optional[int] = None,
+        loader: Loader = load_llama,
+        load_timeout: float = 300.0,
+        prefix_cache_bytes: int = 0,
+    ) -> None:
+        if instances < 1:
+            raise ValueError("LocalModelPool requires at least one instance")
+        self.model_path = model_path
+        self.n_threads = n_threads
+        self.loader = loader
+        self.load_timeout = load_timeout
+        self.prefix_cache_bytes = prefix_cache_bytes
+        self._context = multiprocessing.get_context("spawn")
+        self.instances: List[_WorkerHandle] = [
+            _WorkerHandle(self, i) for i in range(instances)
+        ]
+
+    def start(self) -> None:
+        """Start all workers, blocking until each has loaded the model."""
+
+        for worker in self.instances:
+            worker.ensure_alive()
+
+    def supervise(self) -> int:
+        """Restart dead workers and return how many were restarted."""
+
+        restarted = 0
+        for worker in self.instances:
+            if not worker.alive:
+                worker.ensure_alive()
+                restarted += 1
+        return restarted
+
+    def health(self) -> List[Dict[str, Any]]:
+        """Return liveness, pid and restart count for every worker."""
+
+        return [
+            {"index": w.index, "alive": w.alive, "pid": w.pid, "restarts": w.restarts}
+            for w in self.instances
+        ]
+
+    def close(self) -> None:
+        """Stop all workers."""
+
+        for worker in self.instances:
+            worker.stop()
@@ -1,17 +1,33 @@
 """Memory management utilities for VEX agents.
 
-The real project is expected to integrate a proper vector database for
-Retrieval Augmented Generation (RAG).  For demonstration purposes this
-module stores memories in a simple list and performs extremely naive
-substring matching.
+Memories are searched semantically through a vector database when an
+embedder and vector store are configured (Retrieval Augmented Generation).
+Without them, or when they fail, a bounded in-memory BM25 keyword index
+is used instead.
+
+Memories can be scoped to a session: each session gets its own vector
+store collection and keyword index, so retrieval only ranks that
+session's memories.  Sessions idle for longer than ``session_ttl`` are
+expired and their memories deleted.  Session collections left in a
+persistent vector store by an earlier run are picked up by
+:meth:`VexMemoryManager.restore_sessions` and expire the same way unless
+their session is used again.
 """
 
 from __future__ import annotations
 
-from typing import List, Optional
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 from uuid import uuid4
 
-from ..memory import Embedder, VectorStoreClient
+from .. import metrics
+from ..memory import Embedder, KeywordIndex, MemoryIngestQueue, VectorStoreClient
+
+logger = logging.getLogger(__name__)
 
 
 class VexMemoryManager:
@@ -24,57 +40,298 @@ class VexMemoryManager:
         of memories.
     vector_store:
         Optional vector store client used for semantic search.  When not
-        provided the manager falls back to a simple in-memory list and
-        naive substring matching.
+        provided the manager falls back to keyword search.
+    ingest_queue:
+        Optional write-behind queue.  When provided, memories are handed to
+        it and embedded and stored in batches in the background instead of
+        one write per call.  Memories that do not fit into its full buffer
+        are only kept in the keyword index.
+    max_memories:
+        Capacity of each keyword index; the oldest memories are evicted
+        once it is full.
+    session_ttl:
+        Seconds after which an idle session and its memories are deleted.
+        ``None`` or ``0`` keeps sessions forever.
     """
 
+    #: Vector store collection holding the memories.
+    COLLECTION = "memories"
+
     def __init__(
         self,
         *,
         embedder: Optional[Embedder] = None,
         vector_store: Optional[VectorStoreClient] = None,
+        ingest_queue: Optional[MemoryIngestQueue] = None,
+        max_memories: int = 10_000,
+        session_ttl: Optional[float] = None,
     ) -> None:
-        self._store: List[str] = []
+        #: Keyword index of memories stored without a session.
+        self.keyword_index = KeywordIndex(max_documents=max_memories)
+        self.max_memories = max_memories
+        self.session_ttl = session_ttl
+        self.expired_sessions = 0
         self._embedder = embedder
         self._vector_store = vector_store
-        self._collection = "memories"
+        self._ingest_queue = ingest_queue
+        self._pending: Set[asyncio.Task] = set()
+        self._session_indexes: Dict[str, KeywordIndex] = {}
+        self._last_seen: Dict[str, float] = {}
+        # Session collections found in the store whose session id is
+        # unknown (collection names are hashed), keyed by collection.
+        self._orphans: Dict[str, float] = {}
+        self._last_sweep = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Sessions
+    # ------------------------------------------------------------------
+    @classmethod
+    def collection_for(cls, session_id: Optional[str]) -> str:
+        """Return the vector store collection used for ``session_id``.
+
+        Session ids are sanitised to characters every backend accepts and
+        suffixed with a short hash so that distinct ids never collide.
+        """
+
+        if not session_id:
+            return cls.COLLECTION
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:32]
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:10]
+        return f"{cls.COLLECTION}_{safe}_{digest}"
+
+    @property
+    def sessions(self) -> List[str]:
+        """Ids of the sessions currently holding memories."""
+
+        return list(self._last_seen)
+
+    @property
+    def semantic(self) -> bool:
+        """Whether memories are embedded and kept in the vector store.
+
+        Turns ``False`` when the embedding model failed to load, leaving
+        the keyword index as the only memory.
+        """
+
+        return (
+            self._embedder is not None
+            and self._vector_store is not None
+            and self._embedder.available
+        )
 
-    async def add_memory(self, content: str) -> None:
+    def _keywords(self, session_id: Optional[str]) -> KeywordIndex:
+        if not session_id:
+            return self.keyword_index
+        index = self._session_indexes.get(session_id)
+        if index is None:
+            index = self._session_indexes[session_id] = KeywordIndex(
+                max_documents=self.max_memories
+            )
+        return index
+
+    def _touch(self, session_id: Optional[str]) -> None:
+        now = time.monotonic()
+        if session_id:
+            self._last_seen[session_id] = now
+            if self._orphans:
+                self._orphans.pop(self.collection_for(session_id), None)
+        if self.session_ttl and now - self._last_sweep >= self.session_ttl / 4:
+            self._last_sweep = now
+            self._track(asyncio.get_running_loop().create_task(self.expire_sessions(now)))
+
+    async def restore_sessions(self) -> int:
+        """Track session collections persisted by an earlier run.
+
+        Session activity is only known in memory, so after a restart the
+        collections of earlier sessions would never expire.  Each one found
+        in the vector store is treated as seen now: it is deleted after
+        :attr:`session_ttl` unless its session is used again.  Returns the
+        number of collections picked up.
+        """
+
+        if not self.session_ttl or self._vector_store is None:
+            return 0
+        prefix = f"{self.COLLECTION}_"
+        known = {self.collection_for(session_id) for session_id in self._last_seen}
+        now = time.monotonic()
+        found = 0
+        for collection in await self._vector_store.list_collections():
+            if collection.startswith(prefix) and collection not in known:
+                self._orphans.setdefault(collection, now)
+                found += 1
+        return found
+
+    async def expire_sessions(self, now: Optional[float] = None) -> List[str]:
+        """Delete sessions idle for longer than :attr:`session_ttl`.
+
+        Returns the expired session ids.  Their keyword indexes are dropped
+        and their vector store collections deleted, as are collections
+        from :meth:`restore_sessions` that were not used again.
+        """
+
+        if not self.session_ttl:
+            return []
+        now = time.monotonic() if now is None else now
+        expired = [
+            session_id
+            for session_id, seen in self._last_seen.items()
+            if now - seen > self.session_ttl
+        ]
+        for session_id in expired:
+            await self.delete_session(session_id)
+        orphans = [
+            collection
+            for collection, seen in self._orphans.items()
+            if now - seen > self.session_ttl
+        ]
+        for collection in orphans:
+            self._orphans.pop(collection, None)
+            await self._delete_collection(collection)
+        self.expired_sessions += len(expired) + len(orphans)
+        return expired
+
+    async def delete_session(self, session_id: str) -> None:
+        """Forget all memories of ``session_id``.
+
+        Memories of the session still waiting in the ingest queue are
+        dropped so that they cannot re-create its collection.
+        """
+
+        self._last_seen.pop(session_id, None)
+        self._session_indexes.pop(session_id, None)
+        await self._delete_collection(self.collection_for(session_id))
+
+    async def _delete_collection(self, collection: str) -> None:
+        if self._ingest_queue is not None:
+            self._ingest_queue.discard(collection)
+        if self._vector_store is not None:
+            try:
+                await self._vector_store.delete_collection(collection)
+            except Exception as exc:
+                logger.warning("Could not delete collection %r: %s", collection, exc)
+
+    # ------------------------------------------------------------------
+    # Memories
+    # ------------------------------------------------------------------
+    async def add_memory(self, content: str, *, session_id: Optional[str] = None) -> None:
         """Persist a piece of ``content`` for later retrieval."""
 
-        self._store.append(content)
+        await self.add_memories([content], session_id=session_id)
+
+    async def add_memories(
+        self, contents: Sequence[str], *, session_id: Optional[str] = None
+    ) -> None:
+        """Persist several pieces of content with one embed and one write."""
+
+        contents = list(contents)
+        if not contents:
+            return
+        self._touch(session_id)
+        index = self._keywords(session_id)
+        for content in contents:
+            index.add(content)
+
+        if not self.semantic:
+            return
+        collection = self.collection_for(session_id)
+        if self._ingest_queue is not None:
+            # Never wait for buffer space: a full buffer drops the vector
+            # copy (the keyword index has it) instead of parking the task.
+            self._ingest_queue.offer_many(collection, contents)
+            return
 
         if self._embedder and self._vector_store:
             try:
-                vector = await self._embedder.embed(content)
-                await self._vector_store.add_vectors(
-                    self._collection,
-                    ids=[str(uuid4())],
-                    vectors=[vector],
-                    metadatas=[{"text": content}],
-                )
+                with metrics.MEMORY_WRITE_SECONDS.time():
+                    vectors = await self._embedder.embed_many(contents)
+                    await self._vector_store.add_vectors(
+                        collection,
+                        ids=[str(uuid4()) for _ in contents],
+                        vectors=vectors,
+                        metadatas=[{"text": content} for content in contents],
+                    )
             except Exception:
                 # Optional dependency may not be available or storage may fail.
                 pass
 
-    async def search(self, query: str, top_k: int = 5) -> List[str]:
+    def schedule_memories(
+        self, contents: Sequence[str], *, session_id: Optional[str] = None
+    ) -> asyncio.Task:
+        """Persist ``contents`` in a background task off the response path."""
+
+        return self._track(
+            asyncio.get_running_loop().create_task(
+                self.add_memories(contents, session_id=session_id)
+            )
+        )
+
+    def _track(self, task: asyncio.Task) -> asyncio.Task:
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def flush(self) -> None:
+        """Wait for all scheduled background writes to finish."""
+
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+        if self._ingest_queue is not None:
+            await self._ingest_queue.flush()
+
+    async def aclose(self) -> None:
+        """Flush outstanding writes and stop background workers."""
+
+        await self.flush()
+        if self._ingest_queue is not None:
+            await self._ingest_queue.aclose()
+
+    async def search(
+        self, query: str, top_k: int = 5, *, session_id: Optional[str] = None
+    ) -> List[str]:
         """Return up to ``top_k`` memories roughly matching ``query``.
 
         If an embedding model and vector store are configured, semantic
-        search is performed.  Otherwise a naive substring match against
-        the in-memory list is used.
+        search is performed.  Otherwise the keyword index is used.
         """
 
-        if self._embedder and self._vector_store:
+        results = await self.search_many([query], top_k=top_k, session_id=session_id)
+        return [text for text, _ in results[0]]
+
+    async def search_many(
+        self,
+        queries: Sequence[str],
+        top_k: int = 5,
+        *,
+        session_id: Optional[str] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Search for several queries at once.
+
+        All queries are embedded together and sent to the vector store in a
+        single call.  Returns one list of ``(memory, score)`` pairs per
+        query, best match first.  With ``session_id`` only that session's
+        memories are searched.
+        """
+
+        queries = list(queries)
+        if not queries:
+            return []
+        self._touch(session_id)
+
+        if self.semantic:
             try:
-                vector = await self._embedder.embed(query)
-                results = await self._vector_store.query(
-                    self._collection, vector, n_results=top_k
+                vectors = await self._embedder.embed_many(queries)  # type: ignore[union-attr]
+                results = await self._vector_store.query_many(
+                    self.collection_for(session_id), vectors, n_results=top_k
                 )
-                return [meta.get("text", "") for _, _, meta in results]
+                metrics.MEMORY_SEARCHES.inc(len(queries), index="vector")
+                return [
+                    [(meta.get("text", ""), score) for _, score, meta in hits]
+                    for hits in results
+                ]
             except Exception:
-                # Fall back to simple substring search on failure.
+                # Fall back to keyword search on failure.
                 pass
 
-        results = [m for m in self._store if query.lower() in m.lower()]
-        return results[:top_k]
+        index = self._keywords(session_id)
+        metrics.MEMORY_SEARCHES.inc(len(queries), index="keyword")
+        return [index.search(query, top_k) for query in queries]
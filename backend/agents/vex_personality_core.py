@@ -5,10 +5,15 @@ The :class:`VexPersonalityCore` can operate in two modes:
 ``local``
     Utilises the ``llama.cpp`` bindings for on-device inference.  This
     requires the ``llama_cpp`` package and a path to a compiled model.
+    Both are only loaded on first use or by :meth:`~VexPersonalityCore.load_local_model`.
 ``remote``
     Sends the prompt to an HTTP endpoint (for example OpenRouter or
-    OpenAI).  The exact API contract is intentionally tiny so that it can
-    be adapted to many providers.
+    OpenAI).  The request is intentionally tiny (``prompt`` and
+    ``stream``); responses in the OpenAI, Anthropic or Ollama formats,
+    streamed as SSE or NDJSON, are decoded by
+    :mod:`~backend.agents.vex_remote_stream`.  Several endpoints can be
+    configured; :mod:`~backend.agents.vex_remote_endpoints` routes each
+    request to the fastest healthy one and optionally hedges slow ones.
 
 Both modes support optional streaming where tokens are yielded one by
 one.  The public interface is purposely lightweight so that higher level
@@ -18,15 +23,117 @@ components such as the router can remain agnostic of the transport layer.
 from __future__ import annotations
 
 import asyncio
-from typing import AsyncGenerator, List, Optional
-
-try:  # pragma: no cover - optional dependency
-    from llama_cpp import Llama  # type: ignore
-except Exception:  # pragma: no cover - not installed
-    Llama = None  # type: ignore
+import contextlib
+import importlib.util
+import logging
+import threading
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Optional, Sequence
 
 import httpx
+from .. import metrics
 from ..api.config import get_runtime_config
+from .streaming import iterate_in_thread
+from .vex_local_pool import LocalModelPool
+from .vex_prefix_cache import PrefixCachedModel, PrefixStateCache
+from .vex_prompt_packer import (
+    Memory,
+    PackedPrompt,
+    TokenCounter,
+    heuristic_token_count,
+    pack_prompt,
+)
+from .vex_remote_endpoints import Attempt, RemoteEndpoint, RemoteEndpointPool, hedged
+from .vex_remote_stream import extract_completion, iter_deltas
+from .vex_scheduler import InferenceScheduler, Lease, SchedulerOverloaded
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_client(
+    *,
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 30.0,
+    http2: bool = False,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 60.0,
+) -> httpx.AsyncClient:
+    """Return a pooled :class:`httpx.AsyncClient` for remote generation.
+
+    The client keeps connections alive between completions so that TCP and
+    TLS handshakes are paid once per connection rather than once per call.
+    HTTP/2 is only enabled when the optional ``h2`` package is installed.
+    """
+
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        connect=connect_timeout,
+        read=read_timeout,
+        write=read_timeout,
+        pool=connect_timeout,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+class _LazyModel:
+    """Model handle that loads the real model when it is first used.
+
+    Calls are made from worker threads, so the blocking load never runs on
+    the event loop.
+    """
+
+    def __init__(self, load: Callable[[], Any]) -> None:
+        self._load = load
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self._load()(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == "_load":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._load(), name, value)
+
+
+class _LeasedStream:
+    """Token stream holding a scheduler lease from before its first token.
+
+    ``tokens`` releases ``lease`` once it has started; if the stream is
+    closed or dropped before that, the lease is released here instead
+    (an async generator that never ran skips its ``finally`` blocks).
+    """
+
+    def __init__(self, tokens: AsyncGenerator[str, None], lease: Lease) -> None:
+        self._tokens = tokens
+        self._lease = lease
+        self._started = False
+
+    def __aiter__(self) -> "_LeasedStream":
+        return self
+
+    async def __anext__(self) -> str:
+        self._started = True
+        return await self._tokens.__anext__()
+
+    async def aclose(self) -> None:
+        if not self._started:
+            self._lease.release()
+        await self._tokens.aclose()
+
+    def __del__(self) -> None:
+        if not self._started:
+            self._lease.release()
 
 
 class VexPersonalityCore:
@@ -40,28 +147,103 @@ class VexPersonalityCore:
         remote_url: Optional[str] = None,
         api_key: Optional[str] = None,
         use_remote: bool = False,
+        http_client: Optional[httpx.AsyncClient] = None,
+        first_token_timeout: float = 30.0,
+        total_timeout: float = 120.0,
+        stream_buffer_size: int = 32,
+        max_queue: int = 16,
+        queue_timeout: Optional[float] = None,
+        failover_to_remote: bool = False,
+        local_pool: Optional[LocalModelPool] = None,
+        prefix_cache_bytes: int = 0,
+        context_budget: Optional[int] = None,
+        token_counter: Optional[TokenCounter] = None,
+        endpoints: Optional[RemoteEndpointPool] = None,
     ) -> None:
         self.system_prompt = system_prompt
         self.local_model_path = local_model_path
         self.remote_url = remote_url
         self.api_key = api_key
         self.use_remote = use_remote
+        self.first_token_timeout = first_token_timeout
+        self.total_timeout = total_timeout
+        self.stream_buffer_size = stream_buffer_size
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.failover_to_remote = failover_to_remote
+        # Token budget for prompts (``None`` disables packing limits) and
+        # an optional tokenizer-backed counter used to enforce it.
+        self.context_budget = context_budget
+        self._token_counter = token_counter
+        # Remote endpoints with latency tracking, hedging and circuit
+        # breaking.  Without an explicit pool :attr:`remote_url` is used.
+        self._endpoints = endpoints
+        self._owns_endpoints = endpoints is None
+
+        # A client passed in is owned by the caller (usually the application
+        # lifespan); otherwise one is created lazily and closed by ``aclose``.
+        self._http_client = http_client
+        self._owns_http_client = http_client is None
 
-        self._llama: Optional[Llama] = None
-        if local_model_path and Llama is not None:
-            # ``Llama`` is blocking; we keep a handle for ``asyncio.to_thread``
-            self._llama = Llama(model_path=local_model_path)
+        # With a worker-process pool the model is loaded by the workers and
+        # never in the API process itself.
+        self.local_pool = local_pool
+        # ``Llama`` is blocking; the handle is used via ``asyncio.to_thread``.
+        # Importing ``llama_cpp`` and loading the weights is deferred until
+        # the model is first needed (see :meth:`load_local_model`).
+        self._llama: Any = None
+        self._llama_lock = threading.Lock()
+        # Why the in-process model failed to load, if it did.
+        self.local_model_error: Optional[BaseException] = None
+        self._lazy_llama = bool(
+            local_model_path
+            and local_pool is None
+            and importlib.util.find_spec("llama_cpp") is not None
+        )
+        self._scheduler: Optional[InferenceScheduler] = None
+        # Streams closed by the consumer before the model finished.
+        self.cancelled_streams = 0
+        # Snapshots of the model state after shared prompt prefixes; only
+        # used for the in-process model (pool workers keep their own).
+        self.prefix_cache: Optional[PrefixStateCache] = None
+        if prefix_cache_bytes > 0:
+            self.prefix_cache = PrefixStateCache(max_bytes=prefix_cache_bytes)
 
     # ------------------------------------------------------------------
     # Prompt assembly helpers
     # ------------------------------------------------------------------
-    def build_prompt(self, user_message: str, context: Optional[List[str]] = None) -> str:
+    def build_prompt(self, user_message: str, context: Optional[Sequence[Memory]] = None) -> str:
         """Construct the textual prompt from user input and memory."""
-        parts = [self.system_prompt]
-        if context:
-            parts.append("\n".join(context))
-        parts.append(user_message)
-        return "\n\n".join(parts)
+        return self.pack_prompt(user_message, context).text
+
+    def pack_prompt(
+        self, user_message: str, context: Optional[Sequence[Memory]] = None
+    ) -> PackedPrompt:
+        """Build the prompt within :attr:`context_budget` tokens.
+
+        ``context`` holds retrieved memories, as strings in relevance order
+        or ``(text, score)`` pairs.  See :func:`~.vex_prompt_packer.pack_prompt`.
+        """
+        return pack_prompt(
+            self.system_prompt,
+            user_message,
+            context,
+            max_tokens=self.context_budget or None,
+            count_tokens=self.count_tokens,
+        )
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the local model's tokenizer when available.
+
+        Falls back to a character-based estimate when the model lives in
+        worker processes or only a remote model is configured.
+        """
+        if self._token_counter is not None:
+            return self._token_counter(text)
+        tokenize = getattr(self._llama, "tokenize", None)
+        if tokenize is not None and text:
+            return len(tokenize(text.encode("utf-8"), add_bos=False, special=True))
+        return heuristic_token_count(text)
 
     # ------------------------------------------------------------------
     # Model selection utilities
@@ -70,64 +252,389 @@ class VexPersonalityCore:
         """Switch between local and remote model usage."""
         self.use_remote = use_remote
 
+    # ------------------------------------------------------------------
+    # Resource management
+    # ------------------------------------------------------------------
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Return the pooled HTTP client used for remote generation."""
+        if self._http_client is None:
+            self._http_client = create_http_client()
+        return self._http_client
+
+    @property
+    def endpoints(self) -> RemoteEndpointPool:
+        """Pool of remote endpoints used for remote generation."""
+        if self._owns_endpoints:
+            urls = [self.remote_url] if self.remote_url else []
+            if self._endpoints is None or self._endpoints.urls != urls:
+                self._endpoints = RemoteEndpointPool(urls)
+        return self._endpoints  # type: ignore[return-value]
+
+    @property
+    def has_local_model(self) -> bool:
+        return (
+            self.local_pool is not None
+            or self._llama is not None
+            or (self._lazy_llama and self.local_model_error is None)
+        )
+
+    @property
+    def local_model_loaded(self) -> bool:
+        """Whether a local model is ready without loading anything first."""
+        return self.local_pool is not None or self._llama is not None
+
+    def load_local_model(self) -> Any:
+        """Load the in-process local model if needed and return it.
+
+        Blocking and thread-safe; returns ``None`` when no in-process model
+        is configured.  A failed load is remembered in
+        :attr:`local_model_error` and not retried; the core then no longer
+        reports a local model.
+        """
+        if self._llama is None and self._lazy_llama:
+            with self._llama_lock:
+                if self._llama is None and self.local_model_error is None:
+                    try:
+                        from llama_cpp import Llama  # type: ignore
+
+                        self._llama = Llama(model_path=self.local_model_path)
+                    except Exception as exc:
+                        logger.warning("Local model unavailable: %s", exc)
+                        self.local_model_error = exc
+                if self._llama is None:
+                    raise RuntimeError(
+                        f"Local model failed to load: {self.local_model_error}"
+                    ) from self.local_model_error
+        return self._llama
+
+    @property
+    def scheduler(self) -> Optional[InferenceScheduler]:
+        """Scheduler serialising access to the local model(s), if any."""
+        if self._scheduler is None and self.has_local_model:
+            if self.local_pool is not None:
+                instances = list(self.local_pool.instances)
+            else:
+                model = self._llama
+                if model is None:
+                    model = _LazyModel(self.load_local_model)
+                if self.prefix_cache is not None:
+                    model = PrefixCachedModel(model, self.prefix_cache)
+                instances = [model]
+            self._scheduler = InferenceScheduler(instances, max_queue=self.max_queue)
+        return self._scheduler
+
+    async def aclose(self) -> None:
+        """Close resources created by this core."""
+        if self._owns_http_client and self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
     # ------------------------------------------------------------------
     # Generation
     # ------------------------------------------------------------------
     async def generate_response(
-        self, prompt: str, *, stream: bool = False
+        self,
+        prompt: str,
+        *,
+        stream: bool = False,
+        use_remote: Optional[bool] = None,
+        priority: int = 0,
+        timeout: Optional[float] = None,
+        metadata: Optional[Dict[str, Any]] = None,
     ) -> AsyncGenerator[str, None] | str:
         """Return a completion for ``prompt``.
 
         When ``stream`` is ``True`` an asynchronous generator yielding
         tokens is returned, otherwise the complete string is produced.
+        ``use_remote`` overrides :attr:`use_remote` for this call only,
+        allowing a single core to be shared by requests in different modes.
+
+        Local requests are queued by the :attr:`scheduler` using
+        ``priority`` (lower runs first) and ``timeout``, the number of
+        seconds the request may wait for the model (defaults to
+        :attr:`queue_timeout`).  Requests that cannot be served in time
+        raise :class:`SchedulerOverloaded`, or are sent to the remote
+        endpoint when :attr:`failover_to_remote` is enabled.
+
+        If ``metadata`` is given it is filled with ``source`` (``"local"``
+        or ``"remote"``), the remote ``endpoint`` that answered and, once the
+        model reports them, ``finish_reason`` and ``usage``.  For streams
+        these are set when the stream ends.
         """
 
-        if not self.use_remote and self._llama is not None:
-            return await self._generate_local(prompt, stream=stream)
-        return await self._generate_remote(prompt, stream=stream)
+        remote = self.use_remote if use_remote is None else use_remote
+        if metadata is None:
+            metadata = {}
+        local = not remote and self.has_local_model
+        source = "local" if local else "remote"
+        if stream:
+            result = await self._dispatch(prompt, local, True, priority, timeout, metadata)
+            return self._track_cancellation(result, source)  # type: ignore[arg-type]
+        with metrics.GENERATIONS_IN_FLIGHT.track_inprogress(source=source):
+            return await self._dispatch(prompt, local, False, priority, timeout, metadata)
+
+    async def _dispatch(
+        self,
+        prompt: str,
+        local: bool,
+        stream: bool,
+        priority: int,
+        timeout: Optional[float],
+        metadata: Dict[str, Any],
+    ) -> AsyncGenerator[str, None] | str:
+        if not local:
+            return await self._generate_remote(prompt, stream=stream, metadata=metadata)
+        if timeout is None:
+            timeout = self.queue_timeout
+        try:
+            self.scheduler.check_admission(timeout)  # type: ignore[union-attr]
+        except SchedulerOverloaded:
+            if not self._can_failover():
+                raise
+            return await self._generate_remote(prompt, stream=stream, metadata=metadata)
+        return await self._generate_local(
+            prompt, stream=stream, priority=priority, timeout=timeout, metadata=metadata
+        )
+
+    async def _track_cancellation(
+        self, tokens: AsyncGenerator[str, None], source: str = "local"
+    ) -> AsyncGenerator[str, None]:
+        """Count streams abandoned by their consumer and close them promptly."""
+        metrics.GENERATIONS_IN_FLIGHT.inc(source=source)
+        try:
+            async for token in tokens:
+                yield token
+        except (GeneratorExit, asyncio.CancelledError):
+            self.cancelled_streams += 1
+            raise
+        finally:
+            metrics.GENERATIONS_IN_FLIGHT.dec(source=source)
+            await tokens.aclose()
+
+    def _can_failover(self) -> bool:
+        return self.failover_to_remote and bool(self.endpoints.ranked())
+
+    async def _acquire_local(self, priority: int, timeout: Optional[float]) -> Optional[Lease]:
+        """Return a lease on a local instance, or ``None`` to fail over."""
+        try:
+            return await self.scheduler.acquire(  # type: ignore[union-attr]
+                priority=priority, timeout=timeout
+            )
+        except SchedulerOverloaded:
+            if not self._can_failover():
+                raise
+            return None
 
     async def _generate_local(
-        self, prompt: str, *, stream: bool = False
+        self,
+        prompt: str,
+        *,
+        stream: bool = False,
+        priority: int = 0,
+        timeout: Optional[float] = None,
+        metadata: Optional[Dict[str, Any]] = None,
     ) -> AsyncGenerator[str, None] | str:
-        if self._llama is None:
+        if not self.has_local_model:
             raise RuntimeError("Local model not available")
-
-        def _call_llama() -> dict:
-            return self._llama(prompt, stream=stream)  # type: ignore
+        if metadata is None:
+            metadata = {}
 
         if not stream:
-            result = await asyncio.to_thread(_call_llama)
+            lease = await self._acquire_local(priority, timeout)
+            if lease is None:
+                return await self._generate_remote(prompt, stream=False, metadata=metadata)
+            # The worker thread cannot be interrupted, so the lease is only
+            # released once it finished, even if this request is cancelled;
+            # otherwise a second call could reach the same instance.
+            call = asyncio.ensure_future(
+                asyncio.to_thread(lease.instance, prompt, stream=False)
+            )
+            call.add_done_callback(lambda f: (lease.release(), f.cancelled() or f.exception()))
+            result = await asyncio.shield(call)
+            metadata["source"] = "local"
+            metadata["finish_reason"] = result["choices"][0].get("finish_reason")
+            metadata["usage"] = result.get("usage")
             return result["choices"][0]["text"]
 
+        # The model instance is acquired before the stream is returned, so a
+        # request shed while queued fails before any response is started.
+        lease = await self._acquire_local(priority, timeout)
+        if lease is None:
+            return await self._generate_remote(prompt, stream=True, metadata=metadata)
+
         async def _streamer() -> AsyncGenerator[str, None]:
-            iterator = await asyncio.to_thread(_call_llama)
-            text_key = "text"
-            for chunk in iterator:
-                yield chunk["choices"][0][text_key]
+            metadata["source"] = "local"
 
-        return _streamer()
+            # Token decoding happens in a worker thread; the event loop only
+            # receives finished chunks so other clients keep being served.
+            chunks = iterate_in_thread(
+                lambda: lease.instance(prompt, stream=True),
+                maxsize=self.stream_buffer_size,
+            )
+            try:
+                async for chunk in chunks:
+                    choice = chunk["choices"][0]
+                    if choice.get("finish_reason"):
+                        metadata["finish_reason"] = choice["finish_reason"]
+                    yield choice["text"]
+            finally:
+                await chunks.aclose()
+                lease.release()
+
+        return _LeasedStream(_streamer(), lease)
 
     async def _generate_remote(
-        self, prompt: str, *, stream: bool = False
+        self,
+        prompt: str,
+        *,
+        stream: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
     ) -> AsyncGenerator[str, None] | str:
-        if not self.remote_url:
+        pool = self.endpoints
+        if not pool:
             raise RuntimeError("No remote URL configured")
+        if metadata is None:
+            metadata = {}
+        metadata["source"] = "remote"
 
         cfg = get_runtime_config()
         api_key = self.api_key or cfg.get("openrouter_api_key") or cfg.get("anthropic_api_key")
         headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
 
+        client = self.http_client
+        payload = {"prompt": prompt, "stream": stream}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.total_timeout
+
         if not stream:
-            async with httpx.AsyncClient(headers=headers, timeout=60.0) as client:
-                response = await client.post(self.remote_url, json={"prompt": prompt})
+
+            async def _post(url: str):
+                response = await client.post(url, json=payload, headers=headers)
                 response.raise_for_status()
-                data = response.json()
-                return data.get("text", "")
+                return extract_completion(response.json())
+
+            def _start_post(endpoint: RemoteEndpoint) -> Attempt:
+                # The deadline is applied per attempt so that a hanging
+                # endpoint counts as a failure for its circuit breaker.
+                task = asyncio.ensure_future(
+                    asyncio.wait_for(_post(endpoint.url), max(deadline - loop.time(), 0))
+                )
+                return Attempt(endpoint, task, _noop)
+
+            attempt, (text, finish, usage) = await hedged(pool, _start_post, kind="complete")
+            metadata.update(finish_reason=finish, usage=usage, endpoint=attempt.endpoint.url)
+            return text
+
+        def _start_stream(endpoint: RemoteEndpoint) -> Attempt:
+            # Each attempt runs in its own task and hands tokens over through
+            # a bounded queue, so losing hedges can be cancelled cleanly.
+            info: Dict[str, Any] = {}
+            first: "asyncio.Future[Optional[str]]" = loop.create_future()
+            queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=self.stream_buffer_size)
+
+            async def _pump() -> None:
+                tokens = _with_deadlines(
+                    self._remote_tokens(client, endpoint.url, payload, headers, info),
+                    deadline,
+                    self.first_token_timeout,
+                )
+                try:
+                    async for token in tokens:
+                        if not first.done():
+                            first.set_result(token)
+                        else:
+                            await queue.put(token)
+                    if not first.done():
+                        first.set_result(None)  # empty but successful stream
+                    await queue.put(_END)
+                except Exception as exc:
+                    if not first.done():
+                        first.set_exception(exc)
+                    else:
+                        await queue.put(exc)
+                finally:
+                    await tokens.aclose()
+
+            task = asyncio.ensure_future(_pump())
+
+            async def _close() -> None:
+                task.cancel()
+                with contextlib.suppress(BaseException):
+                    await task
+
+            return Attempt(endpoint, first, _close, (queue, info))
 
         async def _streamer() -> AsyncGenerator[str, None]:
-            async with httpx.AsyncClient(headers=headers, timeout=60.0) as client:
-                async with client.stream("POST", self.remote_url, json={"prompt": prompt}) as resp:
-                    async for chunk in resp.aiter_text():
-                        yield chunk
+            attempt, token = await hedged(pool, _start_stream, kind="stream")
+            queue, info = attempt.state
+            metadata["endpoint"] = attempt.endpoint.url
+            try:
+                if token is None:
+                    return
+                yield token
+                while True:
+                    item = await queue.get()
+                    if item is _END:
+                        break
+                    if isinstance(item, BaseException):
+                        attempt.endpoint.record_failure()
+                        raise item
+                    yield item
+            finally:
+                metadata.update(info)
+                await attempt.close()
 
         return _streamer()
+
+    async def _remote_tokens(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        info: Dict[str, Any],
+    ) -> AsyncGenerator[str, None]:
+        """Stream the text of one remote completion, recording metadata."""
+        async with client.stream("POST", url, json=payload, headers=headers) as resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get("content-type", "")
+            # Metadata-only events (usage, keep-alive pings) are consumed
+            # here so the deadlines apply to real tokens.
+            async for delta in iter_deltas(resp.aiter_text(), content_type):
+                if delta.finish_reason:
+                    info["finish_reason"] = delta.finish_reason
+                if delta.usage:
+                    info["usage"] = {**(info.get("usage") or {}), **delta.usage}
+                if delta.text:
+                    yield delta.text
+
+
+_END = object()
+
+
+async def _noop() -> None:
+    return None
+
+
+async def _with_deadlines(
+    chunks: AsyncIterator[str], deadline: float, first_timeout: float
+) -> AsyncGenerator[str, None]:
+    """Yield from ``chunks`` enforcing first-chunk and overall deadlines.
+
+    ``deadline`` is an absolute :meth:`loop.time` value; ``first_timeout``
+    bounds the wait for the first chunk only.  :class:`TimeoutError` is
+    raised when either limit is exceeded.
+    """
+
+    loop = asyncio.get_running_loop()
+    first = True
+    while True:
+        remaining = deadline - loop.time()
+        timeout = min(remaining, first_timeout) if first else remaining
+        try:
+            chunk = await asyncio.wait_for(chunks.__anext__(), max(timeout, 0))
+        except StopAsyncIteration:
+            return
+        first = False
+        yield chunk
@@ -0,0 +1,180 @@
+"""Reuse ``llama.cpp`` state for prompts that share a prefix.
+
+Every prompt produced by :meth:`VexPersonalityCore.build_prompt` starts with
+the same system prompt and often with the same retrieved context.  The
+:class:`PrefixStateCache` keeps snapshots of the model state taken right
+after such prefixes; :class:`PrefixCachedModel` restores the longest
+matching snapshot before a call so ``llama.cpp`` only evaluates the tokens
+that follow it.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+PROMPT_SEPARATOR = "\n\n"
+
+
+def default_boundaries(prompt: str) -> List[str]:
+    """Return the cacheable prefixes of a prompt built by ``build_prompt``.
+
+    Prompts are segments joined by :data:`PROMPT_SEPARATOR` with the user
+    message last.  The first segment (the system prompt) and everything
+    before the user message (system prompt plus context) are returned.
+    """
+
+    segments = prompt.split(PROMPT_SEPARATOR)
+    if len(segments) < 2:
+        return []
+    prefixes = [segments[0] + PROMPT_SEPARATOR]
+    if len(segments) > 2:
+        prefixes.append(PROMPT_SEPARATOR.join(segments[:-1]) + PROMPT_SEPARATOR)
+    return prefixes
+
+
+def _common_prefix(a: Sequence[int], b: Sequence[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _state_size(state: Any) -> int:
+    size = getattr(state, "llama_state_size", None)
+    if size is None:
+        size = len(getattr(state, "llama_state", b""))
+    return int(size)
+
+
+class PrefixStateCache:
+    """Byte-bounded LRU of model states keyed by prefix tokens."""
+
+    def __init__(self, *, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.prefill_tokens = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[Tuple[int, ...], Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, tokens: Sequence[int]) -> Tuple[int, Optional[Any]]:
+        """Return ``(length, state)`` of the longest cached prefix of ``tokens``."""
+
+        best: Tuple[int, Optional[Any]] = (0, None)
+        with self._lock:
+            for key, (state, _) in self._entries.items():
+                n = len(key)
+                if n > best[0] and n <= len(tokens) and tuple(tokens[:n]) == key:
+                    best = (n, state)
+            if best[1] is not None:
+                self._entries.move_to_end(tuple(tokens[: best[0]]))
+        return best
+
+    def contains(self, tokens: Sequence[int]) -> bool:
+        with self._lock:
+            return tuple(tokens) in self._entries
+
+    def store(self, tokens: Sequence[int], state: Any) -> None:
+        size = _state_size(state)
+        if size > self.max_bytes:
+            return
+        key = tuple(tokens)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (state, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and prefill tokens saved."""
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "tokens_saved": self.tokens_saved,
+            "prefill_tokens": self.prefill_tokens,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+
+class PrefixCachedModel:
+    """Wrap a ``llama_cpp.Llama`` so calls reuse cached prefix states.
+
+    The wrapper has the same call signature as ``Llama`` and is therefore
+    interchangeable with it wherever a model instance is expected.  It is
+    not thread-safe; like the model itself it must be used by one request
+    at a time.
+    """
+
+    def __init__(
+        self,
+        llama: Any,
+        cache: PrefixStateCache,
+        *,
+        boundaries: Callable[[str], List[str]] = default_boundaries,
+    ) -> None:
+        self.llama = llama
+        self.cache = cache
+        self.boundaries = boundaries
+
+    def _tokenize(self, text: str) -> List[int]:
+        # Mirrors how ``Llama.create_completion`` tokenizes string prompts.
+        return list(self.llama.tokenize(text.encode("utf-8"), special=True))
+
+    def prepare(self, prompt: str) -> int:
+        """Load or build prefix state for ``prompt``; return reused tokens."""
+
+        llama = self.llama
+        tokens = self._tokenize(prompt)
+        # ``input_ids`` is the whole context buffer; only the first
+        # ``n_tokens`` entries match the KV cache, the rest is stale.
+        current = _common_prefix(list(llama.input_ids[: llama.n_tokens]), tokens)
+        cached, state = self.cache.lookup(tokens)
+
+        if state is not None and cached > current:
+            llama.load_state(state)
+            current = cached
+        if current:
+            self.cache.hits += 1
+        else:
+            self.cache.misses += 1
+        reused = current
+        self.cache.tokens_saved += reused
+        self.cache.prefill_tokens += len(tokens) - reused
+
+        # Snapshot boundaries that are not cached yet.  The tokens evaluated
+        # here are part of the prompt and would be evaluated anyway.
+        for prefix in self.boundaries(prompt):
+            n = _common_prefix(self._tokenize(prefix), tokens)
+            if n <= 0 or n >= len(tokens) or self.cache.contains(tokens[:n]):
+                continue
+            if current > n:
+                continue  # state is already past this boundary
+            if current < n:
+                # Discard any state past the shared prefix before extending.
+                llama.n_tokens = current
+                llama.eval(tokens[current:n])
+                current = n
+            self.cache.store(tokens[:n], llama.save_state())
+        return reused
+
+    def __call__(self, prompt: str, stream: bool = False, **kwargs: Any) -> Any:
+        self.prepare(prompt)
+        return self.llama(prompt, stream=stream, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llama, name)
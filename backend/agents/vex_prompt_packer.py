@@ -0,0 +1,158 @@
+"""Fit retrieved memories into a token budget.
+
+Prefill cost grows with prompt length, so the prompt built from the system
+prompt, retrieved memories and the user message is kept under a fixed
+token budget.  :func:`pack_prompt` deduplicates memories, adds them best
+score first while they fit, truncates the first one that does not fit and
+drops the rest.  The system prompt and the user message are always kept.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+from .vex_prefix_cache import PROMPT_SEPARATOR
+
+TokenCounter = Callable[[str], int]
+Memory = Union[str, Tuple[str, float]]
+
+#: A truncated memory shorter than this many tokens is dropped instead.
+MIN_MEMORY_TOKENS = 16
+
+
+def heuristic_token_count(text: str) -> int:
+    """Approximate token count (about four characters per token)."""
+
+    return math.ceil(len(text) / 4) if text else 0
+
+
+class PackedPrompt:
+    """Result of :func:`pack_prompt`.
+
+    Attributes
+    ----------
+    text:
+        The final prompt.
+    tokens:
+        Token count of :attr:`text`.
+    memories:
+        Memories included in the prompt, in prompt order.
+    dropped:
+        Number of memories left out (duplicates and memories over budget).
+    truncated:
+        Whether the last included memory was shortened to fit.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        tokens: int,
+        memories: List[str],
+        dropped: int = 0,
+        truncated: bool = False,
+    ) -> None:
+        self.text = text
+        self.tokens = tokens
+        self.memories = memories
+        self.dropped = dropped
+        self.truncated = truncated
+
+    def __repr__(self) -> str:
+        return (
+            f"PackedPrompt(tokens={self.tokens}, memories={len(self.memories)}, "
+            f"dropped={self.dropped}, truncated={self.truncated})"
+        )
+
+
+def _rank(memories: Sequence[Memory]) -> List[str]:
+    """Deduplicate ``memories`` and sort them best first."""
+
+    best = {}
+    for position, memory in enumerate(memories):
+        if isinstance(memory, str):
+            # Without scores the retrieval order is the ranking.
+            text, score = memory, -float(position)
+        else:
+            text, score = memory
+        text = text.strip()
+        if not text:
+            continue
+        key = " ".join(text.lower().split())
+        if key not in best or score > best[key][0]:
+            best[key] = (score, position, text)
+    ranked = sorted(best.values(), key=lambda item: (-item[0], item[1]))
+    return [text for _, _, text in ranked]
+
+
+def _truncate(text: str, budget: int, count_tokens: TokenCounter) -> str:
+    """Return the longest prefix of ``text`` with at most ``budget`` tokens."""
+
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip()
+
+
+def pack_prompt(
+    system_prompt: str,
+    user_message: str,
+    memories: Optional[Sequence[Memory]] = None,
+    *,
+    max_tokens: Optional[int] = None,
+    count_tokens: TokenCounter = heuristic_token_count,
+) -> PackedPrompt:
+    """Assemble a prompt that fits in ``max_tokens``.
+
+    Parameters
+    ----------
+    system_prompt, user_message:
+        Always included.
+    memories:
+        Retrieved memories, either plain strings in relevance order or
+        ``(text, score)`` pairs where a higher score is better.
+    max_tokens:
+        Token budget for the whole prompt; ``None`` disables the limit.
+    count_tokens:
+        Tokenizer-backed counter; defaults to :func:`heuristic_token_count`.
+    """
+
+    memories = list(memories or [])
+    ranked = _rank(memories)
+
+    def _join(context: List[str]) -> str:
+        parts = [system_prompt]
+        if context:
+            parts.append("\n".join(context))
+        parts.append(user_message)
+        return PROMPT_SEPARATOR.join(parts)
+
+    if max_tokens is None:
+        text = _join(ranked)
+        return PackedPrompt(text, count_tokens(text), ranked, len(memories) - len(ranked))
+
+    # Counting pieces separately may differ from the joined text by a token
+    # or two at the seams; the final count below is exact.
+    separator = count_tokens(PROMPT_SEPARATOR)
+    newline = count_tokens("\n")
+    remaining = max_tokens - count_tokens(system_prompt) - count_tokens(user_message) - 2 * separator
+    included: List[str] = []
+    truncated = False
+    for memory in ranked:
+        cost = count_tokens(memory) + (newline if included else 0)
+        if cost <= remaining:
+            included.append(memory)
+            remaining -= cost
+            continue
+        room = remaining - (newline if included else 0)
+        if room >= MIN_MEMORY_TOKENS:
+            included.append(_truncate(memory, room, count_tokens))
+            truncated = True
+        break
+
+    text = _join(included)
+    return PackedPrompt(text, count_tokens(text), included, len(memories) - len(included), truncated)
@@ -0,0 +1,314 @@
+"""Latency-aware selection of remote LLM endpoints.
+
+:class:`RemoteEndpointPool` tracks every configured endpoint's latency and
+error rate as exponentially weighted moving averages (EWMA) and ranks the
+healthy endpoints fastest first.  Endpoints that fail repeatedly are taken
+out of rotation by a circuit breaker and probed again, one request at a
+time, after a cooldown.
+
+:func:`hedged` runs a request against the best endpoint and, when hedging
+is enabled and no result has arrived within the endpoint's usual latency
+(a percentile of recent samples), fires the same request at the next
+endpoint; whichever answers first wins and the other is cancelled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .. import metrics
+
+
+class RemoteUnavailable(RuntimeError):
+    """No remote endpoint is available (all circuits are open)."""
+
+
+class RemoteEndpoint:
+    """Health and latency statistics of one remote endpoint.
+
+    Latencies are tracked separately per ``kind`` of request: time to the
+    first token for streams (``"stream"``) and time to the full response
+    otherwise (``"complete"``).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        alpha: float = 0.2,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        samples: int = 100,
+    ) -> None:
+        self.url = url
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self._ewma: Dict[str, float] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+        self._max_samples = samples
+        self._open_until = 0.0
+        self._probing = False
+
+    # ------------------------------------------------------------------
+    # circuit breaker
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() < self._open_until:
+            return "open"
+        return "half-open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self._probing)
+
+    def begin(self) -> None:
+        """Mark a request as started; in half-open state it is the probe."""
+
+        if self.state == "half-open":
+            self._probing = True
+
+    def record_success(self, latency: float, kind: str = "stream") -> None:
+        self.successes += 1
+        metrics.REMOTE_ATTEMPTS.inc(endpoint=self.url, outcome="ok")
+        self.consecutive_failures = 0
+        self._probing = False
+        self.error_rate *= 1 - self.alpha
+        self._observe(latency, kind)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        metrics.REMOTE_ATTEMPTS.inc(endpoint=self.url, outcome="error")
+        self.consecutive_failures += 1
+        self._probing = False
+        self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha
+        if self.consecutive_failures >= self.failure_threshold:
+            self._open_until = time.monotonic() + self.cooldown
+
+    def release(self, elapsed: Optional[float] = None, kind: str = "stream") -> None:
+        """End a request that neither succeeded nor failed (a hedge loser).
+
+        ``elapsed`` is a lower bound of the endpoint's latency and is
+        recorded when it raises the estimate, so a slow endpoint is not
+        mistaken for an unmeasured one.
+        """
+
+        self._probing = False
+        metrics.REMOTE_ATTEMPTS.inc(endpoint=self.url, outcome="cancelled")
+        if elapsed is not None and elapsed > self._ewma.get(kind, 0.0):
+            self._observe(elapsed, kind)
+
+    def _observe(self, latency: float, kind: str) -> None:
+        previous = self._ewma.get(kind)
+        self._ewma[kind] = latency if previous is None else (
+            (1 - self.alpha) * previous + self.alpha * latency
+        )
+        self._samples.setdefault(kind, deque(maxlen=self._max_samples)).append(latency)
+
+    # ------------------------------------------------------------------
+    # latency
+    def expected_latency(self, kind: str = "stream") -> float:
+        """EWMA latency penalised by the error rate; ``0`` when unmeasured.
+
+        Unmeasured endpoints rank first so that each one is tried.
+        """
+
+        return self._ewma.get(kind, 0.0) * (1.0 + 4.0 * self.error_rate)
+
+    def percentile(self, q: float, kind: str = "stream") -> Optional[float]:
+        samples = sorted(self._samples.get(kind, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(q * len(samples)))
+        return samples[index]
+
+    def sample_count(self, kind: str = "stream") -> int:
+        return len(self._samples.get(kind, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "ewma": dict(self._ewma),
+            "error_rate": self.error_rate,
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+class RemoteEndpointPool:
+    """Rank endpoints and decide when to hedge.
+
+    Parameters
+    ----------
+    urls:
+        Remote endpoints in order of preference for ties.
+    hedge:
+        Fire a second request when the first is slower than usual.
+    hedge_percentile:
+        Latency percentile of the primary endpoint after which the hedge
+        is sent.
+    hedge_delay:
+        Hedge delay used until ``min_samples`` latencies were observed.
+    failure_threshold, cooldown:
+        Consecutive failures that open an endpoint's circuit, and the
+        seconds before it is probed again.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        *,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_delay: float = 1.0,
+        min_samples: int = 5,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+    ) -> None:
+        self.endpoints: List[RemoteEndpoint] = [
+            RemoteEndpoint(url, failure_threshold=failure_threshold, cooldown=cooldown)
+            for url in dict.fromkeys(u for u in urls if u)
+        ]
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.hedges = 0
+
+    @property
+    def urls(self) -> List[str]:
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def __bool__(self) -> bool:
+        return bool(self.endpoints)
+
+    def ranked(self, kind: str = "stream") -> List[RemoteEndpoint]:
+        """Available endpoints, fastest expected first."""
+
+        order = {id(e): i for i, e in enumerate(self.endpoints)}
+        healthy = [e for e in self.endpoints if e.available()]
+        return sorted(healthy, key=lambda e: (e.expected_latency(kind), order[id(e)]))
+
+    def hedge_after(self, endpoint: RemoteEndpoint, kind: str = "stream") -> float:
+        """Seconds to wait on ``endpoint`` before sending a hedge."""
+
+        if endpoint.sample_count(kind) < self.min_samples:
+            return self.hedge_delay
+        return endpoint.percentile(self.hedge_percentile, kind) or self.hedge_delay
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+
+class Attempt:
+    """One in-flight request against an endpoint.
+
+    ``result`` resolves to the first result (the first token of a stream
+    or the full response); ``close`` releases the attempt's resources.
+    """
+
+    def __init__(
+        self,
+        endpoint: RemoteEndpoint,
+        result: "asyncio.Future[Any]",
+        close: Callable[[], Awaitable[None]],
+        state: Any = None,
+    ) -> None:
+        self.endpoint = endpoint
+        self.result = result
+        self.close = close
+        self.state = state
+        self.started = time.monotonic()
+
+
+async def _discard(attempt: Attempt) -> None:
+    if not attempt.result.done():
+        attempt.result.cancel()
+    with contextlib.suppress(BaseException):
+        await attempt.result
+    with contextlib.suppress(Exception):
+        await attempt.close()
+
+
+async def hedged(
+    pool: RemoteEndpointPool,
+    start: Callable[[RemoteEndpoint], Attempt],
+    *,
+    kind: str = "stream",
+) -> Tuple[Attempt, Any]:
+    """Race ``start(endpoint)`` attempts and return the winner and its result.
+
+    Endpoints are tried fastest first.  A failed attempt is recorded and
+    the next endpoint is tried; with hedging a slow attempt additionally
+    triggers one parallel attempt on the next endpoint.  Losing attempts
+    are cancelled and closed.  Raises :class:`RemoteUnavailable` when no
+    endpoint is available, or the last error if every attempt failed.
+    """
+
+    candidates = pool.ranked(kind)
+    if not candidates:
+        raise RemoteUnavailable("All remote endpoints are unavailable")
+
+    attempts: List[Attempt] = []
+    last_error: Optional[BaseException] = None
+    hedged_once = False
+
+    def _launch() -> None:
+        endpoint = candidates.pop(0)
+        endpoint.begin()
+        attempts.append(start(endpoint))
+
+    _launch()
+    try:
+        while attempts:
+            timeout = None
+            if pool.hedge and candidates and not hedged_once:
+                primary = attempts[0]
+                elapsed = time.monotonic() - primary.started
+                timeout = max(pool.hedge_after(primary.endpoint, kind) - elapsed, 0.0)
+            done, _ = await asyncio.wait(
+                {a.result for a in attempts},
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                hedged_once = True
+                pool.hedges += 1
+                _launch()
+                continue
+            for attempt in [a for a in attempts if a.result.done()]:
+                attempts.remove(attempt)
+                try:
+                    value = attempt.result.result()
+                except Exception as exc:
+                    attempt.endpoint.record_failure()
+                    last_error = exc
+                    await _discard(attempt)
+                    continue
+                attempt.endpoint.record_success(time.monotonic() - attempt.started, kind)
+                now = time.monotonic()
+                for loser in attempts:
+                    loser.endpoint.release(now - loser.started, kind)
+                    await _discard(loser)
+                attempts.clear()
+                return attempt, value
+            if not attempts and candidates:
+                _launch()
+    except BaseException:
+        for attempt in attempts:
+            attempt.endpoint.release()
+            await _discard(attempt)
+        raise
+    assert last_error is not None
+    raise last_error
@@ -0,0 +1,263 @@
+"""Decode streaming and non-streaming responses of remote LLM APIs.
+
+Remote providers stream completions as Server-Sent Events (OpenAI,
+OpenRouter, Anthropic) or newline-delimited JSON (Ollama and similar).
+:func:`iter_deltas` decodes such a body incrementally, chunk by chunk as it
+arrives, and yields :class:`StreamDelta` objects carrying the generated
+text together with the finish reason and token usage once the provider
+reports them.  SSE comments (``: keep-alive``) and ``ping`` events are
+skipped.  :func:`extract_completion` does the same for non-streaming
+JSON responses.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+
+
+class StreamDelta:
+    """One decoded piece of a remote completion.
+
+    Attributes
+    ----------
+    text:
+        Newly generated text; may be empty for metadata-only events.
+    finish_reason:
+        Why generation stopped (``"stop"``, ``"length"``, ``"end_turn"``...),
+        set on the event that reports it.
+    usage:
+        Token usage as reported by the provider, if any.
+    """
+
+    __slots__ = ("text", "finish_reason", "usage")
+
+    def __init__(
+        self,
+        text: str = "",
+        finish_reason: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.text = text
+        self.finish_reason = finish_reason
+        self.usage = usage
+
+    def __repr__(self) -> str:
+        return (
+            f"StreamDelta(text={self.text!r}, finish_reason={self.finish_reason!r}, "
+            f"usage={self.usage!r})"
+        )
+
+
+class RemoteStreamError(RuntimeError):
+    """The provider reported an error inside the stream."""
+
+
+# SSE lines end in CRLF, CR or LF only; ``str.splitlines`` would also break
+# on characters such as U+2028 that may appear inside JSON payloads.
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+
+class SSEDecoder:
+    """Incremental Server-Sent Events decoder.
+
+    Text is fed in arbitrary fragments; only an unfinished trailing line is
+    kept between calls, never the whole body.
+    """
+
+    def __init__(self) -> None:
+        self._partial = ""
+        self._event: Optional[str] = None
+        self._data: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[Optional[str], str]]:
+        """Consume ``text`` and return completed ``(event, data)`` pairs."""
+
+        events: List[Tuple[Optional[str], str]] = []
+        buffer = self._partial + text
+        lines = _LINE_BREAK.split(buffer)
+        self._partial = lines.pop()
+        # A trailing "\r" may be the first half of a "\r\n" split across
+        # fragments, so it is completed by the next call.
+        if buffer.endswith("\r"):
+            self._partial = lines.pop() + "\r"
+        for line in lines:
+            if not line:
+                if self._data:
+                    events.append((self._event, "\n".join(self._data)))
+                self._event, self._data = None, []
+                continue
+            if line.startswith(":"):
+                continue  # comment / keep-alive
+            field, _, value = line.partition(":")
+            if value.startswith(" "):
+                value = value[1:]
+            if field == "data":
+                self._data.append(value)
+            elif field == "event":
+                self._event = value
+        return events
+
+    def close(self) -> List[Tuple[Optional[str], str]]:
+        """Flush an event left unterminated at the end of the body."""
+
+        return self.feed("\n\n") if self._partial or self._data else []
+
+
+def _usage(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    usage = data.get("usage")
+    if usage:
+        return dict(usage)
+    # Ollama style counters.
+    if "eval_count" in data:
+        return {
+            "prompt_tokens": data.get("prompt_eval_count"),
+            "completion_tokens": data.get("eval_count"),
+        }
+    return None
+
+
+def parse_event(event: Optional[str], data: Dict[str, Any]) -> Optional[StreamDelta]:
+    """Map one decoded event of any supported provider to a delta."""
+
+    kind = data.get("type") or event
+    if kind == "error" or ("error" in data and not data.get("choices")):
+        error = data.get("error")
+        message = error.get("message") if isinstance(error, dict) else error
+        raise RemoteStreamError(str(message or data))
+
+    # Anthropic Messages API.
+    if kind == "content_block_delta":
+        delta = data.get("delta") or {}
+        return StreamDelta(delta.get("text", ""))
+    if kind == "message_start":
+        return StreamDelta(usage=_usage(data.get("message") or {}))
+    if kind == "message_delta":
+        delta = data.get("delta") or {}
+        return StreamDelta(finish_reason=delta.get("stop_reason"), usage=_usage(data))
+    if kind in ("ping", "message_stop", "content_block_start", "content_block_stop"):
+        return None
+
+    # OpenAI / OpenRouter chat and text completions.
+    choices = data.get("choices")
+    if choices is not None:
+        text = ""
+        finish = None
+        if choices:
+            choice = choices[0]
+            delta = choice.get("delta") or {}
+            text = delta.get("content") or choice.get("text") or ""
+            finish = choice.get("finish_reason")
+        return StreamDelta(text, finish, _usage(data))
+
+    # Ollama and minimal custom servers.
+    text = data.get("response") or data.get("text") or data.get("token") or ""
+    finish = data.get("done_reason") or ("stop" if data.get("done") else None)
+    return StreamDelta(text, finish, _usage(data))
+
+
+def extract_completion(data: Any) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+    """Return ``(text, finish_reason, usage)`` of a non-streaming response."""
+
+    if not isinstance(data, dict):
+        return "", None, None
+    choices = data.get("choices")
+    if choices:
+        choice = choices[0]
+        message = choice.get("message") or {}
+        text = message.get("content") or choice.get("text") or ""
+        return text, choice.get("finish_reason"), _usage(data)
+    content = data.get("content")
+    if isinstance(content, list):  # Anthropic content blocks
+        text = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+        return text, data.get("stop_reason"), _usage(data)
+    text = data.get("text") or data.get("response") or ""
+    finish = data.get("done_reason") or ("stop" if data.get("done") else None)
+    return text, finish, _usage(data)
+
+
+_NDJSON_TYPES = frozenset(
+    ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonl")
+)
+
+
+async def iter_deltas(
+    chunks: AsyncIterator[str], content_type: str = ""
+) -> AsyncGenerator[StreamDelta, None]:
+    """Decode a streamed response body into :class:`StreamDelta` objects.
+
+    ``content_type`` selects the wire format: ``text/event-stream`` for
+    SSE, ``application/x-ndjson`` or ``application/jsonl`` for one JSON
+    object per line.  A plain ``application/json`` body is one document,
+    e.g. a server that ignored ``"stream": true``, and is decoded with
+    :func:`extract_completion` once complete.  Other bodies are passed
+    through as plain text deltas.
+    """
+
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        decoder = SSEDecoder()
+        async for chunk in chunks:
+            for event, payload in decoder.feed(chunk):
+                if payload.strip() == "[DONE]":
+                    return
+                delta = _decode(event, payload)
+                if delta is not None:
+                    yield delta
+        for event, payload in decoder.close():
+            if payload.strip() != "[DONE]":
+                delta = _decode(event, payload)
+                if delta is not None:
+                    yield delta
+        return
+
+    if content_type == "application/json" or content_type.endswith("+json"):
+        body = "".join([chunk async for chunk in chunks])
+        try:
+            data = json.loads(body) if body.strip() else None
+        except ValueError:
+            # Mislabelled NDJSON: fall back to one object per line.
+            for line in body.split("\n"):
+                delta = _decode(None, line)
+                if delta is not None:
+                    yield delta
+            return
+        if isinstance(data, dict):
+            if "error" in data and not data.get("choices"):
+                parse_event(None, data)  # raises RemoteStreamError
+            text, finish, usage = extract_completion(data)
+            yield StreamDelta(text, finish, usage)
+        elif data is not None:
+            yield StreamDelta(str(data))
+        return
+
+    if content_type in _NDJSON_TYPES:
+        partial = ""
+        async for chunk in chunks:
+            lines = (partial + chunk).split("\n")
+            partial = lines.pop()
+            for line in lines:
+                delta = _decode(None, line)
+                if delta is not None:
+                    yield delta
+        delta = _decode(None, partial)
+        if delta is not None:
+            yield delta
+        return
+
+    async for chunk in chunks:
+        yield StreamDelta(chunk)
+
+
+def _decode(event: Optional[str], payload: str) -> Optional[StreamDelta]:
+    if not payload.strip():
+        return None
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        # Some servers stream bare text in ``data:`` fields.
+        return StreamDelta(payload)
+    if not isinstance(data, dict):
+        return StreamDelta(str(data))
+    return parse_event(event, data)
@@ -0,0 +1,215 @@
+"""Cache complete responses for repeated questions.
+
+:class:`ResponseCache` sits in front of
+:meth:`~backend.agents.vex_personality_core.VexPersonalityCore.generate_response`.
+Lookups first try the exact question (by hash of the normalised text) and
+then, when an :class:`~backend.memory.Embedder` is configured, the most
+similar earlier question in the same namespace.  Questions rather than
+full prompts are the key because prompts embed retrieved memories, which
+change as soon as an exchange has been stored; looking up the question
+also lets a hit skip retrieval altogether.  Entries expire after a TTL and
+the cache holds at most ``max_entries`` responses, evicting the least
+recently used.
+
+Responses are stored as the chunks they were generated in so a cached
+answer can be replayed to a streaming client with the original framing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None  # type: ignore
+
+from ..memory import Embedder
+
+
+class _Entry:
+    __slots__ = ("namespace", "chunks", "vector", "expires_at")
+
+    def __init__(self, namespace: str, chunks: List[str], vector, expires_at: float) -> None:
+        self.namespace = namespace
+        self.chunks = chunks
+        self.vector = vector
+        self.expires_at = expires_at
+
+
+class CachedResponse:
+    """A response served from the cache.
+
+    ``kind`` is ``"exact"`` or ``"semantic"`` depending on the tier that
+    answered.
+    """
+
+    def __init__(self, chunks: List[str], kind: str) -> None:
+        self.chunks = chunks
+        self.kind = kind
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    async def replay(self) -> AsyncGenerator[str, None]:
+        """Yield the cached chunks like a live model stream."""
+
+        for chunk in self.chunks:
+            yield chunk
+
+
+class ResponseCache:
+    """Two-tier (exact + similar question) response cache.
+
+    Parameters
+    ----------
+    embedder:
+        Optional embedder for the similarity tier.  Without it (or without
+        NumPy) only exact question matches are served.
+    max_entries:
+        Maximum number of cached responses.
+    ttl:
+        Seconds a response stays valid.
+    similarity_threshold:
+        Minimum cosine similarity between questions for a semantic hit.
+    """
+
+    def __init__(
+        self,
+        *,
+        embedder: Optional[Embedder] = None,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        similarity_threshold: float = 0.95,
+    ) -> None:
+        self.embedder = embedder if np is not None else None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._pending: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(namespace: str, question: str) -> str:
+        """Exact-tier key: ``namespace`` plus case- and space-folded text."""
+        normalised = " ".join(question.casefold().split())
+        return hashlib.sha256(f"{namespace}\0{normalised}".encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    async def lookup(self, question: str, *, namespace: str = "") -> Optional[CachedResponse]:
+        """Return a cached response for ``question`` or a similar one.
+
+        ``namespace`` separates answers that must not be shared, e.g. those
+        of different models or sessions.
+        """
+
+        now = time.monotonic()
+        key = self.key(namespace, question)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return CachedResponse(entry.chunks, "exact")
+            del self._entries[key]
+
+        if question.strip() and self._similarity_enabled:
+            match = await self._nearest(question, namespace, now)
+            if match is not None:
+                if match[0] in self._entries:
+                    self._entries.move_to_end(match[0])
+                self.semantic_hits += 1
+                return CachedResponse(match[1].chunks, "semantic")
+
+        self.misses += 1
+        return None
+
+    async def store(self, question: str, chunks: List[str], *, namespace: str = "") -> None:
+        """Cache the ``chunks`` answering ``question``."""
+
+        if not chunks or not "".join(chunks).strip():
+            return
+        vector = None
+        if question.strip() and self._similarity_enabled:
+            vector = self._normalise(await self.embedder.embed(question))
+        key = self.key(namespace, question)
+        self._entries.pop(key, None)
+        self._entries[key] = _Entry(
+            namespace, list(chunks), vector, time.monotonic() + self.ttl
+        )
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def schedule_store(
+        self, question: str, chunks: List[str], *, namespace: str = ""
+    ) -> asyncio.Task:
+        """Run :meth:`store` in a background task off the response path."""
+
+        task = asyncio.get_running_loop().create_task(
+            self.store(question, chunks, namespace=namespace)
+        )
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def flush(self) -> None:
+        """Wait for all scheduled stores to finish."""
+
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    # ------------------------------------------------------------------
+    @property
+    def _similarity_enabled(self) -> bool:
+        # Off without an embedder or once its model failed to load.
+        return self.embedder is not None and self.embedder.available
+
+    @staticmethod
+    def _normalise(vector) -> "np.ndarray":
+        array = np.asarray(vector, dtype=np.float32)
+        return array / max(float(np.linalg.norm(array)), 1e-12)
+
+    async def _nearest(
+        self, question: str, namespace: str, now: float
+    ) -> Optional[Tuple[str, _Entry]]:
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for k in expired:
+            del self._entries[k]
+        candidates = [
+            (k, e)
+            for k, e in self._entries.items()
+            if e.namespace == namespace and e.vector is not None
+        ]
+        if not candidates:
+            return None
+        query = self._normalise(await self.embedder.embed(question))
+        scores = np.stack([e.vector for _, e in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return candidates[best]
@@ -3,22 +3,36 @@
 The :class:`VexRouter` wires together the validator, memory manager and
 personality core.  ``handle_message`` performs the following steps:
 
-1. Validate the incoming user message.
-2. Retrieve relevant memories.
-3. Build a prompt and query the language model (local or remote).
-4. Optionally stream the response back to the caller.
-5. Persist the conversation to memory.
+1. Validate the incoming user message while retrieving relevant memories
+   concurrently (the retrieval is discarded if validation fails).
+2. Build a prompt and query the language model (local or remote).
+3. Optionally stream the response back to the caller.
+4. Persist the conversation to memory in a background task.
+
+With a :class:`~backend.agents.vex_response_cache.ResponseCache` configured,
+questions answered before skip retrieval and generation (only validation
+runs); cached answers are replayed chunk by chunk to streaming callers.
+
+The duration of each stage is recorded in :attr:`VexRouter.timings` and,
+when metrics are enabled, in the histograms of :mod:`backend.metrics`.
 """
 
 from __future__ import annotations
 
-from typing import AsyncGenerator, Optional
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Awaitable, Dict, List, Optional, TypeVar
 
+from .. import metrics
 from .vex_memory_manager import VexMemoryManager
 from .vex_personality_core import VexPersonalityCore
+from .vex_prompt_packer import PackedPrompt
+from .vex_response_cache import ResponseCache
 from .vex_validator import VexValidator
 from ..config.settings import settings
 
+T = TypeVar("T")
+
 
 class VexRouter:
     """Coordinate the individual components that form an agent."""
@@ -29,25 +43,45 @@ class VexRouter:
         personality_core: Optional[VexPersonalityCore] = None,
         validator: Optional[VexValidator] = None,
         memory_manager: Optional[VexMemoryManager] = None,
+        response_cache: Optional[ResponseCache] = None,
     ) -> None:
         self.personality_core = personality_core or VexPersonalityCore(
             remote_url=settings.remote_url
         )
         self.validator = validator or VexValidator()
         self.memory_manager = memory_manager or VexMemoryManager()
+        self.response_cache = response_cache
+        # Mode is kept per router so that a personality core shared between
+        # requests is never mutated by an individual request.
+        self.use_remote: Optional[bool] = None
+        # Seconds spent in each stage of the last ``handle_message`` call.
+        self.timings: Dict[str, float] = {}
+        # Prompt assembled by the last ``handle_message`` call.
+        self.last_prompt: Optional[PackedPrompt] = None
+        # ``"exact"``/``"semantic"`` if the last reply came from the cache.
+        self.cache_hit: Optional[str] = None
+        # Source, finish reason and token usage of the last generation.
+        self.generation_info: Dict[str, Any] = {}
+        self._chunks = 0
 
     # ------------------------------------------------------------------
     # Model mode utilities
     # ------------------------------------------------------------------
     def set_remote(self, use_remote: bool) -> None:
-        """Toggle between local and remote model usage."""
-        self.personality_core.set_remote(use_remote)
+        """Toggle between local and remote model usage for this router."""
+        self.use_remote = use_remote
 
     # ------------------------------------------------------------------
     # Routing logic
     # ------------------------------------------------------------------
     async def handle_message(
-        self, message: str, *, stream: bool = False
+        self,
+        message: str,
+        *,
+        stream: bool = False,
+        priority: int = 0,
+        session_id: Optional[str] = None,
+        use_cache: bool = True,
     ) -> AsyncGenerator[str, None] | str:
         """Process ``message`` and return a response.
 
@@ -58,28 +92,188 @@ class VexRouter:
         stream:
             If ``True``, an asynchronous generator yielding chunks is
             returned.  Otherwise the full response string is produced.
+        priority:
+            Scheduling priority for local generation; lower values are
+            served first.
+        session_id:
+            Optional session the message belongs to.  Memories are stored
+            in and retrieved from that session's namespace only.
+        use_cache:
+            Set to ``False`` to bypass the response cache for this call.
         """
 
-        if not await self.validator.validate(message):
+        try:
+            with metrics.REQUESTS_IN_FLIGHT.track_inprogress():
+                result = await self._handle_message(
+                    message,
+                    stream=stream,
+                    priority=priority,
+                    session_id=session_id,
+                    use_cache=use_cache,
+                )
+        except BaseException:
+            self._record("error")
+            raise
+        if isinstance(result, str):
+            self._record("ok")
+            return result
+        return self._recorded(result)
+
+    async def _handle_message(
+        self,
+        message: str,
+        *,
+        stream: bool = False,
+        priority: int = 0,
+        session_id: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> AsyncGenerator[str, None] | str:
+        self.timings = {}
+        self.cache_hit = None
+        self.generation_info = {}
+        self._chunks = 0
+        started = time.perf_counter()
+
+        cache = self.response_cache if use_cache else None
+        # Answers are only shared between callers using the same model and
+        # memory session.
+        namespace = f"{'remote' if self.use_remote else 'local'}:{session_id or ''}"
+        if cache is not None:
+            cached = await self._timed("cache", cache.lookup(message, namespace=namespace))
+            if cached is not None:
+                if not await self._timed("validate", self.validator.validate(message)):
+                    raise ValueError("Message failed validation")
+                # The exchange is already in memory; nothing to persist.
+                self.cache_hit = cached.kind
+                self.timings["total"] = time.perf_counter() - started
+                return cached.replay() if stream else cached.text
+
+        validation = asyncio.ensure_future(
+            self._timed("validate", self.validator.validate(message))
+        )
+        retrieval = asyncio.ensure_future(
+            self._timed(
+                "retrieve",
+                self.memory_manager.search_many([message], session_id=session_id),
+            )
+        )
+        try:
+            valid = await validation
+        except BaseException:
+            retrieval.cancel()
+            raise
+        if not valid:
+            retrieval.cancel()
             raise ValueError("Message failed validation")
+        context = (await retrieval)[0]
 
-        context = await self.memory_manager.search(message)
-        prompt = self.personality_core.build_prompt(message, context)
+        prompt_started = time.perf_counter()
+        self.last_prompt = self.personality_core.pack_prompt(message, context)
+        prompt = self.last_prompt.text
+        self.timings["build_prompt"] = time.perf_counter() - prompt_started
 
+        generation_started = time.perf_counter()
         if stream:
+            # Requesting the stream up front lets admission errors surface
+            # before the caller starts sending a response.
+            tokens = await self.personality_core.generate_response(
+                prompt,
+                stream=True,
+                use_remote=self.use_remote,
+                priority=priority,
+                metadata=self.generation_info,
+            )
+
             async def _generator() -> AsyncGenerator[str, None]:
-                accumulated = ""
-                async for chunk in self.personality_core.generate_response(prompt, stream=True):
-                    accumulated += chunk
-                    yield chunk
-                await self.memory_manager.add_memory(message)
-                await self.memory_manager.add_memory(accumulated)
+                # A stream closed early (e.g. the client disconnected) stops
+                # the model and is not persisted: memory only ever holds
+                # complete exchanges.
+                chunks: List[str] = []
+                try:
+                    async for chunk in tokens:
+                        if not chunks and "first_token" not in self.timings:
+                            self.timings["first_token"] = time.perf_counter() - started
+                        chunks.append(chunk)
+                        self._chunks = len(chunks)
+                        yield chunk
+                finally:
+                    await tokens.aclose()
+                self.timings["generate"] = time.perf_counter() - generation_started
+                self.timings["total"] = time.perf_counter() - started
+                self.memory_manager.schedule_memories(
+                    [message, "".join(chunks)], session_id=session_id
+                )
+                if cache is not None:
+                    cache.schedule_store(message, chunks, namespace=namespace)
 
             return _generator()
 
-        response = await self.personality_core.generate_response(prompt, stream=False)
+        response = await self.personality_core.generate_response(
+            prompt,
+            stream=False,
+            use_remote=self.use_remote,
+            priority=priority,
+            metadata=self.generation_info,
+        )
+        self.timings["generate"] = time.perf_counter() - generation_started
+        self.timings["total"] = time.perf_counter() - started
         if isinstance(response, str):
-            await self.memory_manager.add_memory(message)
-            await self.memory_manager.add_memory(response)
+            self.memory_manager.schedule_memories(
+                [message, response], session_id=session_id
+            )
+            if cache is not None:
+                cache.schedule_store(message, [response], namespace=namespace)
             return response
         return ""
+
+    async def _recorded(self, tokens: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+        """Pass ``tokens`` through, recording metrics once the stream ends.
+
+        The request counts as in flight again while it streams; counting
+        starts with the first token requested so that a stream that is
+        never consumed cannot leave the gauge raised.
+        """
+        outcome = "error"
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        try:
+            async for token in tokens:
+                yield token
+            outcome = "ok"
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            await tokens.aclose()
+            self._record(outcome)
+
+    def _record(self, outcome: str) -> None:
+        """Publish :attr:`timings` of the finished request to the metrics."""
+        if not metrics.REGISTRY.enabled:
+            return
+        metrics.REQUESTS.inc(outcome="cache_hit" if self.cache_hit and outcome == "ok" else outcome)
+        timings = self.timings
+        for stage, seconds in timings.items():
+            if stage != "first_token":
+                metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+        if self.cache_hit or outcome != "ok":
+            return
+        source = self.generation_info.get("source", "unknown")
+        usage = self.generation_info.get("usage") or {}
+        tokens = usage.get("completion_tokens") or usage.get("output_tokens") or self._chunks
+        if "first_token" in timings:
+            metrics.FIRST_TOKEN_SECONDS.observe(timings["first_token"], source=source)
+            decode = timings.get("total", 0.0) - timings["first_token"]
+            tokens -= 1
+        else:
+            decode = timings.get("generate", 0.0)
+        if tokens > 0 and decode > 0:
+            metrics.TOKENS_PER_SECOND.observe(tokens / decode, source=source)
+
+    async def _timed(self, stage: str, awaitable: Awaitable[T]) -> T:
+        """Await ``awaitable`` recording its duration under ``stage``."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[stage] = time.perf_counter() - start
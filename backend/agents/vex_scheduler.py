@@ -0,0 +1,172 @@
+"""Admission control and scheduling for local model instances.
+
+A ``llama.cpp`` model handle cannot serve two generations at once.  The
+:class:`InferenceScheduler` owns the available model instances and hands
+them out one request at a time.  Waiting requests are ordered by priority
+and arrival, bounded by a maximum queue depth, and dropped when their
+deadline cannot be met, so traffic spikes are shed instead of piling up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+class SchedulerOverloaded(RuntimeError):
+    """Raised when a request cannot be admitted or its deadline expired."""
+
+
+class Lease:
+    """Exclusive use of one model instance, returned by :meth:`InferenceScheduler.acquire`."""
+
+    def __init__(self, scheduler: "InferenceScheduler", instance: Any) -> None:
+        self._scheduler = scheduler
+        self.instance = instance
+        self._started = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        """Return the instance to the scheduler.  Idempotent."""
+        if self._released:
+            return
+        self._released = True
+        self._scheduler._release(self.instance, time.perf_counter() - self._started)
+
+
+class InferenceScheduler:
+    """Hand out model instances to requests in priority order.
+
+    Parameters
+    ----------
+    instances:
+        Model handles to schedule.  Each is used by at most one request at
+        a time.
+    max_queue:
+        Maximum number of requests allowed to wait.  Further requests are
+        rejected with :class:`SchedulerOverloaded`.
+    """
+
+    def __init__(self, instances: Sequence[Any], *, max_queue: int = 16) -> None:
+        if not instances:
+            raise ValueError("InferenceScheduler requires at least one instance")
+        self.max_queue = max_queue
+        self._capacity = len(instances)
+        self._free: List[Any] = list(instances)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._service_time: Optional[float] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.last_wait = 0.0
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    @property
+    def in_flight(self) -> int:
+        return self._capacity - len(self._free)
+
+    def estimated_wait(self) -> float:
+        """Rough seconds a new request would wait for an instance."""
+
+        if self._service_time is None:
+            return 0.0
+        if self._free and not self.queue_depth:
+            return 0.0
+        rounds = self.queue_depth // self._capacity + 1
+        return rounds * self._service_time
+
+    def stats(self) -> Dict[str, float]:
+        """Return queue depth, wait time and admission counters."""
+
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "completed": self.completed,
+            "avg_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "last_wait": self.last_wait,
+            "avg_service_time": self._service_time or 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def check_admission(self, timeout: Optional[float] = None) -> None:
+        """Raise :class:`SchedulerOverloaded` if a request would be shed.
+
+        ``timeout`` is the number of seconds the caller is prepared to
+        wait; requests whose estimated wait exceeds it are rejected up
+        front rather than after queueing.
+        """
+
+        if self._free and not self.queue_depth:
+            return
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerOverloaded("Local inference queue is full")
+        if timeout is not None and self.estimated_wait() > timeout:
+            self.rejected += 1
+            raise SchedulerOverloaded("Local inference would exceed the deadline")
+
+    async def acquire(self, *, priority: int = 0, timeout: Optional[float] = None) -> Lease:
+        """Wait for a free instance and return a :class:`Lease` on it.
+
+        Lower ``priority`` values are served first; ties are served in
+        arrival order.  When ``timeout`` seconds pass before an instance is
+        available :class:`SchedulerOverloaded` is raised.
+        """
+
+        self.check_admission(timeout)
+        started = time.perf_counter()
+
+        if self._free and not self.queue_depth:
+            instance = self._free.pop()
+        else:
+            future: asyncio.Future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+            try:
+                instance = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self.expired += 1
+                raise SchedulerOverloaded("Deadline expired while queued") from None
+            except asyncio.CancelledError:
+                # The instance may have been handed over just before the
+                # cancellation; give it back so it is not lost.
+                if future.done() and not future.cancelled():
+                    self._release(future.result(), None)
+                raise
+
+        wait = time.perf_counter() - started
+        self.admitted += 1
+        self.total_wait += wait
+        self.last_wait = wait
+        return Lease(self, instance)
+
+    def _release(self, instance: Any, service_time: Optional[float]) -> None:
+        if service_time is not None:
+            self.completed += 1
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(instance)
+                return
+        self._free.append(instance)
@@ -1,22 +1,80 @@
 """Chat endpoints for HTTP and WebSocket communication."""
 
-from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+import asyncio
+import json
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict
+
+try:  # pragma: no cover - optional dependency
+    import msgpack  # type: ignore
+except Exception:  # pragma: no cover - not installed
+    msgpack = None  # type: ignore
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 
-from ..agents.vex_router import VexRouter
+from ..agents.vex_scheduler import SchedulerOverloaded
+from ..components import VexComponents
 from .config import get_runtime_config
+from .deps import get_components
+from .streaming import coalesce, sse_event, until_disconnected, wait_for_http_disconnect
 
 router = APIRouter()
 
 
+def _coalesced(tokens: AsyncIterator[str], components: VexComponents) -> AsyncIterator[str]:
+    """Apply the configured token coalescing to a reply stream."""
+
+    cfg = components.settings
+    return coalesce(
+        tokens,
+        max_delay=cfg.stream_coalesce_ms / 1000,
+        max_bytes=cfg.stream_coalesce_bytes,
+    )
+
+
+def _priority(value: Any, components: VexComponents) -> int:
+    """Return the scheduling priority a client asked for.
+
+    Clients may only lower their own priority: the value is clamped to
+    ``0`` (the default, served first) .. ``LOCAL_MAX_PRIORITY`` so that
+    no request can jump ahead of regular traffic.
+
+    Raises
+    ------
+    ValueError
+        If ``value`` is not an integer.
+    """
+
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("priority must be an integer")
+    return min(max(value, 0), components.settings.local_max_priority)
+
+
 @router.post("/")
-async def chat(request: Request):
+async def chat(
+    request: Request, components: VexComponents = Depends(get_components)
+):
     """Process messages via :class:`VexRouter`, optionally streaming.
 
     The endpoint expects a JSON payload of the form::
 
-        {"message": "...", "mode": "local"|"remote", "stream": bool}
-
+        {"message": "...", "mode": "local"|"remote", "stream": bool,
+         "priority": int, "session_id": "...", "cache": bool,
+         "format": "text"|"sse"}
+
+    ``session_id`` scopes memory storage and retrieval to one session and
+    ``"cache": false`` bypasses the response cache.  ``priority`` can only
+    move a request back in the local inference queue (see
+    :func:`_priority`); a non-integer value is rejected with ``422``.  Streams are plain text
+    ending in ``[DONE]``, or with ``"format": "sse"`` Server-Sent Events
+    carrying ``{"token": ...}`` objects followed by ``data: [DONE]``.
+    Tokens are coalesced into larger chunks as configured by
+    ``STREAM_COALESCE_MS`` and ``STREAM_COALESCE_BYTES``.
+
+    Requests shed by the local inference scheduler are answered with
+    ``503 Service Unavailable``.  When a streaming client disconnects the
+    generation is cancelled and the partial reply is discarded.
     """
 
     payload = await request.json()
@@ -24,54 +82,148 @@ async def chat(request: Request):
     message = payload.get("message", "")
     mode = payload.get("mode", cfg.get("mode", "local"))
     stream = payload.get("stream", False)
+    try:
+        priority = _priority(payload.get("priority", 0), components)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    session_id = payload.get("session_id")
+    use_cache = bool(payload.get("cache", True))
+    sse = payload.get("format", "text") == "sse"
+
+    vex_router = components.create_router(use_remote=mode == "remote")
 
-    vex_router = VexRouter()
-    vex_router.set_remote(mode == "remote")
+    try:
+        result = await vex_router.handle_message(
+            message,
+            stream=stream,
+            priority=priority,
+            session_id=session_id,
+            use_cache=use_cache,
+        )
+    except SchedulerOverloaded as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
 
     if stream:
-        generator = await vex_router.handle_message(message, stream=True)
+        generator = _coalesced(result, components)
 
         async def _stream() -> list:
-            async for token in generator:
-                yield token
-            # Signal end-of-stream so clients know when streaming is complete
-            yield "[DONE]"
+            disconnected = asyncio.ensure_future(wait_for_http_disconnect(request))
+            try:
+                async with aclosing(until_disconnected(generator, disconnected)) as tokens:
+                    async for token in tokens:
+                        yield sse_event({"token": token}) if sse else token
+                if not disconnected.done():
+                    # Signal end-of-stream so clients know when streaming is complete
+                    yield sse_event("[DONE]") if sse else "[DONE]"
+            finally:
+                disconnected.cancel()
+
+        media_type = "text/event-stream" if sse else "text/plain"
+        return StreamingResponse(_stream(), media_type=media_type)
+
+    if isinstance(result, str):
+        return {"reply": result}
+    return {"reply": ""}
 
-        return StreamingResponse(_stream(), media_type="text/plain")
 
-    reply = await vex_router.handle_message(message, stream=False)
-    if isinstance(reply, str):
-        return {"reply": reply}
-    return {"reply": ""}
+async def _read_messages(
+    websocket: WebSocket, inbox: asyncio.Queue, disconnected: asyncio.Future
+) -> None:
+    """Forward incoming WebSocket messages to ``inbox`` until disconnect.
+
+    Reading continuously (also while a reply is streaming) is what lets the
+    endpoint notice a disconnect mid-stream.  ``None`` marks the end.
+    """
+    try:
+        while True:
+            await inbox.put(await websocket.receive_json())
+    except (WebSocketDisconnect, RuntimeError, ValueError):
+        pass
+    finally:
+        if not disconnected.done():
+            disconnected.set_result(None)
+        inbox.put_nowait(None)
 
 
 @router.websocket("/ws")
-async def chat_ws(websocket: WebSocket) -> None:
-    """WebSocket interface backed by :class:`VexRouter`."""
+async def chat_ws(
+    websocket: WebSocket, components: VexComponents = Depends(get_components)
+) -> None:
+    """WebSocket interface backed by :class:`VexRouter`.
+
+    The ``session_id`` query parameter sets the memory session for the
+    connection; a ``session_id`` field in a message overrides it.  Messages
+    with an invalid ``priority`` are answered with an error frame.  With
+    ``format=msgpack`` replies are sent as binary msgpack frames instead of
+    JSON text frames (requires the ``msgpack`` package).  Streamed tokens
+    are coalesced as configured by ``STREAM_COALESCE_MS`` and
+    ``STREAM_COALESCE_BYTES``.
+    """
     stream = websocket.query_params.get("stream", "true").lower() == "true"
+    default_session = websocket.query_params.get("session_id")
+    binary = websocket.query_params.get("format", "json") == "msgpack"
 
     await websocket.accept()
-    vex_router = VexRouter()
+    if binary and msgpack is None:
+        await websocket.send_json({"error": "msgpack framing is not available", "done": True})
+        await websocket.close()
+        return
+
+    async def send(frame: Dict[str, Any]) -> None:
+        if binary:
+            await websocket.send_bytes(msgpack.packb(frame))
+        else:
+            await websocket.send_text(json.dumps(frame))
+
+    vex_router = components.create_router()
+    inbox: asyncio.Queue = asyncio.Queue()
+    disconnected = asyncio.get_running_loop().create_future()
+    reader = asyncio.create_task(_read_messages(websocket, inbox, disconnected))
     try:
         while True:
-            data = await websocket.receive_json()
+            data = await inbox.get()
+            if data is None:
+                break
             message = data.get("message", "")
             cfg = get_runtime_config()
             mode = data.get("mode", cfg.get("mode", "local"))
             vex_router.set_remote(mode == "remote")
 
-            result = await vex_router.handle_message(message, stream=stream)
+            try:
+                priority = _priority(data.get("priority", 0), components)
+            except ValueError as exc:
+                await send({"error": str(exc), "done": True})
+                continue
+
+            try:
+                result = await vex_router.handle_message(
+                    message,
+                    stream=stream,
+                    priority=priority,
+                    session_id=data.get("session_id", default_session),
+                    use_cache=bool(data.get("cache", True)),
+                )
+            except SchedulerOverloaded as exc:
+                await send({"error": str(exc), "done": True})
+                continue
             if stream:
-                accumulated = ""
-                async for token in result:
-                    accumulated += token
-                    await websocket.send_json({"token": token})
+                chunks = []
+                async with aclosing(
+                    until_disconnected(_coalesced(result, components), disconnected)
+                ) as tokens:
+                    async for token in tokens:
+                        chunks.append(token)
+                        await send({"token": token})
+                if disconnected.done():
+                    break
                 # Include a completion flag so clients can detect the end of the stream
-                await websocket.send_json({"reply": accumulated, "done": True})
+                await send({"reply": "".join(chunks), "done": True})
             else:
                 if isinstance(result, str):
-                    await websocket.send_json({"reply": result, "done": True})
+                    await send({"reply": result, "done": True})
                 else:
-                    await websocket.send_json({"reply": "", "done": True})
+                    await send({"reply": "", "done": True})
     except WebSocketDisconnect:
         pass
+    finally:
+        reader.cancel()
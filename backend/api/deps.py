@@ -0,0 +1,20 @@
+"""FastAPI dependencies shared by the API routers."""
+
+from __future__ import annotations
+
+from starlette.requests import HTTPConnection
+
+from ..components import VexComponents
+
+
+async def get_components(connection: HTTPConnection) -> VexComponents:
+    """Return the application's :class:`VexComponents`, starting them if needed.
+
+    Components are normally started by the application lifespan; starting
+    them here as well keeps handlers working when the lifespan did not run
+    (for example a ``TestClient`` used outside a ``with`` block).
+    """
+
+    components: VexComponents = connection.app.state.components
+    await components.startup()
+    return components
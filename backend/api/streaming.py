@@ -0,0 +1,145 @@
+"""Helpers for streaming model output to HTTP and WebSocket clients."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+from typing import AsyncGenerator, AsyncIterator, List, Optional
+
+from starlette.requests import Request
+
+
+async def wait_for_http_disconnect(request: Request) -> None:
+    """Return once the HTTP client behind ``request`` has gone away."""
+
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def until_disconnected(
+    tokens: AsyncIterator[str], disconnected: "asyncio.Future[object]"
+) -> AsyncGenerator[str, None]:
+    """Yield from ``tokens`` until they end or ``disconnected`` completes.
+
+    Waiting for the next token races against ``disconnected`` so a client
+    that leaves during a slow prefill stops generation immediately.  The
+    pending ``__anext__`` is cancelled and ``tokens`` is closed, which
+    propagates the cancellation down to the model stream.
+    """
+
+    iterator = tokens.__aiter__()
+    next_token: Optional[asyncio.Future] = None
+    try:
+        while not disconnected.done():
+            next_token = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait(
+                {next_token, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not next_token.done():
+                return
+            try:
+                token = next_token.result()
+            except StopAsyncIteration:
+                return
+            yield token
+    finally:
+        await _close_stream(tokens, next_token)
+
+
+async def _close_stream(tokens: AsyncIterator[str], pending: Optional[asyncio.Future]) -> None:
+    """Cancel ``pending`` and close ``tokens``, even if the caller is cancelled.
+
+    The server may cancel the response task when the client goes away
+    (Starlette does so without closing the body iterator), and it may keep
+    cancelling every ``await`` in cleanup code.  The cleanup therefore runs
+    in its own task so the model stream is always closed and its resources
+    released.
+    """
+
+    async def _close() -> None:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+        aclose = getattr(tokens, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    await asyncio.shield(asyncio.ensure_future(_close()))
+
+
+def coalesce(
+    tokens: AsyncIterator[str], *, max_delay: float = 0.0, max_bytes: int = 0
+) -> AsyncIterator[str]:
+    """Merge consecutive tokens into larger chunks.
+
+    A chunk is emitted once it holds ``max_bytes`` bytes (UTF-8) or
+    ``max_delay`` seconds after its first token arrived, whichever comes
+    first; a value of ``0`` disables that limit.  With both disabled
+    ``tokens`` is returned as is.  Fewer, larger frames cut the per-frame
+    encode and send overhead of busy streams.
+    """
+
+    if max_delay <= 0 and max_bytes <= 0:
+        return tokens
+    return _coalesce(tokens, max_delay, max_bytes)
+
+
+async def _coalesce(
+    tokens: AsyncIterator[str], max_delay: float, max_bytes: int
+) -> AsyncGenerator[str, None]:
+    iterator = tokens.__aiter__()
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(deadline - loop.time(), 0.0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Deadline reached while the next token is still pending.
+                yield "".join(buffer)
+                buffer.clear()
+                size, deadline = 0, None
+                continue
+            future, pending = pending, None
+            try:
+                token = future.result()
+            except StopAsyncIteration:
+                break
+            buffer.append(token)
+            size += len(token.encode("utf-8"))
+            if deadline is None and max_delay > 0:
+                deadline = loop.time() + max_delay
+            if max_bytes > 0 and size >= max_bytes:
+                yield "".join(buffer)
+                buffer.clear()
+                size, deadline = 0, None
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+        aclose = getattr(tokens, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_event(data: object) -> str:
+    """Format ``data`` as one Server-Sent Events message.
+
+    Anything but the ``[DONE]`` sentinel is JSON encoded so that newlines
+    inside tokens cannot break the event framing.
+    """
+
+    payload = data if data == "[DONE]" else json.dumps(data)
+    return f"data: {payload}\n\n"
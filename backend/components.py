@@ -0,0 +1,459 @@
+"""Application-scoped component registry.
+
+Loading the local LLM, the embedding model or connecting to the vector
+store is far too expensive to repeat for every request.  The
+:class:`VexComponents` registry creates these heavy objects once during
+the application lifespan and shares them between requests.  Model weights
+are loaded lazily, by a background warm-up right after startup
+(``WARMUP_MODELS``) or else by the first request needing them, so the
+process starts serving quickly.  Per-request state such as the
+local/remote mode lives on the lightweight
+:class:`~backend.agents.vex_router.VexRouter` returned by
+:meth:`VexComponents.create_router`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from . import metrics
+from .agents.vex_memory_manager import VexMemoryManager
+from .agents.vex_local_pool import LocalModelPool
+from .agents.vex_personality_core import VexPersonalityCore, create_http_client
+from .agents.vex_remote_endpoints import RemoteEndpointPool
+from .agents.vex_response_cache import ResponseCache
+from .agents.vex_router import VexRouter
+from .agents.vex_validator import VexValidator
+from .config.settings import Settings, settings as default_settings
+from .memory import Embedder, EmbeddingCache, MemoryIngestQueue, VectorStoreClient
+
+logger = logging.getLogger(__name__)
+
+
+class VexComponents:
+    """Own the shared model, embedding and storage objects of an app.
+
+    Parameters
+    ----------
+    config:
+        Settings used to build the components.  Defaults to the global
+        :data:`~backend.config.settings.settings`.
+    personality_core, memory_manager, validator:
+        Optional pre-built components.  Anything provided is used as-is
+        instead of being created from ``config`` during :meth:`startup`,
+        and is left open by :meth:`shutdown`.
+    """
+
+    def __init__(
+        self,
+        config: Optional[Settings] = None,
+        *,
+        personality_core: Optional[VexPersonalityCore] = None,
+        memory_manager: Optional[VexMemoryManager] = None,
+        validator: Optional[VexValidator] = None,
+    ) -> None:
+        self.settings = config or default_settings
+        self.personality_core = personality_core
+        self.memory_manager = memory_manager
+        self.validator = validator or VexValidator()
+        self.embedder: Optional[Embedder] = None
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.vector_store: Optional[VectorStoreClient] = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.local_pool: Optional[LocalModelPool] = None
+        self.response_cache: Optional[ResponseCache] = None
+        self.ingest_queue: Optional[MemoryIngestQueue] = None
+        self._collectors: List[metrics.Collector] = []
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._owns_personality_core = personality_core is None
+        self._owns_memory_manager = memory_manager is None
+        self._started = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    async def startup(self) -> None:
+        """Create the shared components.  Safe to call more than once."""
+
+        if self._started:
+            return
+        async with self._lock:
+            if self._started:
+                return
+
+            if self.memory_manager is None:
+                self.embedder = await asyncio.to_thread(self._build_embedder)
+                if self.embedder is not None:
+                    self.vector_store = await asyncio.to_thread(
+                        self._build_vector_store
+                    )
+                self.memory_manager = self._build_memory_manager()
+                try:
+                    await self.memory_manager.restore_sessions()
+                except Exception as exc:
+                    logger.warning("Could not list stored sessions: %s", exc)
+
+            if self.personality_core is None:
+                self.http_client = self._build_http_client()
+                self.local_pool = await asyncio.to_thread(self._build_local_pool)
+                self.personality_core = await asyncio.to_thread(
+                    self._build_personality_core
+                )
+
+            if self.settings.response_cache_enabled and self.response_cache is None:
+                self.response_cache = self._build_response_cache()
+
+            if self.settings.metrics_enabled:
+                metrics.REGISTRY.enabled = True
+                self._collectors = self._build_collectors()
+                for collector in self._collectors:
+                    metrics.REGISTRY.add_collector(collector)
+
+            if self.settings.warmup_models:
+                self._warmup_task = asyncio.create_task(self._warmup())
+
+            self._started = True
+
+    async def shutdown(self) -> None:
+        """Release the shared components."""
+
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._warmup_task
+            self._warmup_task = None
+        if self._collectors:
+            for collector in self._collectors:
+                metrics.REGISTRY.remove_collector(collector)
+            self._collectors = []
+            metrics.REGISTRY.enabled = False
+        if self.response_cache is not None:
+            await self.response_cache.flush()
+            self.response_cache = None
+        if self._owns_memory_manager:
+            # Closed objects must not be reused by the next startup, so the
+            # whole memory stack is rebuilt then.
+            if self.memory_manager is not None:
+                await self.memory_manager.aclose()
+                self.memory_manager = None
+            if self.vector_store is not None:
+                self.vector_store.close()
+                self.vector_store = None
+            if self.embedding_cache is not None:
+                self.embedding_cache.close()
+                self.embedding_cache = None
+            self.ingest_queue = None
+            self.embedder = None
+        elif self.memory_manager is not None:
+            await self.memory_manager.flush()
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+        if self.local_pool is not None:
+            await asyncio.to_thread(self.local_pool.close)
+            self.local_pool = None
+        if self._owns_personality_core:
+            # The core holds the now closed client; rebuild it on restart.
+            self.personality_core = None
+        self._started = False
+
+    def readiness(self) -> Dict[str, Any]:
+        """Report whether the app is ready and which components are loaded.
+
+        Components are ``"loaded"``, ``"lazy"`` (configured but loaded on
+        first use), ``"failed"`` (could not be loaded) or ``"disabled"``.
+        ``ready`` turns true once startup and the model warm-up have
+        finished.  A failed component with a fallback (the embedder, whose
+        memories fall back to the keyword index, or the local model when
+        remote endpoints exist) only marks the app ``degraded``; the app
+        is not ready while no model at all can answer.
+        """
+
+        def _state(configured: bool, loaded: bool, error: Optional[BaseException] = None) -> str:
+            if error is not None:
+                return "failed"
+            if not configured:
+                return "disabled"
+            return "loaded" if loaded else "lazy"
+
+        core = self.personality_core
+        embedder = self.embedder
+        warming_up = self._warmup_task is not None and not self._warmup_task.done()
+        components = {
+            "embedder": _state(
+                embedder is not None,
+                embedder is not None and embedder.loaded,
+                embedder.load_error if embedder is not None else None,
+            ),
+            "vector_store": _state(self.vector_store is not None, True),
+            "local_model": _state(
+                core is not None and core.has_local_model,
+                core is not None and core.local_model_loaded,
+                core.local_model_error if core is not None else None,
+            ),
+            "local_pool": _state(self.local_pool is not None, True),
+            "remote": _state(core is not None and bool(core.endpoints), True),
+        }
+        errors = {}
+        if embedder is not None and embedder.load_error is not None:
+            errors["embedder"] = str(embedder.load_error)
+        if core is not None and core.local_model_error is not None:
+            errors["local_model"] = str(core.local_model_error)
+        # Nothing can generate a reply without the local model or a remote.
+        unusable = "local_model" in errors and not (core is not None and core.endpoints)
+        report: Dict[str, Any] = {
+            "ready": self._started and not warming_up and not unusable,
+            "warming_up": warming_up,
+            "degraded": bool(errors),
+            "components": components,
+        }
+        if errors:
+            report["errors"] = errors
+        return report
+
+    async def _warmup(self) -> None:
+        """Load the embedding and local models ahead of the first request."""
+
+        if self.embedder is not None:
+            try:
+                await asyncio.to_thread(self.embedder.load)
+            except Exception:
+                pass  # logged by the embedder; memory falls back to keywords
+            else:
+                await self._warmup_vector_store()
+        core = self.personality_core
+        if core is not None and core.has_local_model:
+            try:
+                await asyncio.to_thread(core.load_local_model)
+            except Exception:
+                pass  # logged by the core
+
+    # ------------------------------------------------------------------
+    # Builders
+    # ------------------------------------------------------------------
+    def _build_embedder(self) -> Optional[Embedder]:
+        cfg = self.settings
+        if not cfg.embedding_model:
+            return None
+        try:
+            embedder = Embedder(
+                cfg.embedding_model,
+                max_batch_size=cfg.embedding_batch_size,
+                max_batch_wait=cfg.embedding_batch_wait_ms / 1000,
+            )
+        except Exception as exc:
+            # Optional dependency missing or unknown model; memories then
+            # fall back to in-process keyword matching.
+            logger.warning("Embedder unavailable: %s", exc)
+            return None
+        if cfg.embedding_cache_max_bytes > 0 or cfg.embedding_cache_path:
+            self.embedding_cache = EmbeddingCache(
+                max_bytes=cfg.embedding_cache_max_bytes,
+                path=str(cfg.embedding_cache_path) if cfg.embedding_cache_path else None,
+            )
+            embedder.cache = self.embedding_cache
+        return embedder
+
+    def _build_vector_store(self) -> Optional[VectorStoreClient]:
+        config = {
+            "backend": self.settings.vector_backend,
+            "distance": self.settings.vector_distance,
+            "dtype": self.settings.vector_local_dtype,
+        }
+        if self.settings.vector_persist_directory is not None:
+            config["persist_directory"] = str(self.settings.vector_persist_directory)
+        if self.settings.vector_url:
+            config["url"] = self.settings.vector_url
+        try:
+            return VectorStoreClient.from_config(config)
+        except Exception as exc:
+            logger.warning("Vector store unavailable: %s", exc)
+            return None
+
+    async def _warmup_vector_store(self) -> None:
+        """Create the memory collection and warm the embedding model."""
+
+        if self.embedder is None or self.vector_store is None:
+            return
+        try:
+            probe = await self.embedder.embed_many(["warmup"])
+            await self.vector_store.warmup(
+                [VexMemoryManager.COLLECTION], vector_size=len(probe[0])
+            )
+        except Exception as exc:
+            logger.warning("Vector store warm-up failed: %s", exc)
+
+    def _build_memory_manager(self) -> VexMemoryManager:
+        cfg = self.settings
+        if self.embedder is None or self.vector_store is None:
+            return VexMemoryManager(
+                max_memories=cfg.memory_keyword_capacity,
+                session_ttl=cfg.memory_session_ttl,
+            )
+        queue = self.ingest_queue = MemoryIngestQueue(
+            self.embedder,
+            self.vector_store,
+            max_buffer=cfg.memory_ingest_buffer,
+            max_batch=cfg.memory_ingest_batch,
+            flush_interval=cfg.memory_ingest_interval_ms / 1000,
+            max_retries=cfg.memory_ingest_retries,
+        )
+        return VexMemoryManager(
+            embedder=self.embedder,
+            vector_store=self.vector_store,
+            ingest_queue=queue,
+            max_memories=cfg.memory_keyword_capacity,
+            session_ttl=cfg.memory_session_ttl,
+        )
+
+    def _build_response_cache(self) -> ResponseCache:
+        cfg = self.settings
+        return ResponseCache(
+            embedder=self.embedder if cfg.response_cache_similarity > 0 else None,
+            max_entries=cfg.response_cache_max_entries,
+            ttl=cfg.response_cache_ttl,
+            similarity_threshold=cfg.response_cache_similarity,
+        )
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        cfg = self.settings
+        return create_http_client(
+            max_connections=cfg.remote_max_connections,
+            max_keepalive_connections=cfg.remote_max_keepalive_connections,
+            keepalive_expiry=cfg.remote_keepalive_expiry,
+            http2=cfg.remote_http2,
+            connect_timeout=cfg.remote_connect_timeout,
+            read_timeout=cfg.remote_total_timeout,
+        )
+
+    def _build_remote_endpoints(self) -> RemoteEndpointPool:
+        cfg = self.settings
+        urls = [cfg.remote_url] if cfg.remote_url else []
+        urls += [u.strip() for u in (cfg.remote_urls or "").split(",") if u.strip()]
+        return RemoteEndpointPool(
+            urls,
+            hedge=cfg.remote_hedge,
+            hedge_percentile=cfg.remote_hedge_percentile,
+            hedge_delay=cfg.remote_hedge_delay,
+            failure_threshold=cfg.remote_breaker_failures,
+            cooldown=cfg.remote_breaker_cooldown,
+        )
+
+    def _build_local_pool(self) -> Optional[LocalModelPool]:
+        cfg = self.settings
+        if cfg.local_workers <= 0 or not cfg.local_model_path:
+            return None
+        pool = LocalModelPool(
+            str(cfg.local_model_path),
+            instances=cfg.local_workers,
+            n_threads=cfg.local_threads_per_worker,
+            prefix_cache_bytes=cfg.local_prefix_cache_bytes,
+        )
+        try:
+            pool.start()
+        except Exception as exc:
+            logger.warning("Local model pool unavailable: %s", exc)
+            pool.close()
+            return None
+        return pool
+
+    def _build_personality_core(self) -> VexPersonalityCore:
+        model_path = self.settings.local_model_path
+        return VexPersonalityCore(
+            local_model_path=str(model_path) if model_path else None,
+            remote_url=self.settings.remote_url,
+            http_client=self.http_client,
+            first_token_timeout=self.settings.remote_first_token_timeout,
+            total_timeout=self.settings.remote_total_timeout,
+            max_queue=self.settings.local_max_queue,
+            queue_timeout=self.settings.local_queue_timeout,
+            failover_to_remote=self.settings.local_failover_to_remote,
+            local_pool=self.local_pool,
+            prefix_cache_bytes=self.settings.local_prefix_cache_bytes,
+            context_budget=self.settings.prompt_context_budget,
+            endpoints=self._build_remote_endpoints(),
+        )
+
+    def _build_collectors(self) -> List[metrics.Collector]:
+        """Expose the ``stats()`` of the shared components as metrics."""
+
+        def _scheduler():
+            core = self.personality_core
+            return core.scheduler.stats() if core is not None and core.has_local_model else None
+
+        def _prefix_cache():
+            core = self.personality_core
+            cache = core.prefix_cache if core is not None else None
+            return cache.stats() if cache is not None else None
+
+        def _stats(name: str):
+            def source():
+                component = getattr(self, name)
+                return component.stats() if component is not None else None
+
+            return source
+
+        def _endpoints():
+            core = self.personality_core
+            if core is None:
+                return
+            for stats in core.endpoints.stats():
+                labels = {"endpoint": stats["url"]}
+                for kind, seconds in stats["ewma"].items():
+                    yield (
+                        "vex_remote_latency_seconds",
+                        "gauge",
+                        "Moving average latency of remote endpoints.",
+                        {**labels, "kind": kind},
+                        seconds,
+                    )
+                yield (
+                    "vex_remote_error_rate",
+                    "gauge",
+                    "Moving average error rate of remote endpoints.",
+                    labels,
+                    stats["error_rate"],
+                )
+                yield (
+                    "vex_remote_circuit_open",
+                    "gauge",
+                    "Whether a remote endpoint is skipped by its circuit breaker.",
+                    labels,
+                    float(stats["state"] == "open"),
+                )
+
+        return [
+            metrics.stats_collector("vex_scheduler", _scheduler),
+            metrics.stats_collector("vex_prefix_cache", _prefix_cache),
+            metrics.stats_collector("vex_response_cache", _stats("response_cache")),
+            metrics.stats_collector("vex_embedding_cache", _stats("embedding_cache")),
+            metrics.stats_collector("vex_ingest_queue", _stats("ingest_queue")),
+            _endpoints,
+        ]
+
+    # ------------------------------------------------------------------
+    # Per-request helpers
+    # ------------------------------------------------------------------
+    def create_router(self, *, use_remote: bool = False) -> VexRouter:
+        """Return a request-scoped router backed by the shared components."""
+
+        if not self._started:
+            raise RuntimeError("Components have not been started")
+        router = VexRouter(
+            personality_core=self.personality_core,
+            validator=self.validator,
+            memory_manager=self.memory_manager,
+            response_cache=self.response_cache,
+        )
+        router.set_remote(use_remote)
+        return router
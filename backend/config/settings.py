@@ -26,8 +26,58 @@ class Settings(BaseSettings):
     models_path: Path = BASE_DIR.parent / 'models'
     local_model_path: Path | None = None
 
+    # Local inference: ``local_workers`` > 0 loads the model in that many
+    # worker processes instead of the API process.
+    local_workers: int = 0
+    local_threads_per_worker: int | None = None
+    local_prefix_cache_bytes: int = 256 * 1024 * 1024
+
+    # Load the local and embedding models in the background right after
+    # startup; when false they are loaded by the first request needing them
+    warmup_models: bool = True
+
+    # Local inference scheduling
+    local_max_queue: int = 16
+    local_queue_timeout: float | None = None
+    local_failover_to_remote: bool = False
+    # Largest "priority" a chat request may ask for.  Requests can only
+    # lower their own priority; 0 (the default) is served first.
+    local_max_priority: int = 10
+
+    # Prompt assembly: token budget for system prompt, memories and message
+    prompt_context_budget: int | None = 2048
+
+    # Streaming: merge tokens into one frame until this many milliseconds
+    # have passed or bytes are buffered (0 disables either limit)
+    stream_coalesce_ms: float = 0.0
+    stream_coalesce_bytes: int = 0
+
+    # Response cache: repeated questions plus questions whose embedding
+    # similarity reaches ``response_cache_similarity`` (0 disables that tier)
+    response_cache_enabled: bool = False
+    response_cache_max_entries: int = 1024
+    response_cache_ttl: float = 3600.0
+    response_cache_similarity: float = 0.95
+
+    # Observability: record timings/counters and serve them at ``/metrics``
+    metrics_enabled: bool = False
+
     # Remote inference
     remote_url: str | None = None
+    remote_max_connections: int = 100
+    remote_max_keepalive_connections: int = 20
+    remote_keepalive_expiry: float = 30.0
+    remote_http2: bool = False
+    remote_connect_timeout: float = 5.0
+    remote_first_token_timeout: float = 30.0
+    remote_total_timeout: float = 120.0
+    # Additional endpoints (comma separated) for latency-aware routing
+    remote_urls: str | None = None
+    remote_hedge: bool = False
+    remote_hedge_percentile: float = 0.95
+    remote_hedge_delay: float = 1.0
+    remote_breaker_failures: int = 3
+    remote_breaker_cooldown: float = 30.0
 
     # API keys
     openai_api_key: str | None = None
@@ -35,8 +85,26 @@ class Settings(BaseSettings):
     anthropic_api_key: str | None = None
 
     # Model settings
-    embedding_model: str | None = 'text-embedding-3-large'
-    vector_backend: Literal["chroma", "qdrant"] = "chroma"
+    embedding_model: str | None = 'all-MiniLM-L6-v2'
+    embedding_batch_size: int = 32
+    embedding_batch_wait_ms: float = 5.0
+    embedding_cache_max_bytes: int = 64 * 1024 * 1024
+    embedding_cache_path: Path | None = None
+
+    # Memory ingestion (write-behind queue)
+    memory_ingest_buffer: int = 1024
+    memory_ingest_batch: int = 64
+    memory_ingest_interval_ms: float = 50.0
+    memory_ingest_retries: int = 3
+    # Keyword fallback index: memories kept before the oldest are evicted
+    memory_keyword_capacity: int = 10_000
+    # Seconds before an idle session's memories are deleted (0 keeps them)
+    memory_session_ttl: float = 3600.0
+    vector_backend: Literal["chroma", "qdrant", "local"] = "chroma"
+    vector_persist_directory: Path | None = None
+    vector_url: str | None = None
+    vector_distance: Literal["cosine", "ip", "l2"] = "cosine"
+    vector_local_dtype: Literal["float32", "float16", "int8"] = "float32"
 
     @field_validator("vector_backend", mode="before")
     @classmethod
@@ -44,8 +112,8 @@ class Settings(BaseSettings):
         if v is None:
             return "chroma"
         v = v.lower()
-        if v not in {"chroma", "qdrant"}:
-            raise ValueError("VECTOR_BACKEND must be 'chroma' or 'qdrant'")
+        if v not in {"chroma", "qdrant", "local"}:
+            raise ValueError("VECTOR_BACKEND must be 'chroma', 'qdrant' or 'local'")
         return v
 
     # Feature flags
@@ -1,12 +1,35 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from backend import metrics
 
 from backend.api.router import api_router
+from backend.components import VexComponents
+
+
+def create_app(components: Optional[VexComponents] = None) -> FastAPI:
+    """Application factory for FastAPI.
+
+    ``components`` allows callers to inject a pre-built registry; by
+    default one is created from the global settings.  Heavy components are
+    loaded once when the application starts and released on shutdown.
+    """
+    components = components or VexComponents()
 
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        await components.startup()
+        try:
+            yield
+        finally:
+            await components.shutdown()
 
-def create_app() -> FastAPI:
-    """Application factory for FastAPI."""
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
+    app.state.components = components
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -18,6 +41,27 @@ def create_app() -> FastAPI:
     @app.get("/")
     async def root() -> dict[str, str]:
         return {"status": "ok"}
+
+    @app.get("/ready")
+    async def ready() -> JSONResponse:
+        """Readiness probe: ``503`` until startup and model warm-up finished.
+
+        The body lists which components are loaded, loaded lazily on first
+        use, failed or disabled.  Failed components with a fallback are
+        reported as ``degraded`` but keep the app ready.
+        """
+        report = components.readiness()
+        return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+    if components.settings.metrics_enabled:
+
+        @app.get("/metrics", response_class=PlainTextResponse)
+        async def prometheus_metrics() -> PlainTextResponse:
+            return PlainTextResponse(
+                metrics.REGISTRY.render(),
+                media_type="text/plain; version=0.0.4; charset=utf-8",
+            )
+
     return app
 
 
@@ -2,5 +2,16 @@
 
 from .chroma_client import VectorStoreClient
 from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
+from .ingest import MemoryIngestQueue
+from .keyword_index import KeywordIndex
+from .local_index import LocalVectorIndex
 
-__all__ = ["VectorStoreClient", "Embedder"]
+__all__ = [
+    "VectorStoreClient",
+    "Embedder",
+    "EmbeddingCache",
+    "MemoryIngestQueue",
+    "LocalVectorIndex",
+    "KeywordIndex",
+]
@@ -1,29 +1,47 @@
-"""Asynchronous vector store client supporting ChromaDB and Qdrant."""
+"""Asynchronous vector store client supporting ChromaDB, Qdrant and a local index."""
 
 from __future__ import annotations
 
 import asyncio
 from functools import partial
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .. import metrics
+
+_QDRANT_DISTANCES = {"cosine": "Cosine", "ip": "Dot", "l2": "Euclid"}
 
 
 class VectorStoreClient:
-    """Simple abstraction over ChromaDB and Qdrant vector stores.
+    """Simple abstraction over ChromaDB, Qdrant and local vector stores.
+
+    Collection handles are cached after first use so that the hot
+    add/query path does not look the collection up on every call.  A
+    cached handle is dropped (and looked up again) when an operation on it
+    fails.
 
     Parameters
     ----------
     config:
         Configuration dictionary. Must contain the key ``backend`` with value
-        either ``"chroma"`` or ``"qdrant"``. Backend specific settings are
-        also read from this dictionary.
+        ``"chroma"``, ``"qdrant"`` or ``"local"`` (an in-process NumPy
+        index, see :class:`~backend.memory.local_index.LocalVectorIndex`).
+        Backend specific settings are also read from this dictionary.
+        ``distance`` (``"cosine"``, ``"ip"`` or ``"l2"``) selects the metric
+        used for new collections and ``vector_size`` the dimension of new
+        Qdrant collections.
     """
 
     def __init__(self, config: Dict[str, Any]):
         self.backend = config.get("backend", "chroma").lower()
+        self.distance = config.get("distance", "cosine").lower()
+        self.vector_size: Optional[int] = config.get("vector_size")
+        self._collections: Dict[str, Any] = {}
         if self.backend == "chroma":
             self._client = self._init_chroma(config)
         elif self.backend == "qdrant":
             self._client = self._init_qdrant(config)
+        elif self.backend == "local":
+            self._client = self._init_local(config)
         else:  # pragma: no cover - defensive
             raise ValueError(f"Unsupported backend: {self.backend}")
 
@@ -37,8 +55,10 @@ class VectorStoreClient:
             raise ImportError("chromadb is required for Chroma backend") from exc
 
         persist_dir = config.get("persist_directory")
-        settings = Settings(chroma_db_impl="duckdb+parquet", persist_directory=persist_dir)
-        return chromadb.Client(settings)
+        settings = Settings(anonymized_telemetry=False)
+        if persist_dir:
+            return chromadb.PersistentClient(path=persist_dir, settings=settings)
+        return chromadb.EphemeralClient(settings=settings)
 
     def _init_qdrant(self, config: Dict[str, Any]):
         try:
@@ -50,6 +70,15 @@ class VectorStoreClient:
         api_key = config.get("api_key")
         return QdrantClient(url=url, api_key=api_key)
 
+    def _init_local(self, config: Dict[str, Any]):
+        from .local_index import LocalVectorIndex
+
+        return LocalVectorIndex(
+            path=config.get("persist_directory"),
+            dtype=config.get("dtype", "float32"),
+            distance=self.distance,
+        )
+
     # ------------------------------------------------------------------
     async def add_vectors(
         self,
@@ -60,10 +89,15 @@ class VectorStoreClient:
     ) -> None:
         """Add embeddings to the vector store."""
 
-        if self.backend == "chroma":
-            await self._add_chroma(collection, ids, vectors, metadatas)
-        else:
-            await self._add_qdrant(collection, ids, vectors, metadatas)
+        with metrics.VECTOR_STORE_SECONDS.time(backend=self.backend, op="add"):
+            if self.backend == "chroma":
+                await self._add_chroma(collection, ids, vectors, metadatas)
+            elif self.backend == "local":
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._client.add, collection, list(ids), vectors, metadatas
+                )
+            else:
+                await self._add_qdrant(collection, ids, vectors, metadatas)
 
     async def _add_chroma(
         self,
@@ -72,17 +106,14 @@ class VectorStoreClient:
         vectors: Sequence[Sequence[float]],
         metadatas: Optional[Sequence[Dict[str, Any]]],
     ) -> None:
-        loop = asyncio.get_running_loop()
-        coll = await loop.run_in_executor(
-            None, self._client.get_or_create_collection, collection
-        )
-        add = partial(
-            coll.add,
-            ids=list(ids),
-            embeddings=[list(v) for v in vectors],
-            metadatas=list(metadatas) if metadatas is not None else None,
+        await self._with_chroma_collection(
+            collection,
+            lambda coll: coll.add(
+                ids=list(ids),
+                embeddings=[list(v) for v in vectors],
+                metadatas=list(metadatas) if metadatas is not None else None,
+            ),
         )
-        await loop.run_in_executor(None, add)
 
     async def _add_qdrant(
         self,
@@ -100,55 +131,218 @@ class VectorStoreClient:
             PointStruct(id=id_, vector=list(vec), payload=meta or {})
             for id_, vec, meta in zip(ids, vectors, metadatas or [{}] * len(ids))
         ]
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self._client.upsert, collection, points)
+        await self.ensure_collection(collection, len(points[0].vector) if points else None)
+        await self._with_qdrant_collection(
+            collection, partial(self._client.upsert, collection, points)
+        )
 
     # ------------------------------------------------------------------
     async def query(
         self, collection: str, vector: Sequence[float], *, n_results: int = 3
     ) -> List[Tuple[str, float, Dict[str, Any]]]:
-        """Query the vector store and return list of (id, score, metadata)."""
+        """Query the vector store and return list of (id, score, metadata).
 
-        if self.backend == "chroma":
-            return await self._query_chroma(collection, vector, n_results)
-        else:
-            return await self._query_qdrant(collection, vector, n_results)
+        Scores are similarities for every backend and metric: higher is
+        better.
+        """
+
+        return (await self.query_many(collection, [vector], n_results=n_results))[0]
+
+    async def query_many(
+        self,
+        collection: str,
+        vectors: Sequence[Sequence[float]],
+        *,
+        n_results: int = 3,
+    ) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """Run several queries in one backend call.
+
+        Returns one ``(id, score, metadata)`` list per query vector, in the
+        order of ``vectors``.
+        """
+
+        if not vectors:
+            return []
+        with metrics.VECTOR_STORE_SECONDS.time(backend=self.backend, op="query"):
+            if self.backend == "chroma":
+                return await self._query_chroma(collection, vectors, n_results)
+            elif self.backend == "local":
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, self._client.query_many, collection, vectors, n_results
+                )
+            else:
+                return await self._query_qdrant(collection, vectors, n_results)
+
+    def _similarity(self, distance: float) -> float:
+        # Chroma reports distances: ``1 - cos``, ``1 - dot`` or squared l2.
+        if self.distance == "l2":
+            return -float(distance)
+        return 1.0 - float(distance)
 
     async def _query_chroma(
-        self, collection: str, vector: Sequence[float], n_results: int
-    ) -> List[Tuple[str, float, Dict[str, Any]]]:
-        loop = asyncio.get_running_loop()
-        coll = await loop.run_in_executor(
-            None, self._client.get_or_create_collection, collection
-        )
-        query = partial(
-            coll.query,
-            query_embeddings=[list(vector)],
-            n_results=n_results,
+        self, collection: str, vectors: Sequence[Sequence[float]], n_results: int
+    ) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        res = await self._with_chroma_collection(
+            collection,
+            lambda coll: coll.query(
+                query_embeddings=[list(v) for v in vectors],
+                n_results=n_results,
+            ),
         )
-        res = await loop.run_in_executor(None, query)
-        ids = res.get("ids", [[]])[0]
-        distances = res.get("distances", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        return [(id_, dist, meta) for id_, dist, meta in zip(ids, distances, metas)]
+        empty = [[] for _ in vectors]
+        return [
+            [
+                (id_, self._similarity(dist), meta or {})
+                for id_, dist, meta in zip(ids, distances, metas)
+            ]
+            for ids, distances, metas in zip(
+                res.get("ids") or empty,
+                res.get("distances") or empty,
+                res.get("metadatas") or empty,
+            )
+        ]
 
     async def _query_qdrant(
-        self, collection: str, vector: Sequence[float], n_results: int
-    ) -> List[Tuple[str, float, Dict[str, Any]]]:
-        loop = asyncio.get_running_loop()
-        res = await loop.run_in_executor(
-            None,
-            self._client.search,
-            collection,
-            list(vector),
-            n_results,
-            True,
+        self, collection: str, vectors: Sequence[Sequence[float]], n_results: int
+    ) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        try:
+            from qdrant_client.http.models import QueryRequest
+        except Exception as exc:  # pragma: no cover - optional dependency
+            raise ImportError("qdrant-client is required for Qdrant backend") from exc
+
+        # ``search_batch`` is deprecated and gone from current clients.
+        requests = [
+            QueryRequest(query=list(v), limit=n_results, with_payload=True)
+            for v in vectors
+        ]
+        search = partial(
+            self._client.query_batch_points, collection_name=collection, requests=requests
         )
+        res = await self._with_qdrant_collection(collection, search)
+        # Qdrant reports euclidean distance as the score; flip it so that
+        # higher is better like the other metrics.
+        sign = -1.0 if self.distance == "l2" else 1.0
         return [
-            (str(p.id), float(p.score), dict(p.payload or {}))
-            for p in res
+            [(str(p.id), sign * float(p.score), dict(p.payload or {})) for p in response.points]
+            for response in res
         ]
 
+    # ------------------------------------------------------------------
+    # collection management
+    async def ensure_collection(self, collection: str, vector_size: Optional[int] = None) -> None:
+        """Create ``collection`` if needed and cache its handle.
+
+        For Qdrant the collection is created with ``vector_size`` (or the
+        configured :attr:`vector_size`) and :attr:`distance`; without a
+        known size creation is deferred until the first write.
+        """
+
+        if collection in self._collections or self.backend == "local":
+            return
+        loop = asyncio.get_running_loop()
+        if self.backend == "chroma":
+            handle = await loop.run_in_executor(
+                None, self._get_chroma_collection, collection
+            )
+            self._collections[collection] = handle
+            return
+
+        size = vector_size or self.vector_size
+        if size is None:
+            return
+        await loop.run_in_executor(None, self._create_qdrant_collection, collection, size)
+        self._collections[collection] = True
+
+    async def warmup(
+        self, collections: Sequence[str], *, vector_size: Optional[int] = None
+    ) -> None:
+        """Connect to the backend and prepare ``collections`` ahead of traffic."""
+
+        if vector_size is not None:
+            self.vector_size = vector_size
+        for collection in collections:
+            await self.ensure_collection(collection)
+
+    async def list_collections(self) -> List[str]:
+        """Return the names of all collections held by the backend."""
+
+        return await asyncio.get_running_loop().run_in_executor(None, self._list_collections)
+
+    def _list_collections(self) -> List[str]:
+        if self.backend == "local":
+            return self._client.collections()
+        if self.backend == "chroma":
+            # Chroma >= 0.6 returns names, older releases collection objects.
+            return [getattr(c, "name", c) for c in self._client.list_collections()]
+        return [c.name for c in self._client.get_collections().collections]
+
+    async def delete_collection(self, collection: str) -> None:
+        """Drop ``collection`` and everything stored in it, if it exists."""
+
+        self.invalidate(collection)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._client.delete_collection, collection)
+        except Exception:
+            # Chroma raises for unknown collections; treat them as deleted.
+            if self.backend != "chroma":
+                raise
+
+    def invalidate(self, collection: Optional[str] = None) -> None:
+        """Forget cached handles for ``collection`` (or all collections)."""
+
+        if collection is None:
+            self._collections.clear()
+        else:
+            self._collections.pop(collection, None)
+
+    def _get_chroma_collection(self, collection: str) -> Any:
+        return self._client.get_or_create_collection(
+            collection, metadata={"hnsw:space": self.distance}
+        )
+
+    def _create_qdrant_collection(self, collection: str, size: int) -> None:
+        from qdrant_client.http.models import Distance, VectorParams
+
+        if self._client.collection_exists(collection):
+            return
+        self._client.create_collection(
+            collection,
+            vectors_config=VectorParams(
+                size=size, distance=Distance(_QDRANT_DISTANCES.get(self.distance, "Cosine"))
+            ),
+        )
+
+    async def _with_chroma_collection(self, collection: str, op: Callable[[Any], Any]) -> Any:
+        """Run ``op(handle)`` in the executor, refreshing a stale handle once."""
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            await self.ensure_collection(collection)
+            handle = self._collections[collection]
+            try:
+                return await loop.run_in_executor(None, op, handle)
+            except Exception:
+                self.invalidate(collection)
+                if attempt:
+                    raise
+        return None  # pragma: no cover - loop always returns or raises
+
+    async def _with_qdrant_collection(self, collection: str, op: Callable[[], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, op)
+        except Exception:
+            self.invalidate(collection)
+            raise
+
+    def close(self) -> None:
+        """Flush and release local resources held by the backend."""
+
+        close = getattr(self._client, "close", None)
+        if close is not None:
+            close()
+
     # ------------------------------------------------------------------
     @classmethod
     def from_config(cls, config: Dict[str, Any]) -> "VectorStoreClient":
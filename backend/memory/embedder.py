@@ -1,10 +1,13 @@
 import asyncio
-from typing import List, Dict, Optional
+import importlib.util
+import logging
+import threading
+from typing import Any, List, Dict, Optional, Sequence, Set, Tuple
 
-try:
-    from sentence_transformers import SentenceTransformer
-except ImportError:  # pragma: no cover - optional dependency
-    SentenceTransformer = None  # type: ignore
+from .. import metrics
+from .embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
 
 
 _MODEL_MAP = {
@@ -13,9 +16,65 @@ _MODEL_MAP = {
 }
 
 
+class _EmbedBatcher:
+    """Collect concurrent :meth:`Embedder.embed` calls into batches.
+
+    A batch is flushed once ``max_batch_size`` texts are pending or
+    ``max_wait`` seconds after the first text arrived, whichever happens
+    first.  A batcher is bound to the event loop it was created on.
+    """
+
+    def __init__(self, embedder: "Embedder", loop: asyncio.AbstractEventLoop):
+        self._embedder = embedder
+        self.loop = loop
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, text: str) -> asyncio.Future:
+        future = self.loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self._embedder.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self._embedder.max_batch_wait, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = self.loop.create_task(self._run(batch))
+        # Keep a reference so the task is not garbage collected mid-flight.
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            vectors = await self._embedder.embed_many([text for text, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
 class Embedder:
     """Wrapper around :mod:`sentence_transformers` models.
 
+    Concurrent :meth:`embed` calls are transparently micro-batched so that
+    one forward pass serves many callers.  ``sentence_transformers`` (and
+    with it ``torch``) is only imported and the model only loaded on first
+    use or when :meth:`load` is called, so creating an embedder is cheap.
+    A failed load is remembered: the embedder then reports itself as not
+    :attr:`available` and fails fast instead of loading again.
+
     Parameters
     ----------
     model_key:
@@ -24,28 +83,164 @@ class Embedder:
         name may be provided.
     device:
         Optional device identifier passed to SentenceTransformer.
+    model:
+        Optional pre-loaded model exposing a SentenceTransformer compatible
+        ``encode`` method.  When given no model is loaded.
+    max_batch_size:
+        Maximum number of texts encoded in one call.
+    max_batch_wait:
+        Seconds :meth:`embed` waits for other callers before encoding.
+    cache:
+        Optional :class:`EmbeddingCache` consulted before encoding.
+
+    Raises
+    ------
+    ImportError
+        If no ``model`` is given and ``sentence-transformers`` is not
+        installed.
     """
 
-    def __init__(self, model_key: str = "MiniLM", *, device: Optional[str] = None):
-        if SentenceTransformer is None:  # pragma: no cover - dependency not installed
+    def __init__(
+        self,
+        model_key: str = "MiniLM",
+        *,
+        device: Optional[str] = None,
+        model: Any = None,
+        max_batch_size: int = 32,
+        max_batch_wait: float = 0.005,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        self.model_name = _MODEL_MAP.get(model_key, model_key)
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self._batcher: Optional[_EmbedBatcher] = None
+        self._device = device
+        self._model = model
+        self._load_lock = threading.Lock()
+        # Why the model failed to load, if it did.
+        self.load_error: Optional[BaseException] = None
+
+        if model is None and importlib.util.find_spec("sentence_transformers") is None:
             raise ImportError(
                 "sentence-transformers package is required for Embedder"
             )
 
-        model_name = _MODEL_MAP.get(model_key, model_key)
-        self._model = SentenceTransformer(model_name, device=device)
+    @property
+    def loaded(self) -> bool:
+        """Whether the embedding model has been loaded."""
+        return self._model is not None
+
+    @property
+    def available(self) -> bool:
+        """``False`` once loading the model has failed."""
+        return self.load_error is None
+
+    def load(self) -> Any:
+        """Load the model if needed and return it.  Blocking; thread-safe.
+
+        Raises
+        ------
+        RuntimeError
+            If the model cannot be loaded, now or in an earlier call.
+        """
+
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None and self.load_error is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+
+                        self._model = SentenceTransformer(self.model_name, device=self._device)
+                    except Exception as exc:
+                        logger.warning("Embedding model %r unavailable: %s", self.model_name, exc)
+                        self.load_error = exc
+                if self._model is None:
+                    raise RuntimeError(
+                        f"Embedding model {self.model_name!r} failed to load: {self.load_error}"
+                    ) from self.load_error
+        return self._model
 
     async def embed(self, text: str) -> List[float]:
-        """Asynchronously embed ``text`` returning a list of floats."""
+        """Asynchronously embed ``text`` returning a list of floats.
+
+        The call joins the current micro-batch; see :meth:`embed_many` for
+        embedding a known list of texts in one go.
+        """
+
+        if self.cache is not None:
+            cached = self.cache.get(self.cache.key(self.model_name, text))
+            if cached is not None:
+                return cached
 
         loop = asyncio.get_running_loop()
-        vector = await loop.run_in_executor(None, self._model.encode, text)
-        return vector.tolist() if hasattr(vector, "tolist") else list(vector)
+        if self._batcher is None or self._batcher.loop is not loop:
+            self._batcher = _EmbedBatcher(self, loop)
+        return await self._batcher.submit(text)
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed ``texts`` with a single ``encode`` call.
+
+        Texts found in :attr:`cache` are not encoded again and duplicates
+        within ``texts`` are encoded once.
+        """
+
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        cache = self.cache
+        keys = [cache.key(self.model_name, t) for t in texts] if cache is not None else list(texts)
+        known: Dict[str, List[float]] = {}
+        if cache is not None:
+            if cache.has_disk:
+                known = await loop.run_in_executor(None, cache.lookup_many, keys)
+            else:
+                known = cache.lookup_many(keys)
+
+        todo: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in known:
+                todo.setdefault(key, text)
+
+        if todo:
+            def _encode() -> Any:
+                model = self.load()
+                with metrics.EMBED_SECONDS.time():
+                    return model.encode(list(todo.values()), batch_size=self.max_batch_size)
+
+            metrics.EMBED_BATCH_SIZE.observe(len(todo))
+
+            vectors = await loop.run_in_executor(None, _encode)
+            fresh = {
+                key: v.tolist() if hasattr(v, "tolist") else list(v)
+                for key, v in zip(todo, vectors)
+            }
+            if cache is not None:
+                if cache.has_disk:
+                    await loop.run_in_executor(None, cache.store_many, fresh)
+                else:
+                    cache.store_many(fresh)
+            known.update(fresh)
+
+        return [known[key] for key in keys]
 
     @classmethod
-    def from_config(cls, config: Dict[str, str]) -> "Embedder":
+    def from_config(cls, config: Dict[str, Any]) -> "Embedder":
         """Create an :class:`Embedder` from a configuration mapping."""
 
         model_key = config.get("model", "MiniLM")
         device = config.get("device")
-        return cls(model_key=model_key, device=device)
+        cache = None
+        if config.get("cache_max_bytes") or config.get("cache_path"):
+            cache = EmbeddingCache(
+                max_bytes=int(config.get("cache_max_bytes", 64 * 1024 * 1024)),
+                path=config.get("cache_path"),
+            )
+        return cls(
+            model_key=model_key,
+            device=device,
+            cache=cache,
+            max_batch_size=int(config.get("max_batch_size", 32)),
+            max_batch_wait=float(config.get("max_batch_wait", 0.005)),
+        )
@@ -0,0 +1,172 @@
+"""Content-addressed cache for text embeddings.
+
+Vectors are keyed by a hash of the embedding model name and the
+whitespace-normalised text, so the same message is only ever encoded once
+per model.  Entries live in a byte-bounded in-memory LRU and, optionally,
+in a SQLite file that survives restarts.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+
+class EmbeddingCache:
+    """Two-tier (memory + optional disk) embedding cache.
+
+    Parameters
+    ----------
+    max_bytes:
+        Budget for vector data held in memory.  Least recently used entries
+        are evicted once the budget is exceeded.
+    path:
+        Optional SQLite database path used as a persistent second tier.
+    """
+
+    def __init__(self, *, max_bytes: int = 64 * 1024 * 1024, path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self._db.commit()
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        """Return the cache key for ``text`` embedded with ``model_name``."""
+
+        normalized = " ".join(text.split())
+        digest = hashlib.sha256(f"{model_name}\0{normalized}".encode("utf-8"))
+        return digest.hexdigest()
+
+    @property
+    def has_disk(self) -> bool:
+        return self._db is not None
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and memory usage."""
+
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    # ------------------------------------------------------------------
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return a vector from the memory tier only, counting hits."""
+
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+    def lookup_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for ``keys`` from memory, then disk.
+
+        Disk hits are promoted to the memory tier.  This call may touch the
+        database and should be run off the event loop when :attr:`has_disk`.
+        """
+
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = vector.tolist()
+
+        if missing and self._db is not None:
+            for key, vector in self._load(missing).items():
+                self._remember(key, vector)
+                self.disk_hits += 1
+                found[key] = vector.tolist()
+
+        self.misses += sum(1 for key in missing if key not in found)
+        return found
+
+    def store_many(self, items: Mapping[str, Sequence[float]]) -> None:
+        """Insert ``items`` into the memory tier and, if enabled, disk."""
+
+        packed = {key: array("f", vector) for key, vector in items.items()}
+        for key, vector in packed.items():
+            self._remember(key, vector)
+        if self._db is not None and packed:
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in packed.items()],
+                )
+                self._db.commit()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ------------------------------------------------------------------
+    def _remember(self, key: str, vector: array) -> None:
+        size = vector.itemsize * len(vector)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.itemsize * len(previous)
+            self._entries[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.itemsize * len(evicted)
+
+    def _load(self, keys: Iterable[str]) -> Dict[str, array]:
+        keys = list(keys)
+        rows = []
+        # Stay below SQLite's default limit on bound parameters.
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            with self._lock:
+                rows.extend(
+                    self._db.execute(  # type: ignore[union-attr]
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+        result: Dict[str, array] = {}
+        for key, blob in rows:
+            vector = array("f")
+            vector.frombytes(blob)
+            result[key] = vector
+        return result
@@ -0,0 +1,276 @@
+"""Write-behind ingestion queue for memories.
+
+Writing memories one at a time costs one embedding pass and one vector
+store round-trip per item.  :class:`MemoryIngestQueue` buffers memories,
+embeds them in batches and upserts them in bulk per collection, retrying
+failed writes with exponential backoff.  The buffer is bounded: once it
+is full :meth:`~MemoryIngestQueue.put_many` waits and
+:meth:`~MemoryIngestQueue.offer_many` drops the memories instead of
+growing memory without limit.  Memories
+still queued for a discarded collection are dropped instead of creating
+it again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from .. import metrics
+from .chroma_client import VectorStoreClient
+from .embedder import Embedder
+
+logger = logging.getLogger(__name__)
+
+# (collection, content, metadata, generation of the collection)
+_Item = Tuple[str, str, Dict[str, Any], int]
+
+
+class MemoryIngestQueue:
+    """Batch memory writes to an :class:`Embedder` and :class:`VectorStoreClient`.
+
+    Parameters
+    ----------
+    embedder, vector_store:
+        Backends used to embed and persist memories.
+    max_buffer:
+        Maximum number of memories waiting to be written.
+    max_batch:
+        Maximum number of memories embedded and written together.
+    flush_interval:
+        Seconds to wait for more memories before writing a partial batch.
+    max_retries, retry_backoff:
+        Failed writes are retried ``max_retries`` times, sleeping
+        ``retry_backoff * 2 ** attempt`` seconds in between.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        vector_store: VectorStoreClient,
+        *,
+        max_buffer: int = 1024,
+        max_batch: int = 64,
+        flush_interval: float = 0.05,
+        max_retries: int = 3,
+        retry_backoff: float = 0.1,
+    ) -> None:
+        self._embedder = embedder
+        self._vector_store = vector_store
+        self.max_buffer = max_buffer
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "pending": self.pending,
+        }
+
+    # ------------------------------------------------------------------
+    async def put(
+        self, collection: str, content: str, metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Queue ``content`` for ``collection``, waiting if the buffer is full."""
+
+        await self.put_many(collection, [content], [metadata or {}])
+
+    async def put_many(
+        self,
+        collection: str,
+        contents: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> None:
+        queue = self._ensure_worker()
+        metadatas = metadatas or [{} for _ in contents]
+        for content, metadata in zip(contents, metadatas):
+            generation = self._generations[collection]
+            await queue.put((collection, content, {"text": content, **metadata}, generation))
+            self.enqueued += 1
+
+    def offer_many(
+        self,
+        collection: str,
+        contents: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> int:
+        """Queue what fits without waiting and return how many were queued.
+
+        Memories that do not fit into the full buffer are dropped and
+        counted in :attr:`rejected`, so callers on the response path never
+        park behind a slow vector store.
+        """
+
+        queue = self._ensure_worker()
+        metadatas = metadatas or [{} for _ in contents]
+        queued = 0
+        for content, metadata in zip(contents, metadatas):
+            generation = self._generations[collection]
+            try:
+                queue.put_nowait((collection, content, {"text": content, **metadata}, generation))
+            except asyncio.QueueFull:
+                break
+            queued += 1
+        self.enqueued += queued
+        if queued < len(contents):
+            self.rejected += len(contents) - queued
+            logger.debug("Ingest buffer full; dropped %d memories", len(contents) - queued)
+        return queued
+
+    def discard(self, collection: str) -> None:
+        """Drop memories queued for ``collection`` that are not written yet.
+
+        Call this before deleting the collection so that a pending write
+        does not create it again.  Memories queued afterwards are kept.
+        """
+
+        self._generations[collection] += 1
+
+    async def flush(self) -> None:
+        """Wait until every queued memory has been written or dropped."""
+
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def aclose(self) -> None:
+        """Flush outstanding memories and stop the background worker."""
+
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    # ------------------------------------------------------------------
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(maxsize=self.max_buffer)
+            self._loop = loop
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[_Item] = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                with metrics.MEMORY_WRITE_SECONDS.time():
+                    await self._write(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _write(self, batch: List[_Item]) -> None:
+        live = [item for item in batch if not self._discarded(item[0], item[3])]
+        self.dropped += len(batch) - len(live)
+        batch = live
+        if not batch:
+            return
+        texts = [content for _, content, _, _ in batch]
+        if not self._embedder.available:
+            # The model failed to load; the memories only live in the
+            # keyword index.
+            return
+        ok, vectors = await self._retry(lambda: self._embedder.embed_many(texts), len(batch))
+        if not ok:
+            return
+
+        grouped: Dict[Tuple[str, int], List[Tuple[List[float], Dict[str, Any]]]] = defaultdict(list)
+        for (collection, _, metadata, generation), vector in zip(batch, vectors):
+            grouped[collection, generation].append((vector, metadata))
+
+        for (collection, generation), rows in grouped.items():
+            if self._discarded(collection, generation):
+                # Deleted while the batch was being embedded.
+                self.dropped += len(rows)
+                continue
+            # Ids are fixed before retrying so a retried upsert cannot
+            # duplicate rows that a failed attempt had already written.
+            ids = [str(uuid4()) for _ in rows]
+
+            def _add(collection: str = collection, rows=rows, ids=ids) -> Awaitable[None]:
+                return self._vector_store.add_vectors(
+                    collection,
+                    ids=ids,
+                    vectors=[vector for vector, _ in rows],
+                    metadatas=[metadata for _, metadata in rows],
+                )
+
+            ok, _ = await self._retry(_add, len(rows), collection, generation)
+            if ok:
+                self.written += len(rows)
+
+    def _discarded(self, collection: str, generation: int) -> bool:
+        return self._generations[collection] != generation
+
+    async def _retry(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        count: int,
+        collection: Optional[str] = None,
+        generation: int = 0,
+    ) -> Tuple[bool, Any]:
+        """Run ``call`` with retries and return ``(succeeded, result)``.
+
+        With ``collection`` retries stop once that collection is discarded.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return True, await call()
+            except Exception as exc:
+                # Retrying cannot help once the embedding model failed to load.
+                if attempt == self.max_retries or not self._embedder.available:
+                    self.failed += count
+                    logger.warning(
+                        "Dropping %d memories after %d attempts: %s",
+                        count,
+                        attempt + 1,
+                        exc,
+                    )
+                    break
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                if collection is not None and self._discarded(collection, generation):
+                    self.dropped += count
+                    break
+        return False, None
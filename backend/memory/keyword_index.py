@@ -0,0 +1,121 @@
+"""Bounded in-memory inverted index with BM25 ranking.
+
+Used as the keyword fallback of :class:`~backend.agents.vex_memory_manager.VexMemoryManager`
+when no embedder or vector store is configured.  Documents are tokenised
+once when added; a query only visits the posting lists of its own terms,
+so memories sharing no word with it cost nothing.  Posting lists of
+common words still grow with the number of stored memories, so search
+cost grows roughly linearly with the index size; ``max_documents`` bounds
+it.  The index holds at most ``max_documents`` entries and evicts the
+oldest ones first.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterator, List, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case ``text`` and split it into word tokens."""
+
+    return _TOKEN_RE.findall(text.lower())
+
+
+class KeywordIndex:
+    """Incrementally maintained BM25 index over short texts.
+
+    Parameters
+    ----------
+    max_documents:
+        Maximum number of documents kept; the oldest are evicted first.
+    k1, b:
+        BM25 term-frequency saturation and length normalisation.
+    """
+
+    def __init__(self, *, max_documents: int = 10_000, k1: float = 1.2, b: float = 0.75) -> None:
+        if max_documents < 1:
+            raise ValueError("max_documents must be at least 1")
+        self.max_documents = max_documents
+        self.k1 = k1
+        self.b = b
+        self.evicted = 0
+        self._next_id = 0
+        self._docs: "OrderedDict[int, Tuple[str, int]]" = OrderedDict()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over stored documents, oldest first."""
+
+        return iter([text for text, _ in self._docs.values()])
+
+    # ------------------------------------------------------------------
+    def add(self, text: str) -> int:
+        """Index ``text`` and return its document id."""
+
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        with self._lock:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._docs[doc_id] = (text, length)
+            self._total_length += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            while len(self._docs) > self.max_documents:
+                self._evict_oldest()
+        return doc_id
+
+    def _evict_oldest(self) -> None:
+        doc_id, (text, length) = self._docs.popitem(last=False)
+        self._total_length -= length
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self.evicted += 1
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` ``(text, score)`` pairs, best match first."""
+
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not terms or not n_docs or top_k <= 0:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self._docs[doc_id][1]
+                    norm = self.k1 * (1.0 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            # Ties go to the most recent memory.
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], item[0]))
+            return [(self._docs[doc_id][0], score) for doc_id, score in best]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "documents": len(self._docs),
+            "terms": len(self._postings),
+            "evicted": self.evicted,
+        }
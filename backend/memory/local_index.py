@@ -0,0 +1,351 @@
+"""In-process vector index backed by NumPy.
+
+For small and medium collections a round-trip to an external vector
+database costs more than scanning the vectors directly.  The
+:class:`LocalVectorIndex` keeps each collection as one contiguous matrix
+and answers queries with matrix-vector products followed by an
+``argpartition`` top-k selection.
+
+Vectors may be stored as ``float32``, ``float16`` or ``int8`` (symmetric
+per-row quantisation).  Quantised rows are converted to ``float32`` a
+fixed-size chunk at a time while scoring, keeping only a running top-k,
+so a query never holds a full-precision copy of the collection.  When a
+``path`` is given every collection is persisted in its own directory as
+an append-only, memory-mapped vector file plus a JSON-lines file holding
+ids and metadata; the storage type is recorded alongside and checked
+when the collection is reopened.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None  # type: ignore
+
+_DTYPES = ("float32", "float16", "int8")
+_VECTORS_FILE = "vectors.bin"
+_META_FILE = "meta.jsonl"
+_DIM_FILE = "dim"
+_DTYPE_FILE = "dtype"
+# Rows scored per matrix product; bounds the float32 copy of quantised rows.
+_QUERY_CHUNK = 4096
+
+
+class _Collection:
+    """Vectors, ids and metadata of one collection."""
+
+    def __init__(self, dim: int, *, dtype: str, distance: str, path: Optional[str]):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.distance = distance
+        self.path = path
+        self.ids: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.count = 0
+        self._scales = np.zeros(0, dtype=np.float32)  # int8 dequantisation
+        self._sq_norms = np.zeros(0, dtype=np.float32)  # l2 only
+        self._matrix = np.zeros((0, dim), dtype=self.dtype)
+        self._meta_fh = None
+        self.lock = threading.Lock()
+        if path:
+            self._open(path)
+
+    # ------------------------------------------------------------------
+    # storage
+    def _open(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        dtype_path = os.path.join(path, _DTYPE_FILE)
+        if os.path.exists(dtype_path):
+            with open(dtype_path, "r", encoding="utf-8") as fh:
+                stored = fh.read().strip()
+            if stored != self.dtype.name:
+                raise ValueError(
+                    f"Collection at {path} stores {stored} vectors, not {self.dtype.name}"
+                )
+        else:
+            with open(dtype_path, "w", encoding="utf-8") as fh:
+                fh.write(self.dtype.name)
+        with open(os.path.join(path, _DIM_FILE), "w", encoding="utf-8") as fh:
+            fh.write(str(self.dim))
+        meta_path = os.path.join(path, _META_FILE)
+        rows = []
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                rows = [json.loads(line) for line in fh if line.strip()]
+        # The metadata file is the commit log: a vector written without its
+        # metadata line (e.g. after a crash) is ignored and overwritten.
+        self.count = len(rows)
+        self.ids = [row["id"] for row in rows]
+        self.metadatas = [row.get("meta") or {} for row in rows]
+        self._scales = np.array([row.get("scale", 1.0) for row in rows], dtype=np.float32)
+        self._map(max(self.count, 64))
+        if self.distance == "l2":
+            self._sq_norms = self._row_sq_norms(0, self.count)
+        self._meta_fh = open(meta_path, "a", encoding="utf-8")
+
+    def _map(self, capacity: int) -> None:
+        vectors_path = os.path.join(self.path, _VECTORS_FILE)  # type: ignore[arg-type]
+        needed = capacity * self.dim * self.dtype.itemsize
+        mode = "r+b" if os.path.exists(vectors_path) else "w+b"
+        with open(vectors_path, mode) as fh:
+            fh.seek(0, os.SEEK_END)
+            if fh.tell() < needed:
+                fh.truncate(needed)
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+        self._matrix = np.memmap(
+            vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim)
+        )
+
+    def _reserve(self, extra: int) -> None:
+        required = self.count + extra
+        capacity = self._matrix.shape[0]
+        if required <= capacity:
+            return
+        new_capacity = max(required, capacity * 2, 64)
+        if self.path:
+            self._map(new_capacity)
+        else:
+            grown = np.zeros((new_capacity, self.dim), dtype=self.dtype)
+            grown[: self.count] = self._matrix[: self.count]
+            self._matrix = grown
+
+    def close(self) -> None:
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+        if self._meta_fh is not None:
+            self._meta_fh.close()
+            self._meta_fh = None
+
+    # ------------------------------------------------------------------
+    # vectors
+    def _prepare(self, vectors: "np.ndarray") -> "np.ndarray":
+        if self.distance == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+    def _row_sq_norms(self, start: int, stop: int) -> "np.ndarray":
+        norms = np.empty(stop - start, dtype=np.float32)
+        for lo in range(start, stop, _QUERY_CHUNK):
+            hi = min(lo + _QUERY_CHUNK, stop)
+            rows = self._dequantise(lo, hi)
+            norms[lo - start : hi - start] = np.einsum("ij,ij->i", rows, rows)
+        return norms
+
+    def _dequantise(self, start: int, stop: int) -> "np.ndarray":
+        rows = self._matrix[start:stop].astype(np.float32)
+        if self.dtype == np.int8:
+            rows *= self._scales[start:stop, None]
+        return rows
+
+    def add(
+        self, ids: Sequence[str], vectors: Sequence[Sequence[float]], metadatas: Sequence[Dict[str, Any]]
+    ) -> None:
+        data = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if data.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {data.shape[1]}")
+        data = self._prepare(data)
+
+        scales = np.ones(len(ids), dtype=np.float32)
+        if self.dtype == np.int8:
+            scales = np.maximum(np.abs(data).max(axis=1), 1e-12) / 127.0
+            stored = np.round(data / scales[:, None]).astype(np.int8)
+        else:
+            stored = data.astype(self.dtype)
+
+        start = self.count
+        self._reserve(len(ids))
+        self._matrix[start:start + len(ids)] = stored
+        self._scales = np.concatenate([self._scales[:start], scales])
+        self.ids.extend(ids)
+        self.metadatas.extend(metadatas)
+        self.count += len(ids)
+        if self.distance == "l2":
+            self._sq_norms = np.concatenate(
+                [self._sq_norms[:start], self._row_sq_norms(start, self.count)]
+            )
+
+        if self._meta_fh is not None:
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+            for id_, meta, scale in zip(ids, metadatas, scales):
+                row = {"id": id_, "meta": meta}
+                if self.dtype == np.int8:
+                    row["scale"] = float(scale)
+                self._meta_fh.write(json.dumps(row) + "\n")
+            self._meta_fh.flush()
+
+    def query_many(
+        self, vectors: Sequence[Sequence[float]], n_results: int
+    ) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        if self.count == 0 or n_results <= 0:
+            return [[] for _ in vectors]
+        q = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        if q.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {q.shape[1]}")
+        q = self._prepare(q)
+
+        k = min(n_results, self.count)
+        q_sq_norms = np.einsum("ij,ij->i", q, q)[:, None] if self.distance == "l2" else None
+        best_scores = np.empty((len(q), 0), dtype=np.float32)
+        best_rows = np.empty((len(q), 0), dtype=np.int64)
+        for start in range(0, self.count, _QUERY_CHUNK):
+            stop = min(start + _QUERY_CHUNK, self.count)
+            # One (n_queries, chunk) product for all queries.
+            rows = self._matrix[start:stop]
+            if rows.dtype != np.float32:
+                rows = rows.astype(np.float32)
+            scores = q @ rows.T
+            if self.dtype == np.int8:
+                scores *= self._scales[None, start:stop]
+            if q_sq_norms is not None:
+                # Higher is better: negative squared euclidean distance.
+                scores = 2 * scores - self._sq_norms[None, start:stop] - q_sq_norms
+            scores = np.concatenate([best_scores, scores], axis=1)
+            row_ids = np.concatenate(
+                [best_rows, np.broadcast_to(np.arange(start, stop), (len(q), stop - start))],
+                axis=1,
+            )
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                row_ids = np.take_along_axis(row_ids, top, axis=1)
+            best_scores, best_rows = scores, row_ids
+
+        results = []
+        for row_scores, row_ids in zip(best_scores, best_rows):
+            order = np.argsort(-row_scores, kind="stable")
+            results.append(
+                [
+                    (self.ids[i], float(row_scores[j]), dict(self.metadatas[i]))
+                    for i, j in zip(row_ids[order], order)
+                ]
+            )
+        return results
+
+
+class LocalVectorIndex:
+    """Collection-oriented NumPy vector index.
+
+    Parameters
+    ----------
+    path:
+        Optional directory used to persist collections.  Without it the
+        index lives in memory only.
+    dtype:
+        Storage type for vectors: ``"float32"``, ``"float16"`` or
+        ``"int8"``.
+    distance:
+        ``"cosine"``, ``"ip"`` (inner product) or ``"l2"``.  Query scores
+        are similarities: higher is better for every metric.
+    """
+
+    def __init__(
+        self,
+        *,
+        path: Optional[str] = None,
+        dtype: str = "float32",
+        distance: str = "cosine",
+    ) -> None:
+        if np is None:  # pragma: no cover - dependency not installed
+            raise ImportError("numpy is required for the local vector backend")
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        if distance not in ("cosine", "ip", "l2"):
+            raise ValueError(f"Unsupported distance: {distance}")
+        self.path = path
+        self.dtype = dtype
+        self.distance = distance
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, name: str) -> Optional[str]:
+        return os.path.join(self.path, name) if self.path else None
+
+    def _get(self, name: str, dim: Optional[int] = None) -> Optional[_Collection]:
+        with self._lock:
+            coll = self._collections.get(name)
+            if coll is not None:
+                return coll
+            path = self._collection_path(name)
+            if dim is None and path and os.path.exists(os.path.join(path, _DIM_FILE)):
+                with open(os.path.join(path, _DIM_FILE), "r", encoding="utf-8") as fh:
+                    dim = int(fh.read().strip())
+            if dim is None:
+                return None
+            coll = _Collection(dim, dtype=self.dtype, distance=self.distance, path=path)
+            self._collections[name] = coll
+            return coll
+
+    # ------------------------------------------------------------------
+    def add(
+        self,
+        collection: str,
+        ids: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> None:
+        """Append vectors to ``collection``, creating it on first use."""
+
+        if not ids:
+            return
+        dim = len(vectors[0])
+        coll = self._get(collection, dim)
+        assert coll is not None
+        with coll.lock:
+            coll.add(ids, vectors, list(metadatas) if metadatas is not None else [{} for _ in ids])
+
+    def query(
+        self, collection: str, vector: Sequence[float], n_results: int = 3
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Return the ``n_results`` most similar entries as ``(id, score, metadata)``."""
+
+        return self.query_many(collection, [vector], n_results)[0]
+
+    def query_many(
+        self, collection: str, vectors: Sequence[Sequence[float]], n_results: int = 3
+    ) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """Run several queries with one matrix product; one result list per vector."""
+
+        coll = self._get(collection)
+        if coll is None or not vectors:
+            return [[] for _ in vectors]
+        with coll.lock:
+            return coll.query_many(vectors, n_results)
+
+    def count(self, collection: str) -> int:
+        coll = self._get(collection)
+        return coll.count if coll is not None else 0
+
+    def collections(self) -> List[str]:
+        """Names of the open and persisted collections."""
+
+        with self._lock:
+            names = set(self._collections)
+        if self.path and os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                if os.path.exists(os.path.join(self.path, name, _DIM_FILE)):
+                    names.add(name)
+        return sorted(names)
+
+    def delete_collection(self, collection: str) -> None:
+        with self._lock:
+            coll = self._collections.pop(collection, None)
+        if coll is not None:
+            coll.close()
+        path = self._collection_path(collection)
+        if path and os.path.isdir(path):
+            shutil.rmtree(path)
+
+    def close(self) -> None:
+        with self._lock:
+            for coll in self._collections.values():
+                coll.close()
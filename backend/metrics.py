@@ -0,0 +1,375 @@
+"""Lightweight in-process metrics in the Prometheus text format.
+
+Components record timings and counters on the module level
+:data:`REGISTRY` through the metric objects defined at the bottom of this
+module.  Recording is a single attribute check while the registry is
+disabled (the default), so instrumentation can stay in hot paths.
+
+State that components already track themselves (queue depths, cache
+counters) is not duplicated: collectors registered with
+:meth:`MetricsRegistry.add_collector` read it from their ``stats()``
+methods when :meth:`MetricsRegistry.render` is called.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[str, ...]
+#: ``(name, kind, help, labels, value)`` as produced by collectors.
+Sample = Tuple[str, str, str, Dict[str, str], float]
+Collector = Callable[[], Iterable[Sample]]
+
+#: Default latency buckets in seconds.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelKey) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        # Writers run on executor threads too; render a consistent copy.
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. requests in flight."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def track_inprogress(self, **labels: str):
+        """Context manager incrementing the gauge while the block runs."""
+
+        if not self._registry.enabled:
+            return _NULL_CONTEXT
+        return self._inprogress(labels)
+
+    @contextlib.contextmanager
+    def _inprogress(self, labels: Dict[str, str]) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts (last one is +Inf), sum.
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = entry
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def time(self, **labels: str):
+        """Context manager observing the duration of the block."""
+
+        if not self._registry.enabled:
+            return _NULL_CONTEXT
+        return self._timer(labels)
+
+    @contextlib.contextmanager
+    def _timer(self, labels: Dict[str, str]) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        # Bucket lists are updated in place, so copy them under the lock too.
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total[0])) for key, (counts, total) in self._values.items()
+            )
+        lines = []
+        for key, (counts, total) in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = {**labels, "le": _format_value(bound)}
+                lines.append(f"{self.name}_bucket{_format_labels(le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Hold metrics and collectors and render them for Prometheus.
+
+    Parameters
+    ----------
+    enabled:
+        Whether metrics are recorded.  Disabled registries ignore every
+        observation and render nothing.
+    """
+
+    def __init__(self, *, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _get(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(self, name, help, labelnames, **kwargs)
+        elif type(metric) is not cls:
+            raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)  # type: ignore[return-value]
+
+    def add_collector(self, collector: Collector) -> None:
+        """Register a callable returning samples at render time."""
+
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Collector) -> None:
+        with contextlib.suppress(ValueError):
+            self._collectors.remove(collector)
+
+    def reset(self) -> None:
+        """Drop all recorded values (metric definitions are kept)."""
+
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+
+        if not self.enabled:
+            return ""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            samples = metric.render()
+            if samples:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(samples)
+
+        grouped: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in list(self._collectors):
+            for name, kind, help, labels, value in collector():
+                entry = grouped.setdefault(name, (kind, help, []))
+                entry[2].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, (kind, help, samples) in grouped.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+#: Registry used by the application.
+REGISTRY = MetricsRegistry()
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+STAGE_SECONDS = REGISTRY.histogram(
+    "vex_stage_seconds",
+    "Duration of request stages (validate, retrieve, build_prompt, cache, generate, total).",
+    ["stage"],
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "vex_requests_in_flight", "Chat requests currently being processed."
+)
+REQUESTS = REGISTRY.counter(
+    "vex_requests_total", "Chat requests by outcome.", ["outcome"]
+)
+FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "vex_time_to_first_token_seconds",
+    "Time from receiving a message to its first streamed token.",
+    ["source"],
+)
+TOKENS_PER_SECOND = REGISTRY.histogram(
+    "vex_generation_tokens_per_second",
+    "Decode speed after the first token.",
+    ["source"],
+    buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 400),
+)
+GENERATIONS_IN_FLIGHT = REGISTRY.gauge(
+    "vex_generations_in_flight", "Model generations currently running.", ["source"]
+)
+REMOTE_ATTEMPTS = REGISTRY.counter(
+    "vex_remote_attempts_total",
+    "Requests sent to remote endpoints by outcome.",
+    ["endpoint", "outcome"],
+)
+EMBED_SECONDS = REGISTRY.histogram(
+    "vex_embed_seconds", "Duration of one embedding model call."
+)
+EMBED_BATCH_SIZE = REGISTRY.histogram(
+    "vex_embed_batch_size",
+    "Texts encoded per embedding model call.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+VECTOR_STORE_SECONDS = REGISTRY.histogram(
+    "vex_vector_store_seconds", "Duration of vector store calls.", ["backend", "op"]
+)
+MEMORY_WRITE_SECONDS = REGISTRY.histogram(
+    "vex_memory_write_seconds", "Duration of persisting memories."
+)
+MEMORY_SEARCHES = REGISTRY.counter(
+    "vex_memory_searches_total", "Memory searches by index used.", ["index"]
+)
+
+
+def stats_collector(
+    prefix: str, source: Callable[[], Optional[Dict[str, float]]], **labels: str
+) -> Collector:
+    """Expose the numeric values of a ``stats()`` dict as gauges.
+
+    Keys become ``<prefix>_<key>``; a ``hit_ratio`` gauge is added when
+    the stats carry ``hits``/``misses`` style counters.
+    """
+
+    def collect() -> Iterator[Sample]:
+        stats = source()
+        if not stats:
+            return
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield (f"{prefix}_{key}", "gauge", f"{prefix} {key}", labels, float(value))
+        hits = sum(v for k, v in stats.items() if k.endswith("hits"))
+        lookups = hits + stats.get("misses", 0)
+        if "misses" in stats:
+            ratio = hits / lookups if lookups else 0.0
+            yield (f"{prefix}_hit_ratio", "gauge", f"{prefix} hit ratio", labels, ratio)
+
+    return collect
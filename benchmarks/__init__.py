@@ -0,0 +1,14 @@
+"""Offline performance benchmarks for the VEX backend.
+
+The suites drive the real router, API and memory code against the
+deterministic stand-ins in :mod:`benchmarks.fakes`, so they need no model
+weights, GPU or network access::
+
+    python -m benchmarks                       # all suites
+    python -m benchmarks router memory --quick # selected suites, smoke size
+    python -m benchmarks -o run.json --compare baseline.json
+
+Results are written in the JSON format described in
+:mod:`benchmarks.harness`; ``--compare`` reports the change of every
+metric against an earlier run and exits non-zero on regressions.
+"""
@@ -0,0 +1,50 @@
+"""Command line entry point: ``python -m benchmarks``."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.harness import Result, compare, format_table, load_results, write_results
+from benchmarks.suites import SUITES
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("suites", nargs="*", choices=[[], *SUITES], help="suites to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("-o", "--output", help="write JSON results to this file ('-' for stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier results file")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.10, help="relative change flagged as a regression"
+    )
+    args = parser.parse_args(argv)
+
+    results: List[Result] = []
+    for name in args.suites or list(SUITES):
+        print(f"running {name}...", file=sys.stderr)
+        results.extend(SUITES[name](args.quick))
+
+    print(format_table(results), file=sys.stderr)
+    write_results(results, args.output, config={"quick": args.quick, "suites": args.suites or list(SUITES)})
+
+    if not args.compare:
+        return 0
+    rows = compare(load_results(args.compare), results, tolerance=args.tolerance)
+    regressions = [row for row in rows if row["regression"]]
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['case']:<55} {row['metric']:<24} {row['before']:>10.2f} -> "
+            f"{row['after']:>10.2f} ({row['change']:+.1%}) {flag}",
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Minimal in-process ASGI client for timing streamed responses.
+
+``TestClient`` (and ``httpx``'s ASGI transport) buffer a response body
+before returning it, which hides time-to-first-token.  These helpers call
+the application directly and hand out every body chunk and WebSocket
+frame the moment the application sends it.  They are asynchronous, so
+many simulated clients can share one event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+
+class ASGIError(RuntimeError):
+    """The application answered with an error status or closed the socket."""
+
+    def __init__(self, status: int, body: bytes = b"") -> None:
+        super().__init__(f"HTTP {status}: {body[:200]!r}")
+        self.status = status
+        self.body = body
+
+
+def _scope(kind: str, path: str, headers: List[Tuple[bytes, bytes]]) -> Dict[str, Any]:
+    path, _, query = path.partition("?")
+    return {
+        "type": kind,
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "scheme": "ws" if kind == "websocket" else "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+
+async def _finish(task: "asyncio.Task[None]", timeout: float = 5.0) -> None:
+    try:
+        await asyncio.wait_for(task, timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        pass
+
+
+class Lifespan:
+    """Run the application's startup and shutdown around a block."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self._inbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._outbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def __aenter__(self) -> "Lifespan":
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._task = asyncio.ensure_future(self.app(scope, self._inbox.get, self._outbox.put))
+        await self._inbox.put({"type": "lifespan.startup"})
+        message = await self._outbox.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(message.get("message", "application startup failed"))
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._inbox.put({"type": "lifespan.shutdown"})
+        await self._outbox.get()
+        await _finish(self._task)  # type: ignore[arg-type]
+
+
+async def http_stream(
+    app: Any, path: str, payload: Dict[str, Any], *, method: str = "POST"
+) -> AsyncGenerator[bytes, None]:
+    """Send a JSON request and yield the response body chunk by chunk.
+
+    Redirects are not followed: they raise :class:`ASGIError`, like any
+    error response.  Closing the generator early disconnects the client,
+    as a browser closing the connection would.
+    """
+
+    body = json.dumps(payload).encode()
+    scope = _scope(
+        "http",
+        path,
+        [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    )
+    scope["method"] = method
+    outbox: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+    disconnected = asyncio.Event()
+    sent = False
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    task = asyncio.ensure_future(app(scope, receive, outbox.put))
+    task.add_done_callback(lambda _: outbox.put_nowait(None))
+    status = 0
+    try:
+        while True:
+            message = await outbox.get()
+            if message is None:
+                task.result()  # re-raise application errors
+                return
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                continue
+            if message["type"] != "http.response.body":
+                continue
+            chunk = message.get("body", b"")
+            if status >= 300:
+                raise ASGIError(status, chunk)
+            if chunk:
+                yield chunk
+            if not message.get("more_body", False):
+                return
+    finally:
+        disconnected.set()
+        await _finish(task)
+
+
+class WebSocketSession:
+    """Client side of an in-process WebSocket connection.
+
+    Use as ``async with WebSocketSession(app, "/api/chat/ws") as ws``.
+    """
+
+    def __init__(self, app: Any, path: str) -> None:
+        self.app = app
+        self.path = path
+        self._inbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._outbox: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def __aenter__(self) -> "WebSocketSession":
+        scope = _scope("websocket", self.path, [])
+        scope["subprotocols"] = []
+        self._task = asyncio.ensure_future(self.app(scope, self._inbox.get, self._outbox.put))
+        self._task.add_done_callback(lambda _: self._outbox.put_nowait(None))
+        await self._inbox.put({"type": "websocket.connect"})
+        message = await self._outbox.get()
+        if message is None or message["type"] != "websocket.accept":
+            raise ASGIError(403)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self._inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await _finish(self._task)  # type: ignore[arg-type]
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        await self._inbox.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self) -> Dict[str, Any]:
+        message = await self._outbox.get()
+        if message is None or message["type"] == "websocket.close":
+            raise ASGIError(message.get("code", 1006) if message else 1006)
+        text = message.get("text")
+        return json.loads(text if text is not None else message["bytes"])
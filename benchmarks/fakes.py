@@ -0,0 +1,187 @@
+"""Deterministic stand-ins for the model and storage backends.
+
+The fakes reproduce the *timing shape* of the real dependencies without
+their weights: :class:`FakeLLM` spends a configurable prefill time per
+prompt token and then emits tokens at a fixed rate, :class:`HashingModel`
+embeds text into a bag-of-words vector, and the vector store is the
+in-process ``local`` backend.  Everything runs offline on a CPU.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None  # type: ignore
+
+from backend.agents.vex_memory_manager import VexMemoryManager
+from backend.agents.vex_personality_core import VexPersonalityCore
+from backend.components import VexComponents
+from backend.config.settings import Settings
+from backend.memory import Embedder, VectorStoreClient
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeLLM:
+    """``llama_cpp.Llama`` compatible model with predictable latency.
+
+    Parameters
+    ----------
+    tokens_per_second:
+        Decode speed; each generated token takes ``1 / tokens_per_second``.
+    prefill_per_token:
+        Seconds spent per prompt token before the first token.
+    reply_tokens:
+        Number of tokens in every reply.
+    """
+
+    def __init__(
+        self,
+        *,
+        tokens_per_second: float = 200.0,
+        prefill_per_token: float = 0.00005,
+        reply_tokens: int = 32,
+    ) -> None:
+        self.tokens_per_second = tokens_per_second
+        self.prefill_per_token = prefill_per_token
+        self.reply_tokens = reply_tokens
+        self.calls = 0
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        # Roughly one token per four bytes, like the heuristic counter.
+        return list(range((len(text) + 3) // 4 + int(add_bos)))
+
+    def __call__(self, prompt: str, stream: bool = False, **kwargs: Any):
+        self.calls += 1
+        prompt_tokens = len(self.tokenize(prompt.encode("utf-8"), add_bos=False))
+        time.sleep(prompt_tokens * self.prefill_per_token)
+        tokens = [f" tok{i}" for i in range(self.reply_tokens)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens)}
+        if not stream:
+            time.sleep(len(tokens) / self.tokens_per_second)
+            return {
+                "choices": [{"text": "".join(tokens), "finish_reason": "stop"}],
+                "usage": usage,
+            }
+        return self._stream(tokens)
+
+    def _stream(self, tokens: Sequence[str]) -> Iterator[Dict[str, Any]]:
+        delay = 1.0 / self.tokens_per_second
+        for index, token in enumerate(tokens):
+            time.sleep(delay)
+            finish = "stop" if index == len(tokens) - 1 else None
+            yield {"choices": [{"text": token, "finish_reason": finish}]}
+
+
+class HashingModel:
+    """SentenceTransformer stand-in hashing words into a fixed-size vector.
+
+    Texts sharing words get similar vectors, so retrieval results are
+    meaningful.  ``cost_per_text`` adds a fixed encode cost per text.
+    """
+
+    def __init__(self, dim: int = 384, *, cost_per_text: float = 0.0) -> None:
+        if np is None:  # pragma: no cover - dependency not installed
+            raise ImportError("numpy is required for HashingModel")
+        self.dim = dim
+        self.cost_per_text = cost_per_text
+        self.calls = 0
+
+    def _bucket(self, word: str) -> int:
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.dim
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32):
+        self.calls += 1
+        if self.cost_per_text:
+            time.sleep(self.cost_per_text * len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                vectors[row, self._bucket(word)] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+# ---------------------------------------------------------------------------
+# Assembly helpers
+# ---------------------------------------------------------------------------
+def make_core(llm: Optional[FakeLLM] = None, **kwargs: Any) -> VexPersonalityCore:
+    """Return a personality core serving ``llm`` as its local model."""
+
+    core = VexPersonalityCore(**kwargs)
+    core._llama = llm or FakeLLM()
+    return core
+
+
+def make_memory(
+    *, dim: int = 384, embed_cost: float = 0.0, semantic: bool = True
+) -> VexMemoryManager:
+    """Return a memory manager backed by the fake embedder and local store.
+
+    With ``semantic=False`` only the keyword index is used.
+    """
+
+    if not semantic:
+        return VexMemoryManager()
+    embedder = Embedder(model=HashingModel(dim, cost_per_text=embed_cost))
+    store = VectorStoreClient({"backend": "local"})
+    return VexMemoryManager(embedder=embedder, vector_store=store)
+
+
+def make_components(
+    llm: Optional[FakeLLM] = None,
+    *,
+    memory: Optional[VexMemoryManager] = None,
+    **settings: Any,
+) -> VexComponents:
+    """Return application components wired to the stand-in backends.
+
+    ``settings`` override :class:`~backend.config.settings.Settings`
+    fields; the response cache and metrics are off unless enabled here.
+    """
+
+    config = Settings(
+        **{
+            "response_cache_enabled": False,
+            "metrics_enabled": False,
+            "embedding_model": "",
+            **settings,
+        }
+    )
+    return VexComponents(
+        config,
+        personality_core=make_core(
+            llm,
+            context_budget=config.prompt_context_budget,
+            max_queue=config.local_max_queue,
+            queue_timeout=config.local_queue_timeout,
+        ),
+        memory_manager=memory or make_memory(semantic=False),
+    )
+
+
+def sample_sentences(count: int, *, seed: int = 0) -> List[str]:
+    """Return ``count`` deterministic pseudo-random sentences."""
+
+    words = (
+        "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima "
+        "mike november oscar papa quebec romeo sierra tango uniform victor whiskey "
+        "xray yankee zulu memory vector prompt token stream cache model local remote"
+    ).split()
+    state = seed * 2654435761 + 1
+    sentences = []
+    for _ in range(count):
+        length = 6 + state % 10
+        picked = []
+        for _ in range(length):
+            state = (state * 1103515245 + 12345) % 2**31
+            picked.append(words[state % len(words)])
+        sentences.append(" ".join(picked))
+    return sentences
@@ -0,0 +1,203 @@
+"""Timing helpers and the JSON results format.
+
+A results file looks like::
+
+    {
+      "schema": 1,
+      "created": "2024-05-01T12:00:00+00:00",
+      "environment": {"python": "3.11.9", "platform": "...", "cpu_count": 8,
+                      "git_commit": "abc123"},
+      "results": [
+        {"suite": "router", "name": "handle_message",
+         "params": {"stream": false},
+         "metrics": {"p50_ms": 12.1, "p95_ms": 14.0, "throughput_per_s": 80.2}}
+      ]
+    }
+
+Metric names end in their unit.  For ``*_ms`` and ``*_s`` metrics lower is
+better, for ``*_per_s`` higher is better; :func:`compare` uses this to flag
+regressions between two runs.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+SCHEMA_VERSION = 1
+
+
+class Result:
+    """Metrics measured by one benchmark case."""
+
+    def __init__(
+        self,
+        suite: str,
+        name: str,
+        metrics: Dict[str, float],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.suite = suite
+        self.name = name
+        self.metrics = metrics
+        self.params = params or {}
+
+    @property
+    def key(self) -> str:
+        params = ",".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"{self.suite}/{self.name}[{params}]"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "suite": self.suite,
+            "name": self.name,
+            "params": self.params,
+            "metrics": {k: round(v, 4) for k, v in self.metrics.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Result":
+        return cls(data["suite"], data["name"], data["metrics"], data.get("params"))
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """Linearly interpolated ``q`` percentile (``0 <= q <= 100``)."""
+
+    if not samples:
+        return math.nan
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: Sequence[float], prefix: str = "") -> Dict[str, float]:
+    """Return mean and p50/p95/p99 of ``samples`` (seconds) in milliseconds."""
+
+    if not samples:
+        return {}
+    return {
+        f"{prefix}mean_ms": 1000 * sum(samples) / len(samples),
+        f"{prefix}p50_ms": 1000 * percentile(samples, 50),
+        f"{prefix}p95_ms": 1000 * percentile(samples, 95),
+        f"{prefix}p99_ms": 1000 * percentile(samples, 99),
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine and revision the benchmarks ran on."""
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def write_results(
+    results: Sequence[Result],
+    path: Optional[str] = None,
+    *,
+    config: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Serialise ``results``; written to ``path`` (``-`` for stdout) if given."""
+
+    document = {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": config or {},
+        "results": [result.to_dict() for result in results],
+    }
+    if path == "-":
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    elif path:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(document, fh, indent=2)
+            fh.write("\n")
+    return document
+
+
+def load_results(path: str) -> List[Result]:
+    with open(path, encoding="utf-8") as fh:
+        document = json.load(fh)
+    if document.get("schema") != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported results schema: {document.get('schema')}")
+    return [Result.from_dict(item) for item in document["results"]]
+
+
+def _higher_is_better(metric: str) -> Optional[bool]:
+    if metric.endswith("_per_s"):
+        return True
+    if metric.endswith("_ms") or metric.endswith("_s"):
+        return False
+    return None
+
+
+def compare(
+    baseline: Sequence[Result], current: Sequence[Result], *, tolerance: float = 0.10
+) -> List[Dict[str, Any]]:
+    """Compare two runs metric by metric.
+
+    Returns one row per metric present in both runs with the relative
+    ``change`` and whether it is a ``regression`` beyond ``tolerance``
+    (a fraction, ``0.10`` = 10 %).  Metrics without a known direction are
+    reported but never flagged.
+    """
+
+    previous = {result.key: result for result in baseline}
+    rows = []
+    for result in current:
+        old = previous.get(result.key)
+        if old is None:
+            continue
+        for metric, value in result.metrics.items():
+            before = old.metrics.get(metric)
+            if before is None or not before or math.isnan(before) or math.isnan(value):
+                continue
+            change = (value - before) / abs(before)
+            direction = _higher_is_better(metric)
+            regression = direction is not None and (
+                change < -tolerance if direction else change > tolerance
+            )
+            rows.append(
+                {
+                    "case": result.key,
+                    "metric": metric,
+                    "before": before,
+                    "after": value,
+                    "change": change,
+                    "regression": regression,
+                }
+            )
+    return rows
+
+
+def format_table(results: Sequence[Result]) -> str:
+    """Render results as aligned text for the terminal."""
+
+    lines = []
+    for result in results:
+        metrics = "  ".join(f"{k}={v:.2f}" for k, v in result.metrics.items())
+        lines.append(f"{result.key:<55} {metrics}")
+    return "\n".join(lines)
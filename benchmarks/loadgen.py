@@ -0,0 +1,365 @@
+"""Concurrent load generator for the chat APIs.
+
+Simulated users send chat messages over ``POST /api/chat`` (streamed or
+not) or a WebSocket to ``/api/chat/ws``, pausing for a think time between
+messages.  The application runs in-process, by default wired to the
+stand-in model of :mod:`benchmarks.fakes`, so capacity can be explored
+without model weights::
+
+    python -m benchmarks.loadgen --users 32 --duration 30 --mode ws \\
+        --think exp:0.5 --words uniform:5:60 --abandon 0.05
+
+Distributions are written ``fixed:X``, ``uniform:LO:HI``, ``exp:MEAN`` or
+``normal:MEAN:SD`` (clamped at zero).  The report lists throughput,
+p50/p95/p99 time-to-first-token and total latency, and error and
+cancellation rates; ``-o`` stores it in the :mod:`benchmarks.harness`
+JSON format for comparison between runs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.asgi import ASGIError, Lifespan, WebSocketSession, http_stream
+from benchmarks.fakes import FakeLLM, make_components, sample_sentences
+from benchmarks.harness import Result, format_table, percentile, write_results
+
+MODES = ("http", "http-stream", "ws")
+
+
+class Distribution:
+    """Random variable parsed from ``kind:arg[:arg]``."""
+
+    def __init__(self, spec: str) -> None:
+        kind, *args = spec.split(":")
+        try:
+            values = [float(arg) for arg in args]
+        except ValueError:
+            raise ValueError(f"Invalid distribution: {spec!r}") from None
+        arity = {"fixed": 1, "uniform": 2, "exp": 1, "normal": 2}
+        if arity.get(kind) != len(values):
+            raise ValueError(f"Invalid distribution: {spec!r}")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.values[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.values)
+        if self.kind == "exp":
+            return rng.expovariate(1.0 / self.values[0]) if self.values[0] > 0 else 0.0
+        return max(0.0, rng.gauss(*self.values))
+
+    def __repr__(self) -> str:
+        return self.spec
+
+
+class LoadConfig:
+    """Parameters of a load run.
+
+    Parameters
+    ----------
+    users:
+        Number of concurrent simulated users.
+    mode:
+        ``"http"``, ``"http-stream"`` or ``"ws"``.
+    duration:
+        Seconds users keep sending messages; ``None`` with
+        ``requests_per_user`` runs a fixed number of messages instead.
+    requests_per_user:
+        Messages sent by each user (takes precedence over ``duration``).
+    think:
+        Pause between a reply and the user's next message, in seconds.
+    words:
+        Message length in words.
+    abandon:
+        Fraction of streamed replies the user stops reading after the
+        first token (counted as cancelled).
+    timeout:
+        Seconds after which a request counts as an error.
+    ramp_up:
+        Seconds over which user start times are spread.
+    """
+
+    def __init__(
+        self,
+        *,
+        users: int = 8,
+        mode: str = "http-stream",
+        duration: Optional[float] = 10.0,
+        requests_per_user: Optional[int] = None,
+        think: str = "exp:0.5",
+        words: str = "uniform:5:40",
+        abandon: float = 0.0,
+        timeout: float = 60.0,
+        ramp_up: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.users = users
+        self.mode = mode
+        self.duration = duration
+        self.requests_per_user = requests_per_user
+        self.think = Distribution(think)
+        self.words = Distribution(words)
+        self.abandon = abandon
+        self.timeout = timeout
+        self.ramp_up = ramp_up
+        self.seed = seed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "users": self.users,
+            "mode": self.mode,
+            "duration": self.duration,
+            "requests_per_user": self.requests_per_user,
+            "think": self.think.spec,
+            "words": self.words.spec,
+            "abandon": self.abandon,
+            "timeout": self.timeout,
+            "ramp_up": self.ramp_up,
+            "seed": self.seed,
+        }
+
+
+class Sample:
+    """Outcome of one simulated request."""
+
+    __slots__ = ("outcome", "first_token", "total", "chunks", "error")
+
+    def __init__(self) -> None:
+        self.outcome = "ok"
+        self.first_token: Optional[float] = None
+        self.total = 0.0
+        self.chunks = 0
+        self.error: Optional[str] = None
+
+
+class LoadReport:
+    """Aggregated samples of a load run."""
+
+    def __init__(self, config: LoadConfig, samples: List[Sample], elapsed: float) -> None:
+        self.config = config
+        self.samples = samples
+        self.elapsed = elapsed
+
+    def summary(self) -> Dict[str, float]:
+        samples = self.samples
+        done = [s for s in samples if s.outcome == "ok"]
+        first = [s.first_token for s in samples if s.first_token is not None]
+        totals = [s.total for s in done]
+        count = len(samples) or 1
+        summary = {
+            "requests": float(len(samples)),
+            "throughput_per_s": len(done) / self.elapsed if self.elapsed else 0.0,
+            "error_rate": sum(s.outcome == "error" for s in samples) / count,
+            "cancel_rate": sum(s.outcome == "cancelled" for s in samples) / count,
+            "chunks_per_s": sum(s.chunks for s in samples) / self.elapsed if self.elapsed else 0.0,
+        }
+        for q in (50, 95, 99):
+            if first:
+                summary[f"ttft_p{q}_ms"] = 1000 * percentile(first, q)
+            if totals:
+                summary[f"total_p{q}_ms"] = 1000 * percentile(totals, q)
+        return summary
+
+    def errors(self) -> Dict[str, int]:
+        return dict(Counter(s.error for s in self.samples if s.error))
+
+    def result(self) -> Result:
+        params = {k: v for k, v in self.config.to_dict().items() if v is not None}
+        return Result("load", self.config.mode, self.summary(), params)
+
+
+# ---------------------------------------------------------------------------
+# Simulated users
+# ---------------------------------------------------------------------------
+_VOCABULARY = " ".join(sample_sentences(200, seed=7)).split()
+
+
+def _message(rng: random.Random, config: LoadConfig) -> str:
+    count = max(1, round(config.words.sample(rng)))
+    return " ".join(rng.choice(_VOCABULARY) for _ in range(count))
+
+
+async def _http(app: Any, message: str, stream: bool, abandon: bool, sample: Sample, t0: float) -> None:
+    payload = {"message": message, "stream": stream, "cache": False}
+    chunks = http_stream(app, "/api/chat/", payload)
+    try:
+        async for _ in chunks:
+            if sample.first_token is None:
+                sample.first_token = time.perf_counter() - t0
+            sample.chunks += 1
+            if abandon:
+                sample.outcome = "cancelled"
+                return
+    finally:
+        await chunks.aclose()
+
+
+async def _ws(ws: WebSocketSession, message: str, abandon: bool, sample: Sample, t0: float) -> None:
+    await ws.send_json({"message": message, "cache": False})
+    while True:
+        frame = await ws.receive_json()
+        if "error" in frame:
+            raise RuntimeError(frame["error"])
+        if "token" in frame:
+            if sample.first_token is None:
+                sample.first_token = time.perf_counter() - t0
+            sample.chunks += 1
+            if abandon:
+                sample.outcome = "cancelled"
+                return
+        if frame.get("done"):
+            if sample.first_token is None:
+                sample.first_token = time.perf_counter() - t0
+            return
+
+
+async def _user(app: Any, index: int, config: LoadConfig, deadline: float, samples: List[Sample]) -> None:
+    rng = random.Random(config.seed * 1000 + index)
+    if config.ramp_up and config.users > 1:
+        await asyncio.sleep(config.ramp_up * index / (config.users - 1))
+    ws: Optional[WebSocketSession] = None
+    sent = 0
+    try:
+        while True:
+            if config.requests_per_user is not None:
+                if sent >= config.requests_per_user:
+                    break
+            elif time.perf_counter() >= deadline:
+                break
+            sent += 1
+            message = _message(rng, config)
+            abandon = config.mode != "http" and rng.random() < config.abandon
+            sample = Sample()
+            t0 = time.perf_counter()
+            try:
+                if config.mode == "ws":
+                    if ws is None:
+                        ws = await WebSocketSession(app, "/api/chat/ws").__aenter__()
+                    await asyncio.wait_for(_ws(ws, message, abandon, sample, t0), config.timeout)
+                    if abandon:
+                        # Closing the socket is how a user stops a reply.
+                        await ws.__aexit__(None, None, None)
+                        ws = None
+                else:
+                    stream = config.mode == "http-stream"
+                    await asyncio.wait_for(
+                        _http(app, message, stream, abandon, sample, t0), config.timeout
+                    )
+            except Exception as exc:
+                sample.outcome = "error"
+                if isinstance(exc, asyncio.TimeoutError):
+                    sample.error = "timeout"
+                elif isinstance(exc, ASGIError):
+                    sample.error = f"status {exc.status}"
+                else:
+                    sample.error = str(exc) or type(exc).__name__
+                if ws is not None:
+                    # The reply may still be arriving; start a fresh socket.
+                    await ws.__aexit__(None, None, None)
+                    ws = None
+            sample.total = time.perf_counter() - t0
+            samples.append(sample)
+            await asyncio.sleep(config.think.sample(rng))
+    finally:
+        if ws is not None:
+            await ws.__aexit__(None, None, None)
+
+
+async def run_load(app: Any, config: LoadConfig) -> LoadReport:
+    """Drive ``app`` with ``config.users`` concurrent users and report."""
+
+    samples: List[Sample] = []
+    async with Lifespan(app):
+        started = time.perf_counter()
+        deadline = started + (config.duration or 0.0)
+        await asyncio.gather(
+            *(_user(app, index, config, deadline, samples) for index in range(config.users))
+        )
+        elapsed = time.perf_counter() - started
+    return LoadReport(config, samples, elapsed)
+
+
+def _load_app(spec: Optional[str], llm: FakeLLM, settings: Dict[str, Any]) -> Any:
+    if spec is None:
+        from backend.main import create_app
+
+        return create_app(make_components(llm, **settings))
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr or "app")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.loadgen",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--mode", choices=MODES, default="http-stream")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="messages per user instead of a duration")
+    parser.add_argument("--think", default="exp:0.5", help="think time distribution (s)")
+    parser.add_argument("--words", default="uniform:5:40", help="message length distribution")
+    parser.add_argument("--abandon", type=float, default=0.0, help="fraction of streams abandoned")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--ramp-up", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app", help="module:attribute of a real app instead of the stand-ins")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--prefill-per-token", type=float, default=0.00005)
+    parser.add_argument("--reply-tokens", type=int, default=32)
+    parser.add_argument("--max-queue", type=int, default=64, help="local scheduler queue limit")
+    parser.add_argument("--coalesce-ms", type=float, default=0.0)
+    parser.add_argument("-o", "--output", help="write JSON results ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    config = LoadConfig(
+        users=args.users,
+        mode=args.mode,
+        duration=None if args.requests else args.duration,
+        requests_per_user=args.requests,
+        think=args.think,
+        words=args.words,
+        abandon=args.abandon,
+        timeout=args.timeout,
+        ramp_up=args.ramp_up,
+        seed=args.seed,
+    )
+    llm = FakeLLM(
+        tokens_per_second=args.tokens_per_second,
+        prefill_per_token=args.prefill_per_token,
+        reply_tokens=args.reply_tokens,
+    )
+    app = _load_app(
+        args.app,
+        llm,
+        {"local_max_queue": args.max_queue, "stream_coalesce_ms": args.coalesce_ms},
+    )
+    report = asyncio.run(run_load(app, config))
+
+    print(format_table([report.result()]), file=sys.stderr)
+    if report.errors():
+        print("errors: " + json.dumps(report.errors()), file=sys.stderr)
+    write_results([report.result()], args.output, config=config.to_dict())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Benchmark suites.
+
+Each suite is a function ``suite(quick=False) -> List[Result]``; ``quick``
+shrinks request counts and memory sizes to a smoke run of a few seconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Callable, Dict, List
+
+from backend.agents.vex_router import VexRouter
+from backend.main import create_app
+from backend.memory import Embedder, KeywordIndex
+
+from .asgi import Lifespan, WebSocketSession, http_stream
+from .fakes import FakeLLM, HashingModel, make_components, make_core, make_memory, sample_sentences
+from .harness import Result, summarize
+
+
+async def _populate(memory, count: int, *, batch: int = 1000) -> None:
+    """Store ``count`` deterministic memories in batches."""
+
+    sentences = sample_sentences(count, seed=1)
+    for start in range(0, count, batch):
+        await memory.add_memories(sentences[start:start + batch])
+
+
+# ---------------------------------------------------------------------------
+# Router
+# ---------------------------------------------------------------------------
+def router_suite(quick: bool = False) -> List[Result]:
+    """End-to-end :meth:`VexRouter.handle_message` latency."""
+
+    requests = 10 if quick else 50
+    memories = 1_000 if quick else 10_000
+    llm = FakeLLM()
+    params = {
+        "memories": memories,
+        "reply_tokens": llm.reply_tokens,
+        "tokens_per_second": llm.tokens_per_second,
+    }
+
+    async def _run() -> List[Result]:
+        memory = make_memory()
+        await _populate(memory, memories)
+        router = VexRouter(personality_core=make_core(llm), memory_manager=memory)
+        questions = sample_sentences(requests, seed=2)
+        results = []
+
+        latencies = []
+        started = time.perf_counter()
+        for question in questions:
+            t0 = time.perf_counter()
+            await router.handle_message(question, use_cache=False)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        results.append(
+            Result(
+                "router",
+                "handle_message",
+                {**summarize(latencies), "throughput_per_s": requests / elapsed},
+                {**params, "stream": False},
+            )
+        )
+
+        first_tokens, totals, rates = [], [], []
+        for question in questions:
+            t0 = time.perf_counter()
+            tokens = await router.handle_message(question, stream=True, use_cache=False)
+            count = 0
+            async for _ in tokens:
+                if not count:
+                    first = time.perf_counter()
+                    first_tokens.append(first - t0)
+                count += 1
+            end = time.perf_counter()
+            totals.append(end - t0)
+            if count > 1 and end > first:
+                rates.append((count - 1) / (end - first))
+        results.append(
+            Result(
+                "router",
+                "handle_message",
+                {
+                    **summarize(first_tokens, "ttft_"),
+                    **summarize(totals, "total_"),
+                    "tokens_per_s": sum(rates) / len(rates) if rates else 0.0,
+                },
+                {**params, "stream": True},
+            )
+        )
+
+        # Concurrent callers share the single local model instance, so this
+        # measures scheduling and queueing on top of generation.
+        concurrency = 8
+        latencies = []
+
+        async def _one(question: str) -> None:
+            # One router per request, as the API does.
+            caller = VexRouter(personality_core=router.personality_core, memory_manager=memory)
+            t0 = time.perf_counter()
+            await caller.handle_message(question, use_cache=False)
+            latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        for offset in range(0, requests, concurrency):
+            await asyncio.gather(*(_one(q) for q in questions[offset:offset + concurrency]))
+        elapsed = time.perf_counter() - started
+        results.append(
+            Result(
+                "router",
+                "handle_message_concurrent",
+                {**summarize(latencies), "throughput_per_s": requests / elapsed},
+                {**params, "concurrency": concurrency},
+            )
+        )
+        await memory.aclose()
+        return results
+
+    return asyncio.run(_run())
+
+
+# ---------------------------------------------------------------------------
+# HTTP / WebSocket API
+# ---------------------------------------------------------------------------
+def api_suite(quick: bool = False) -> List[Result]:
+    """Streaming latency and throughput over ``/api/chat`` and ``/api/chat/ws``."""
+
+    requests = 10 if quick else 50
+    llm = FakeLLM()
+    params = {"reply_tokens": llm.reply_tokens, "tokens_per_second": llm.tokens_per_second}
+    questions = sample_sentences(requests, seed=3)
+
+    def _result(name: str, first_tokens: List[float], totals: List[float]) -> Result:
+        return Result(
+            "api",
+            name,
+            {
+                **summarize(first_tokens, "ttft_"),
+                **summarize(totals, "total_"),
+                "tokens_per_s": llm.reply_tokens * len(totals) / sum(totals),
+            },
+            params,
+        )
+
+    async def _run() -> List[Result]:
+        app = create_app(make_components(llm))
+        results = []
+        async with Lifespan(app):
+            first_tokens, totals = [], []
+            for question in questions:
+                t0 = time.perf_counter()
+                first = None
+                payload = {"message": question, "stream": True, "cache": False}
+                async for _ in http_stream(app, "/api/chat/", payload):
+                    if first is None:
+                        first = time.perf_counter() - t0
+                totals.append(time.perf_counter() - t0)
+                first_tokens.append(first if first is not None else totals[-1])
+            results.append(_result("http_stream", first_tokens, totals))
+
+            first_tokens, totals = [], []
+            async with WebSocketSession(app, "/api/chat/ws") as ws:
+                for question in questions:
+                    t0 = time.perf_counter()
+                    first = None
+                    await ws.send_json({"message": question, "cache": False})
+                    while True:
+                        frame = await ws.receive_json()
+                        if first is None and frame.get("token"):
+                            first = time.perf_counter() - t0
+                        if frame.get("done"):
+                            break
+                    totals.append(time.perf_counter() - t0)
+                    first_tokens.append(first if first is not None else totals[-1])
+            results.append(_result("websocket_stream", first_tokens, totals))
+        return results
+
+    return asyncio.run(_run())
+
+
+# ---------------------------------------------------------------------------
+# Embedding and retrieval
+# ---------------------------------------------------------------------------
+def memory_suite(quick: bool = False) -> List[Result]:
+    """Embedding throughput and retrieval latency versus memory size."""
+
+    sizes = (1_000, 5_000) if quick else (1_000, 10_000, 50_000)
+    queries = sample_sentences(32 if quick else 128, seed=4)
+    results = []
+
+    async def _embedding() -> None:
+        texts = sample_sentences(256 if quick else 2048, seed=5)
+        for batch in (1, 8, 32, 128):
+            embedder = Embedder(model=HashingModel(), max_batch_size=batch)
+            t0 = time.perf_counter()
+            for start in range(0, len(texts), batch):
+                await embedder.embed_many(texts[start:start + batch])
+            elapsed = time.perf_counter() - t0
+            results.append(
+                Result("memory", "embed_many", {"texts_per_s": len(texts) / elapsed}, {"batch": batch})
+            )
+
+        # Concurrent single-text calls coalesced by the micro-batcher.
+        model = HashingModel()
+        embedder = Embedder(model=model, max_batch_size=32)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(embedder.embed(text) for text in texts))
+        elapsed = time.perf_counter() - t0
+        results.append(
+            Result(
+                "memory",
+                "embed_concurrent",
+                {"texts_per_s": len(texts) / elapsed, "encode_calls": float(model.calls)},
+                {"texts": len(texts)},
+            )
+        )
+
+    async def _retrieval(size: int) -> None:
+        memory = make_memory()
+        await _populate(memory, size)
+        latencies = []
+        for query in queries:
+            t0 = time.perf_counter()
+            await memory.search_many([query], top_k=5)
+            latencies.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for start in range(0, len(queries), 16):
+            await memory.search_many(queries[start:start + 16], top_k=5)
+        batched = time.perf_counter() - t0
+        results.append(
+            Result(
+                "memory",
+                "vector_search",
+                {
+                    **summarize(latencies),
+                    "queries_per_s": len(queries) / sum(latencies),
+                    "batched_queries_per_s": len(queries) / batched,
+                },
+                {"memories": size},
+            )
+        )
+
+        index = KeywordIndex(max_documents=size)
+        for sentence in sample_sentences(size, seed=1):
+            index.add(sentence)
+        latencies = []
+        for query in queries:
+            t0 = time.perf_counter()
+            index.search(query, 5)
+            latencies.append(time.perf_counter() - t0)
+        results.append(
+            Result(
+                "memory",
+                "keyword_search",
+                {**summarize(latencies), "queries_per_s": len(queries) / sum(latencies)},
+                {"memories": size},
+            )
+        )
+
+    asyncio.run(_embedding())
+    for size in sizes:
+        asyncio.run(_retrieval(size))
+    return results
+
+
+SUITES: Dict[str, Callable[[bool], List[Result]]] = {
+    "router": router_suite,
+    "api": api_suite,
+    "memory": memory_suite,
+}
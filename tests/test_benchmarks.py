@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.main import create_app
+from benchmarks.asgi import Lifespan, http_stream
+from benchmarks.fakes import FakeLLM, make_components
+from benchmarks.harness import Result, compare, summarize
+
+
+def test_stand_in_app_streams_incrementally_and_regressions_are_flagged():
+    import time
+
+    llm = FakeLLM(tokens_per_second=100, reply_tokens=5)
+    app = create_app(make_components(llm))
+
+    async def _run():
+        async with Lifespan(app):
+            chunks, arrivals = [], []
+            async for chunk in http_stream(app, "/api/chat/", {"message": "hi", "stream": True}):
+                chunks.append(chunk)
+                arrivals.append(time.perf_counter())
+            return chunks, arrivals
+
+    chunks, arrivals = asyncio.run(_run())
+    assert b"".join(chunks).endswith(b"[DONE]") and len(chunks) > 2
+    # Tokens arrive as they are generated, not in one buffered body.
+    assert arrivals[-1] - arrivals[0] >= 0.03
+
+    metrics = summarize([0.01, 0.02, 0.03])
+    assert round(metrics["p50_ms"], 6) == 20.0
+    before = [Result("api", "x", {"p50_ms": 10.0, "tokens_per_s": 100.0})]
+    after = [Result("api", "x", {"p50_ms": 12.0, "tokens_per_s": 95.0})]
+    flagged = {row["metric"] for row in compare(before, after) if row["regression"]}
+    assert flagged == {"p50_ms"}
+
+
+def test_load_generator_reports_latency_and_abandoned_streams():
+    from benchmarks.loadgen import LoadConfig, run_load
+
+    llm = FakeLLM(tokens_per_second=2000, reply_tokens=8)
+    components = make_components(llm)
+    app = create_app(components)
+    config = LoadConfig(
+        users=4, mode="http-stream", requests_per_user=3, think="fixed:0", abandon=0.5,
+        timeout=10, seed=1,
+    )
+    report = asyncio.run(run_load(app, config))
+    summary = report.summary()
+
+    assert summary["requests"] == 12 and summary["error_rate"] == 0.0
+    assert 0.0 < summary["cancel_rate"] < 1.0
+    assert summary["ttft_p50_ms"] <= summary["total_p99_ms"]
+    # Abandoned streams cancel generation and give the model back.
+    assert components.personality_core.scheduler.stats()["in_flight"] == 0
+    assert components.personality_core.cancelled_streams > 0
+
+    ws = asyncio.run(run_load(create_app(make_components(llm)), LoadConfig(
+        users=2, mode="ws", requests_per_user=2, think="fixed:0"
+    )))
+    assert ws.summary()["requests"] == 4 and ws.errors() == {}
+    assert ws.result().key.startswith("load/ws[")
@@ -0,0 +1,333 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+
+from backend.agents.vex_personality_core import VexPersonalityCore
+from backend.components import VexComponents
+from backend.main import create_app
+
+
+class EchoCore(VexPersonalityCore):
+    """Personality core that echoes the prompt's last line."""
+
+    async def generate_response(self, prompt, *, stream=False, use_remote=None, **kwargs):
+        reply = f"{'remote' if use_remote else 'local'}:{prompt.splitlines()[-1]}"
+        if not stream:
+            return reply
+
+        async def _streamer():
+            for token in reply.split(":"):
+                yield token
+
+        return _streamer()
+
+
+def _client():
+    components = VexComponents(personality_core=EchoCore())
+    return TestClient(create_app(components)), components
+
+
+def test_components_shared_between_requests():
+    client, components = _client()
+    with client:
+        first = client.post('/api/chat', json={'message': 'hello', 'mode': 'local'})
+        second = client.post('/api/chat', json={'message': 'again', 'mode': 'remote'})
+        manager = components.memory_manager
+    assert first.json() == {'reply': 'local:hello'}
+    assert second.json() == {'reply': 'remote:again'}
+    # Memories persist across requests because the manager is shared.
+    assert 'hello' in manager.keyword_index
+    assert components.personality_core.use_remote is False
+
+
+def test_chat_streaming_and_websocket():
+    client, _ = _client()
+    with client:
+        resp = client.post('/api/chat', json={'message': 'hi', 'stream': True})
+        assert resp.text == 'localhi[DONE]'
+        with client.websocket_connect('/api/chat/ws') as ws:
+            ws.send_json({'message': 'yo', 'mode': 'remote'})
+            assert ws.receive_json() == {'token': 'remote'}
+            assert ws.receive_json() == {'token': 'yo'}
+            assert ws.receive_json() == {'reply': 'remoteyo', 'done': True}
+
+
+def test_disconnect_cancels_generation_and_skips_memory():
+    import asyncio
+    import time
+
+    from backend.agents.vex_router import VexRouter
+    from backend.api.streaming import until_disconnected
+
+    produced = []
+
+    class SlowLlama:
+        def __call__(self, prompt, stream=False):
+            def _tokens():
+                for i in range(100):
+                    time.sleep(0.01)
+                    produced.append(i)
+                    yield {"choices": [{"text": str(i)}]}
+
+            return _tokens()
+
+    async def _run():
+        core = VexPersonalityCore()
+        core._llama = SlowLlama()
+        router = VexRouter(personality_core=core)
+        disconnected = asyncio.get_running_loop().create_future()
+        tokens = await router.handle_message("hello", stream=True)
+        received = []
+        async for token in until_disconnected(tokens, disconnected):
+            received.append(token)
+            disconnected.set_result(None)
+        return core, router, received
+
+    core, router, received = asyncio.run(_run())
+    assert received == ["0"]
+    assert core.cancelled_streams == 1
+    assert list(router.memory_manager.keyword_index) == []
+    assert len(produced) < 100
+
+
+def test_cancelled_stream_consumer_releases_local_model():
+    import asyncio
+    import contextlib
+    import time
+
+    from backend.agents.vex_router import VexRouter
+    from backend.api.streaming import until_disconnected
+
+    class SlowLlama:
+        def __call__(self, prompt, stream=False):
+            def _tokens():
+                for i in range(100):
+                    time.sleep(0.01)
+                    yield {"choices": [{"text": str(i)}]}
+
+            return _tokens()
+
+    async def _run():
+        core = VexPersonalityCore()
+        core._llama = SlowLlama()
+        router = VexRouter(personality_core=core)
+        disconnected = asyncio.get_running_loop().create_future()
+        tokens = await router.handle_message("hello", stream=True)
+
+        async def _consume():
+            async for _ in until_disconnected(tokens, disconnected):
+                pass
+
+        # Starlette cancels the response task while it awaits a token, never
+        # closes the body iterator and (via anyio) cancels every further
+        # ``await`` of the task as well.
+        task = asyncio.ensure_future(_consume())
+        await asyncio.sleep(0.05)
+        while not task.done():
+            task.cancel()
+            await asyncio.sleep(0)
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        for _ in range(100):
+            if not core.scheduler.stats()["in_flight"]:
+                break
+            await asyncio.sleep(0.01)
+        return core
+
+    core = asyncio.run(_run())
+    assert core.scheduler.stats()["in_flight"] == 0
+    assert core.cancelled_streams == 1
+
+
+def test_pipeline_records_timings_and_batches_memory_writes():
+    import asyncio
+
+    from backend.agents.vex_router import VexRouter
+    from backend.agents.vex_validator import VexValidator
+
+    class RejectingValidator(VexValidator):
+        async def validate(self, text):
+            return False
+
+    async def _run():
+        router = VexRouter(personality_core=EchoCore())
+        reply = await router.handle_message("hello")
+        await router.memory_manager.flush()
+
+        rejecting = VexRouter(personality_core=EchoCore(), validator=RejectingValidator())
+        try:
+            await rejecting.handle_message("bad")
+        except ValueError:
+            pass
+        return router, reply, rejecting
+
+    router, reply, rejecting = asyncio.run(_run())
+    assert reply == "local:hello"
+    assert list(router.memory_manager.keyword_index) == ["hello", "local:hello"]
+    assert {"validate", "retrieve", "build_prompt", "generate", "total"} <= set(router.timings)
+    assert list(rejecting.memory_manager.keyword_index) == []
+
+
+def test_response_cache_replays_streams_and_can_be_bypassed():
+    import asyncio
+
+    from backend.agents.vex_memory_manager import VexMemoryManager
+    from backend.agents.vex_response_cache import ResponseCache
+    from backend.agents.vex_router import VexRouter
+    from backend.memory import Embedder
+
+    class CountingCore(EchoCore):
+        calls = 0
+
+        async def generate_response(self, prompt, **kwargs):
+            CountingCore.calls += 1
+            return await super().generate_response(prompt, **kwargs)
+
+    class LengthModel:
+        def encode(self, texts, batch_size=32):
+            return [[float(len(t)), 1.0] for t in texts]
+
+    class CountingMemory(VexMemoryManager):
+        searches = 0
+
+        async def search_many(self, queries, *args, **kwargs):
+            CountingMemory.searches += 1
+            return await super().search_many(queries, *args, **kwargs)
+
+    cache = ResponseCache(embedder=Embedder(model=LengthModel()))
+    router = VexRouter(
+        personality_core=CountingCore(), memory_manager=CountingMemory(), response_cache=cache
+    )
+
+    async def _collect(message, **kwargs):
+        tokens = await router.handle_message(message, stream=True, **kwargs)
+        return [token async for token in tokens], router.cache_hit
+
+    async def _run():
+        first = await _collect("hello")
+        await router.memory_manager.flush()
+        await cache.flush()
+        # Stored memories do not change the key: an exact hit skipping retrieval.
+        second = await _collect("  Hello ")
+        similar = await _collect("hellO!")
+        bypassed = await router.handle_message("hello", use_cache=False)
+        return first, second, similar, bypassed
+
+    first, second, similar, bypassed = asyncio.run(_run())
+    assert first == (["local", "hello"], None)
+    assert second == (["local", "hello"], "exact")
+    assert similar == (["local", "hello"], "semantic")
+    assert bypassed == "local:hello" and CountingCore.calls == 2
+    assert CountingMemory.searches == 2
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["semantic_hits"] == 1
+
+
+def test_coalesce_by_bytes_and_delay_and_sse_framing():
+    import asyncio
+
+    from backend.api.streaming import coalesce
+
+    async def _tokens():
+        for token in ["a", "b", "c", "d"]:
+            yield token
+        await asyncio.sleep(0.05)
+        yield "late"
+
+    async def _collect(**kwargs):
+        return [chunk async for chunk in coalesce(_tokens(), **kwargs)]
+
+    assert asyncio.run(_collect()) == ["a", "b", "c", "d", "late"]
+    # Disabled coalescing adds no per-token work at all.
+    tokens = _tokens()
+    assert coalesce(tokens) is tokens
+    assert asyncio.run(_collect(max_bytes=2)) == ["ab", "cd", "late"]
+    # The delay flushes "abcd" while the slow token is still pending.
+    assert asyncio.run(_collect(max_delay=0.01)) == ["abcd", "late"]
+
+    client, components = _client()
+    components.settings = components.settings.model_copy(update={"stream_coalesce_bytes": 64})
+    with client:
+        resp = client.post('/api/chat', json={'message': 'hi', 'stream': True, 'format': 'sse'})
+    assert resp.headers['content-type'].startswith('text/event-stream')
+    assert resp.text == 'data: {"token": "localhi"}\n\ndata: [DONE]\n\n'
+
+
+def test_metrics_endpoint_exposes_stage_timings():
+    from backend import metrics
+    from backend.config.settings import Settings
+
+    config = Settings(metrics_enabled=True, response_cache_enabled=True, embedding_model="")
+    components = VexComponents(config, personality_core=EchoCore())
+    metrics.REGISTRY.reset()
+    with TestClient(create_app(components)) as client:
+        client.post('/api/chat', json={'message': 'hello', 'stream': True})
+        client.post('/api/chat', json={'message': 'again'})
+        body = client.get('/metrics').text
+    assert not metrics.REGISTRY.enabled
+    assert 'vex_stage_seconds_count{stage="retrieve"} 2' in body
+    assert 'vex_requests_total{outcome="ok"} 2' in body
+    assert 'vex_requests_in_flight 0' in body
+    assert 'vex_time_to_first_token_seconds_count{source="unknown"} 1' in body
+    assert 'vex_response_cache_misses 2' in body
+    # A stream the client never started reading does not stay in flight.
+    import asyncio
+
+    from backend.agents.vex_router import VexRouter
+
+    metrics.REGISTRY.enabled = True
+    try:
+        asyncio.run(VexRouter(personality_core=EchoCore()).handle_message('hi', stream=True))
+        assert metrics.REQUESTS_IN_FLIGHT.value() == 0
+    finally:
+        metrics.REGISTRY.enabled = False
+    # Disabled by default: no route and nothing recorded.
+    assert TestClient(create_app(VexComponents(personality_core=EchoCore()))).get('/metrics').status_code == 404
+
+
+def test_requests_shed_while_queued_get_503_and_error_frames():
+    import asyncio
+
+    class Llama:
+        def __call__(self, prompt, stream=False):
+            return iter([{'choices': [{'text': 'late'}]}])
+
+    core = VexPersonalityCore(queue_timeout=0.05)
+    core._llama = Llama()
+    # Another request holds the only model instance.
+    lease = asyncio.run(core.scheduler.acquire())
+    with TestClient(create_app(VexComponents(personality_core=core))) as client:
+        resp = client.post('/api/chat', json={'message': 'hi', 'stream': True, 'mode': 'local'})
+        assert resp.status_code == 503
+        with client.websocket_connect('/api/chat/ws') as ws:
+            ws.send_json({'message': 'hi', 'mode': 'local'})
+            assert ws.receive_json()['done'] is True
+            lease.release()
+            ws.send_json({'message': 'again', 'mode': 'local'})
+            assert ws.receive_json() == {'token': 'late'}
+    assert core.scheduler.stats()['in_flight'] == 0
+
+
+def test_client_priority_is_validated_and_clamped():
+    priorities = []
+
+    class PriorityCore(EchoCore):
+        async def generate_response(self, prompt, *, priority=0, **kwargs):
+            priorities.append(priority)
+            return await super().generate_response(prompt, **kwargs)
+
+    components = VexComponents(personality_core=PriorityCore())
+    with TestClient(create_app(components)) as client:
+        bad = client.post('/api/chat', json={'message': 'hi', 'priority': 'urgent'})
+        client.post('/api/chat', json={'message': 'hi', 'priority': -100})
+        client.post('/api/chat', json={'message': 'hi', 'priority': 1000})
+        with client.websocket_connect('/api/chat/ws?stream=false') as ws:
+            ws.send_json({'message': 'hi', 'priority': 1.5})
+            assert ws.receive_json() == {'error': 'priority must be an integer', 'done': True}
+            ws.send_json({'message': 'hi', 'priority': 3})
+            assert ws.receive_json()['done'] is True
+    assert bad.status_code == 422
+    # Nobody can jump ahead of default traffic.
+    assert priorities == [0, components.settings.local_max_priority, 3]
@@ -0,0 +1,378 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.memory import (
+    Embedder,
+    EmbeddingCache,
+    KeywordIndex,
+    LocalVectorIndex,
+    MemoryIngestQueue,
+    VectorStoreClient,
+)
+
+
+class FakeModel:
+    """Deterministic stand-in for a SentenceTransformer model."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_concurrent_embeds_are_batched():
+    model = FakeModel()
+    embedder = Embedder(model=model, max_batch_size=8, max_batch_wait=0.01)
+
+    async def _run():
+        return await asyncio.gather(*(embedder.embed("x" * i) for i in range(10)))
+
+    vectors = asyncio.run(_run())
+    assert vectors == [[float(i), 1.0] for i in range(10)]
+    # Eight texts fill the first batch, the remaining two flush on timeout.
+    assert [len(c) for c in model.calls] == [8, 2]
+
+
+def test_embed_many_single_encode():
+    model = FakeModel()
+    embedder = Embedder(model=model)
+    vectors = asyncio.run(embedder.embed_many(["a", "bb"]))
+    assert vectors == [[1.0, 1.0], [2.0, 1.0]]
+    assert model.calls == [["a", "bb"]]
+
+
+def test_embedding_cache_hits_and_disk_tier(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    model = FakeModel()
+    cache = EmbeddingCache(path=path)
+    embedder = Embedder(model=model, cache=cache)
+
+    async def _run(e):
+        first = await e.embed("hello world")
+        second = await e.embed("hello world")
+        return first, second
+
+    first, second = asyncio.run(_run(embedder))
+    assert first == second
+    assert len(model.calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    cache.close()
+
+    # A fresh cache backed by the same file serves the vector from disk.
+    restarted = EmbeddingCache(path=path)
+    other = FakeModel()
+    vector = asyncio.run(Embedder(model=other, cache=restarted).embed("hello world"))
+    assert vector == first and other.calls == []
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_embedding_cache_evicts_by_bytes():
+    cache = EmbeddingCache(max_bytes=16)
+    cache.store_many({"a": [1.0, 2.0], "b": [3.0, 4.0]})
+    cache.get("a")
+    cache.store_many({"c": [5.0, 6.0]})
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0, 2.0]
+    assert cache.size_bytes == 16
+
+
+class FlakyStore:
+    """Vector store stand-in that fails the first ``failures`` writes."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    async def add_vectors(self, collection, ids, vectors, metadatas=None):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("store unavailable")
+        self.calls.append((collection, list(ids), [m["text"] for m in metadatas]))
+
+
+def test_ingest_queue_batches_and_retries():
+    model = FakeModel()
+    store = FlakyStore(failures=1)
+    queue = MemoryIngestQueue(
+        Embedder(model=model), store, flush_interval=0.01, retry_backoff=0.001
+    )
+
+    async def _run():
+        await queue.put_many("a", ["one", "two", "three"])
+        await queue.put("b", "four")
+        await queue.aclose()
+
+    asyncio.run(_run())
+    assert model.calls == [["one", "two", "three", "four"]]
+    assert [(c, texts) for c, _, texts in store.calls] == [
+        ("a", ["one", "two", "three"]),
+        ("b", ["four"]),
+    ]
+    assert queue.stats()["written"] == 4 and queue.stats()["retries"] == 1
+
+
+class FakeCollection:
+    def __init__(self):
+        self.added = []
+
+    def add(self, ids, embeddings, metadatas=None):
+        self.added.extend(ids)
+
+    def query(self, query_embeddings, n_results):
+        self.queries = getattr(self, "queries", 0) + 1
+        hits = self.added[:n_results]
+        return {
+            "ids": [hits for _ in query_embeddings],
+            "distances": [[0.25 * i for i in range(len(hits))] for _ in query_embeddings],
+            "metadatas": [[{} for _ in hits] for _ in query_embeddings],
+        }
+
+
+class FakeChroma:
+    def __init__(self):
+        self.lookups = 0
+        self.collection = FakeCollection()
+
+    def get_or_create_collection(self, name, metadata=None):
+        self.lookups += 1
+        return self.collection
+
+
+def test_vector_store_caches_collection_handles(monkeypatch):
+    fake = FakeChroma()
+    monkeypatch.setattr(VectorStoreClient, "_init_chroma", lambda self, config: fake)
+    store = VectorStoreClient({"backend": "chroma"})
+
+    async def _run():
+        await store.warmup(["memories"])
+        await store.add_vectors("memories", ["1"], [[0.1, 0.2]])
+        await store.add_vectors("memories", ["2"], [[0.3, 0.4]])
+        single = await store.query("memories", [0.1, 0.2], n_results=1)
+        many = await store.query_many("memories", [[0.1, 0.2], [0.3, 0.4]], n_results=2)
+        return single, many
+
+    single, many = asyncio.run(_run())
+    # Chroma distances are reported as similarities (higher is better).
+    assert single == [("1", 1.0, {})]
+    assert many == [[("1", 1.0, {}), ("2", 0.75, {})]] * 2
+    assert fake.lookups == 1 and fake.collection.queries == 2
+
+
+def test_qdrant_queries_use_the_batch_query_api(monkeypatch):
+    import importlib.machinery
+    import sys
+    import types
+
+    class QueryRequest:
+        def __init__(self, query, limit, with_payload):
+            self.query, self.limit = query, limit
+
+    class Point:
+        def __init__(self, id, score):
+            self.id, self.score, self.payload = id, score, {"text": f"t{id}"}
+
+    class FakeQdrant:
+        def query_batch_points(self, collection_name, requests):
+            self.requests = requests
+            return [
+                types.SimpleNamespace(points=[Point(i, r.query[0] - i) for i in range(r.limit)])
+                for r in requests
+            ]
+
+    models = types.ModuleType("qdrant_client.http.models")
+    models.__spec__ = importlib.machinery.ModuleSpec(models.__name__, None)
+    models.QueryRequest = QueryRequest
+    monkeypatch.setitem(sys.modules, "qdrant_client.http.models", models)
+    fake = FakeQdrant()
+    monkeypatch.setattr(VectorStoreClient, "_init_qdrant", lambda self, config: fake)
+    store = VectorStoreClient({"backend": "qdrant", "distance": "l2"})
+
+    hits = asyncio.run(store.query_many("m", [[1.0, 0.0], [5.0, 0.0]], n_results=2))
+    assert [r.query for r in fake.requests] == [[1.0, 0.0], [5.0, 0.0]]
+    # Euclidean distances come back as similarities (higher is better).
+    assert hits == [
+        [("0", -1.0, {"text": "t0"}), ("1", 0.0, {"text": "t1"})],
+        [("0", -5.0, {"text": "t0"}), ("1", -4.0, {"text": "t1"})],
+    ]
+
+
+def test_local_backend_topk_and_persistence(tmp_path):
+    path = str(tmp_path / "index")
+    vectors = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.7, 0.7, 0.0], [0.0, 0.0, 1.0]]
+    ids = ["x", "y", "xy", "z"]
+
+    async def run(add):
+        store = VectorStoreClient({"backend": "local", "persist_directory": path})
+        if add:
+            await store.add_vectors("m", ids, vectors, [{"text": i} for i in ids])
+        hits = await store.query("m", [1.0, 0.1, 0.0], n_results=2)
+        store.close()
+        return hits
+
+    hits = asyncio.run(run(add=True))
+    assert [h[0] for h in hits] == ["x", "xy"]
+    assert hits[0][1] > hits[1][1] and hits[0][2] == {"text": "x"}
+
+    # Reopened from disk with the memory-mapped vector file.
+    assert [h[0] for h in asyncio.run(run(add=False))] == ["x", "xy"]
+
+    index = LocalVectorIndex(dtype="int8", distance="l2")
+    index.add("m", ids, vectors)
+    assert [h[0] for h in index.query("m", [0.0, 0.9, 0.1], n_results=1)] == ["y"]
+
+
+def test_local_backend_scores_in_chunks_and_checks_dtype(tmp_path, monkeypatch):
+    import pytest
+
+    from backend.memory import local_index
+
+    import math
+
+    vectors = [[math.sin(i), math.cos(1.3 * i), i / 50] for i in range(50)]
+    ids = [str(i) for i in range(50)]
+    query = [[1.0, 0.0, 0.5], [0.0, -1.0, 0.0]]
+    expected = {}
+    for dtype in ("float32", "float16", "int8"):
+        index = LocalVectorIndex(path=str(tmp_path / dtype), dtype=dtype, distance="l2")
+        index.add("m", ids, vectors)
+        expected[dtype] = [[h[0] for h in hits] for hits in index.query_many("m", query, 3)]
+        # Scoring a few rows at a time keeps only a running top-k.
+        monkeypatch.setattr(local_index, "_QUERY_CHUNK", 4)
+        chunked = [[h[0] for h in hits] for hits in index.query_many("m", query, 3)]
+        monkeypatch.setattr(local_index, "_QUERY_CHUNK", 4096)
+        assert chunked == expected[dtype]
+        index.close()
+    assert expected["int8"][0][0] == expected["float32"][0][0]
+
+    # A float32 collection is not silently read back as int8.
+    with pytest.raises(ValueError, match="float32"):
+        LocalVectorIndex(path=str(tmp_path / "float32"), dtype="int8").count("m")
+
+
+def test_search_many_single_embed_and_query():
+    from backend.agents.vex_memory_manager import VexMemoryManager
+
+    model = FakeModel()
+    store = VectorStoreClient({"backend": "local", "distance": "ip"})
+    manager = VexMemoryManager(embedder=Embedder(model=model), vector_store=store)
+
+    async def _run():
+        await manager.add_memories(["a", "bbbbbbbb"])
+        return await manager.search_many(["x", "yy"], top_k=2)
+
+    results = asyncio.run(_run())
+    assert [[text for text, _ in hits] for hits in results] == [["bbbbbbbb", "a"]] * 2
+    assert results[0][0][1] > results[0][1][1]
+    assert model.calls[-1] == ["x", "yy"]
+
+
+def test_keyword_index_bm25_and_eviction():
+    index = KeywordIndex(max_documents=3)
+    index.add("the cat sat on the mat")
+    index.add("dogs chase cats")
+    index.add("a cat, a cat and another cat")
+
+    hits = index.search("Cat", top_k=2)
+    assert [text for text, _ in hits] == ["a cat, a cat and another cat", "the cat sat on the mat"]
+    assert index.search("unknown words") == []
+
+    index.add("parrots talk")
+    assert len(index) == 3 and index.stats()["evicted"] == 1
+    assert [text for text, _ in index.search("mat")] == []
+    assert [text for text, _ in index.search("parrots")] == ["parrots talk"]
+
+
+def test_sessions_are_isolated_and_expire():
+    from backend.agents.vex_memory_manager import VexMemoryManager
+
+    store = VectorStoreClient({"backend": "local"})
+    manager = VexMemoryManager(
+        embedder=Embedder(model=FakeModel()), vector_store=store, session_ttl=60
+    )
+    alice = VexMemoryManager.collection_for("alice@example.com")
+    assert alice.startswith("memories_alice_example_com_")
+    assert alice != VexMemoryManager.collection_for("alice#example.com")
+
+    async def _run():
+        await manager.add_memories(["alice likes tea"], session_id="alice@example.com")
+        await manager.add_memories(["bob likes coffee"], session_id="bob")
+        found = await manager.search("likes", session_id="bob")
+        manager._last_seen["alice@example.com"] -= 120
+        expired = await manager.expire_sessions()
+        return found, expired
+
+    found, expired = asyncio.run(_run())
+    assert found == ["bob likes coffee"]
+    assert expired == ["alice@example.com"] and manager.sessions == ["bob"]
+    assert store._client.count(alice) == 0
+    assert store._client.count(VexMemoryManager.collection_for("bob")) == 1
+
+
+def test_sessions_from_an_earlier_run_expire_and_queued_writes_are_dropped(tmp_path):
+    from backend.agents.vex_memory_manager import VexMemoryManager
+
+    def _manager():
+        store = VectorStoreClient({"backend": "local", "persist_directory": str(tmp_path)})
+        embedder = Embedder(model=FakeModel())
+        queue = MemoryIngestQueue(embedder, store, flush_interval=0.01)
+        manager = VexMemoryManager(
+            embedder=embedder, vector_store=store, ingest_queue=queue, session_ttl=60
+        )
+        return store, queue, manager
+
+    alice = VexMemoryManager.collection_for("alice")
+    bob = VexMemoryManager.collection_for("bob")
+
+    async def _first_run():
+        store, _, manager = _manager()
+        await manager.add_memories(["alice likes tea"], session_id="alice")
+        await manager.add_memories(["bob likes coffee"], session_id="bob")
+        await manager.aclose()
+        store.close()
+
+    async def _second_run():
+        store, queue, manager = _manager()
+        restored = await manager.restore_sessions()
+        # Bob comes back; Alice's collection is only known from the store.
+        found = await manager.search("likes", session_id="bob")
+        manager._orphans[alice] -= 120
+        expired = await manager.expire_sessions()
+        # Carol's write is still queued when her session is deleted.
+        await manager.add_memories(["carol likes juice"], session_id="carol")
+        await manager.delete_session("carol")
+        await manager.flush()
+        return store, queue, restored, found, expired
+
+    asyncio.run(_first_run())
+    store, queue, restored, found, expired = asyncio.run(_second_run())
+    assert restored == 2 and found == ["bob likes coffee"]
+    assert expired == [] and store._client.collections() == [bob]
+    assert not os.path.exists(tmp_path / alice)
+    assert queue.stats()["dropped"] == 1 and queue.stats()["written"] == 0
+
+
+def test_full_ingest_buffer_drops_writes_instead_of_parking_tasks():
+    from backend.agents.vex_memory_manager import VexMemoryManager
+
+    store = FlakyStore(failures=0)
+    embedder = Embedder(model=FakeModel())
+    queue = MemoryIngestQueue(embedder, store, max_buffer=2, flush_interval=0.01)
+    manager = VexMemoryManager(embedder=embedder, vector_store=store, ingest_queue=queue)
+
+    async def _run():
+        # The worker only runs after all five writes were handed over.
+        tasks = [manager.schedule_memories([f"q{i}", f"a{i}"]) for i in range(5)]
+        await asyncio.sleep(0)
+        parked = sum(not task.done() for task in tasks)
+        await manager.aclose()
+        return parked
+
+    assert asyncio.run(_run()) == 0
+    assert queue.stats()["written"] == 2 and queue.stats()["rejected"] == 8
+    # The keyword index still holds every memory.
+    assert len(manager.keyword_index) == 10
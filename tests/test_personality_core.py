@@ -0,0 +1,495 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import pytest
+
+from backend.agents.vex_personality_core import VexPersonalityCore
+
+
+def _core(handler, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    core = VexPersonalityCore(
+        remote_url="http://llm.test/v1", use_remote=True, http_client=client, **kwargs
+    )
+    return core, client
+
+
+def test_remote_generation_reuses_shared_client():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"text": "pong"})
+
+    async def _run():
+        core, client = _core(handler)
+        first = await core.generate_response("ping")
+        second = await core.generate_response("ping")
+        assert core.http_client is client
+        await core.aclose()
+        # Caller-owned clients are left open.
+        assert not client.is_closed
+        await client.aclose()
+        return first, second
+
+    assert asyncio.run(_run()) == ("pong", "pong")
+    assert len(calls) == 2
+
+
+def test_remote_stream_first_token_timeout():
+    async def slow_body():
+        await asyncio.sleep(1)
+        yield b"late"
+
+    def handler(request):
+        return httpx.Response(200, content=slow_body())
+
+    async def _run():
+        core, client = _core(handler, first_token_timeout=0.05)
+        tokens = await core.generate_response("ping", stream=True)
+        try:
+            with pytest.raises(TimeoutError):
+                async for _ in tokens:
+                    pass
+        finally:
+            await client.aclose()
+
+    asyncio.run(_run())
+
+
+def test_local_stream_does_not_block_event_loop():
+    import time
+
+    class SlowLlama:
+        def __init__(self):
+            self.closed = False
+
+        def __call__(self, prompt, stream=False):
+            def _tokens():
+                try:
+                    for token in ("a", "b", "c"):
+                        time.sleep(0.05)
+                        yield {"choices": [{"text": token}]}
+                finally:
+                    self.closed = True
+
+            return _tokens()
+
+    async def _run():
+        core = VexPersonalityCore()
+        core._llama = SlowLlama()
+        ticks = 0
+
+        async def _ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(_ticker())
+        tokens = await core.generate_response("hi", stream=True)
+        collected = [t async for t in tokens]
+        ticker.cancel()
+
+        early = await core.generate_response("hi", stream=True)
+        assert await early.__anext__() == "a"
+        await early.aclose()
+        await asyncio.sleep(0.2)
+        return collected, ticks, core._llama.closed
+
+    collected, ticks, closed = asyncio.run(_run())
+    assert collected == ["a", "b", "c"]
+    assert ticks >= 5
+    assert closed
+
+
+def test_scheduler_serialises_and_sheds_load():
+    from backend.agents.vex_scheduler import InferenceScheduler, SchedulerOverloaded
+
+    async def _run():
+        scheduler = InferenceScheduler(["model"], max_queue=1)
+        order = []
+
+        async def _job(name, priority):
+            lease = await scheduler.acquire(priority=priority)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            lease.release()
+
+        first = await scheduler.acquire()
+        low = asyncio.create_task(_job("low", 5))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 1
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.acquire()
+        scheduler.max_queue = 2
+        high = asyncio.create_task(_job("high", 0))
+        await asyncio.sleep(0)
+        first.release()
+        await asyncio.gather(low, high)
+
+        blocker = await scheduler.acquire()
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.acquire(timeout=0.01)
+        blocker.release()
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(_run())
+    assert order == ["high", "low"]
+    assert stats["rejected"] == 1 and stats["expired"] == 1
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 0
+
+
+def test_local_overload_fails_over_to_remote():
+    def handler(request):
+        return httpx.Response(200, json={"text": "remote"})
+
+    class BusyLlama:
+        def __call__(self, prompt, stream=False):
+            return {"choices": [{"text": "local"}]}
+
+    async def _run():
+        core, client = _core(handler, max_queue=0, failover_to_remote=True)
+        core._llama = BusyLlama()
+        lease = await core.scheduler.acquire()
+        try:
+            return await core.generate_response("hi", use_remote=False)
+        finally:
+            lease.release()
+            await client.aclose()
+
+    assert asyncio.run(_run()) == "remote"
+
+
+class _EchoModel:
+    def __call__(self, prompt, stream=False):
+        if not stream:
+            return {"choices": [{"text": prompt.upper()}]}
+        return ({"choices": [{"text": c}]} for c in prompt)
+
+
+def _load_echo(model_path, n_threads):
+    return _EchoModel()
+
+
+def test_local_process_pool_streams_and_restarts():
+    from backend.agents.vex_local_pool import LocalModelPool
+
+    pool = LocalModelPool("unused.gguf", instances=1, loader=_load_echo, load_timeout=30)
+    pool.start()
+    core = VexPersonalityCore(local_pool=pool)
+
+    async def _run():
+        full = await core.generate_response("abc")
+        tokens = await core.generate_response("xyz", stream=True)
+        streamed = [t async for t in tokens]
+        early = await core.generate_response("long prompt", stream=True)
+        await early.__anext__()
+        await early.aclose()
+        return full, streamed
+
+    try:
+        full, streamed = asyncio.run(_run())
+        assert full == "ABC" and streamed == ["x", "y", "z"]
+
+        pool.instances[0]._process.kill()
+        pool.instances[0]._process.join()
+        assert asyncio.run(core.generate_response("ok")) == "OK"
+        assert pool.health()[0]["restarts"] == 1
+    finally:
+        pool.close()
+
+
+class _State:
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.llama_state_size = len(ids)
+
+
+class FakePrefixLlama:
+    """Counts evaluated tokens the way llama.cpp reuses a matching prefix.
+
+    Like ``llama_cpp.Llama``, ``input_ids`` is the whole ``n_ctx`` buffer;
+    only the first ``n_tokens`` entries are valid, the rest may be stale.
+    """
+
+    def __init__(self, n_ctx=256):
+        self.input_ids = [0] * n_ctx
+        self.n_tokens = 0
+        self.evaluated = 0
+
+    def tokenize(self, text, special=False):
+        return [1] + list(text)
+
+    def eval(self, tokens):
+        self.input_ids[self.n_tokens : self.n_tokens + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+        self.evaluated += len(tokens)
+
+    def save_state(self):
+        return _State(self.input_ids[: self.n_tokens])
+
+    def load_state(self, state):
+        self.input_ids[: len(state.ids)] = state.ids
+        self.n_tokens = len(state.ids)
+
+    def __call__(self, prompt, stream=False):
+        tokens = self.tokenize(prompt.encode("utf-8"))
+        keep = 0
+        for a, b in zip(self.input_ids[: self.n_tokens], tokens):
+            if a != b:
+                break
+            keep += 1
+        self.n_tokens = keep
+        self.eval(tokens[keep:])
+        return {"choices": [{"text": "ok"}]}
+
+
+def test_prefix_cache_reuses_system_prompt_state():
+    from backend.agents.vex_prefix_cache import PrefixCachedModel, PrefixStateCache
+
+    llama = FakePrefixLlama()
+    cache = PrefixStateCache(max_bytes=1024)
+    model = PrefixCachedModel(llama, cache)
+    core = VexPersonalityCore(system_prompt="SYSTEM")
+
+    first = core.build_prompt("hello", ["fact"])
+    model(first)
+    assert llama.evaluated == len(first) + 1
+
+    llama.evaluated = 0
+    second = core.build_prompt("different question", ["other fact"])
+    model(second)
+    # Only the tokens after "SYSTEM\n\n" (and the BOS token) are evaluated.
+    assert llama.evaluated == len(second) - len("SYSTEM\n\n")
+    assert cache.stats()["tokens_saved"] == len("SYSTEM\n\n") + 1
+    assert len(cache) == 3
+
+
+def test_prefix_cache_ignores_stale_tokens_past_n_tokens():
+    from backend.agents.vex_prefix_cache import PrefixCachedModel, PrefixStateCache
+
+    llama = FakePrefixLlama()
+    model = PrefixCachedModel(llama, PrefixStateCache(max_bytes=1024), boundaries=lambda p: ["ab"])
+    model("abcdef")
+    # Only BOS and "a" are still valid; "bcdef" lingers in the buffer.
+    llama.n_tokens = 2
+    llama.evaluated = 0
+    assert model.prepare("abcxyz") == 3
+    assert llama.n_tokens == 3 and llama.evaluated == 0
+
+
+def test_pack_prompt_ranks_dedups_and_fits_budget():
+    # One token per character keeps the arithmetic exact.
+    core = VexPersonalityCore(system_prompt="SYS", context_budget=80, token_counter=len)
+    memories = [
+        ("low value " * 5, 0.1),
+        ("best fact", 0.9),
+        ("Best  fact", 0.2),
+        ("second fact that is long", 0.5),
+    ]
+
+    packed = core.pack_prompt("question?", memories)
+    assert packed.memories[:2] == ["best fact", "second fact that is long"]
+    assert packed.truncated and packed.memories[2].startswith("low value")
+    assert packed.dropped == 1
+    assert packed.tokens == len(packed.text) <= 80
+    assert packed.text.startswith("SYS\n\nbest fact\n") and packed.text.endswith("\n\nquestion?")
+
+    # Unlimited budget keeps every unique memory.
+    core.context_budget = None
+    assert len(core.pack_prompt("question?", memories).memories) == 3
+
+
+def test_remote_sse_stream_yields_deltas_and_metadata():
+    import json
+
+    openai_body = (
+        ": keep-alive\n\n"
+        'data: {"choices": [{"delta": {"content": "Hel"}}]}\n\n'
+        # A raw U+2028 is valid inside JSON strings but is no SSE line break.
+        'data: {"choices": [{"delta": {"content": "lo\u2028"}, "finish_reason": "stop"}]}\n\n'
+        'data: {"choices": [], "usage": {"completion_tokens": 2}}\n\n'
+        "data: [DONE]\n\n"
+    )
+    anthropic_body = (
+        'event: message_start\ndata: {"type": "message_start", "message": {"usage": {"input_tokens": 5}}}\n\n'
+        'event: ping\ndata: {"type": "ping"}\n\n'
+        'event: content_block_delta\ndata: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hi"}}\n\n'
+        'event: message_delta\ndata: {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 1}}\n\n'
+        'event: message_stop\ndata: {"type": "message_stop"}\n\n'
+    )
+    bodies = {"openai": openai_body, "anthropic": anthropic_body}
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        if request.url.path.endswith("/plain"):
+            return httpx.Response(200, json={"choices": [{"message": {"content": "whole"}, "finish_reason": "stop"}]})
+        body = bodies[request.url.path.rsplit("/", 1)[-1]]
+
+        async def fragments():
+            # Arbitrary fragment boundaries, as on the wire.
+            for i in range(0, len(body), 5):
+                yield body[i:i + 5].encode()
+
+        return httpx.Response(200, content=fragments(), headers={"content-type": "text/event-stream"})
+
+    async def _stream(core, path):
+        core.remote_url = f"http://llm.test/{path}"
+        metadata = {}
+        tokens = await core.generate_response("ping", stream=True, metadata=metadata)
+        return [t async for t in tokens], metadata
+
+    async def _run():
+        core, client = _core(handler)
+        openai = await _stream(core, "openai")
+        anthropic = await _stream(core, "anthropic")
+        core.remote_url = "http://llm.test/plain"
+        plain = await core.generate_response("ping")
+        await client.aclose()
+        return openai, anthropic, plain
+
+    openai, anthropic, plain = asyncio.run(_run())
+    assert openai == (
+        ["Hel", "lo\u2028"],
+        {
+            "source": "remote",
+            "endpoint": "http://llm.test/openai",
+            "finish_reason": "stop",
+            "usage": {"completion_tokens": 2},
+        },
+    )
+    assert anthropic[0] == ["Hi"]
+    assert anthropic[1]["finish_reason"] == "end_turn"
+    assert anthropic[1]["usage"] == {"input_tokens": 5, "output_tokens": 1}
+    assert plain == "whole"
+    assert requests[0] == {"prompt": "ping", "stream": True} and requests[-1]["stream"] is False
+
+    from backend.agents.vex_remote_stream import SSEDecoder
+
+    decoder = SSEDecoder()
+    events = decoder.feed("data: a\x0cb\r") + decoder.feed("\r\ndata: c\rdata: d\n")
+    assert events == [(None, "a\x0cb")] and decoder.close() == [(None, "c\nd")]
+
+
+def test_remote_json_bodies_decode_as_one_document_and_ndjson_by_line():
+    import json
+
+    from backend.agents.vex_remote_stream import iter_deltas
+
+    async def _deltas(body, content_type):
+        async def chunks():
+            for i in range(0, len(body), 7):
+                yield body[i:i + 7]
+
+        return [(d.text, d.finish_reason) async for d in iter_deltas(chunks(), content_type)]
+
+    # A pretty-printed completion from a server that ignored "stream": true.
+    document = json.dumps(
+        {"choices": [{"message": {"content": "one\ntwo"}, "finish_reason": "stop"}]}, indent=2
+    )
+    ndjson = '{"response": "a"}\n{"response": "b", "done": true}\n'
+    assert asyncio.run(_deltas(document, "application/json; charset=utf-8")) == [("one\ntwo", "stop")]
+    assert asyncio.run(_deltas(ndjson, "application/x-ndjson")) == [("a", None), ("b", "stop")]
+    # NDJSON labelled as plain JSON still decodes line by line.
+    assert asyncio.run(_deltas(ndjson, "application/json")) == [("a", None), ("b", "stop")]
+
+
+def test_remote_endpoints_route_hedge_and_break_circuits():
+    from backend.agents.vex_remote_endpoints import RemoteEndpointPool, RemoteUnavailable
+
+    delays = {"fast.test": 0.0, "slow.test": 0.5}
+    broken = set()
+    hits = []
+
+    async def handler(request):
+        host = request.url.host
+        hits.append(host)
+        if host in broken:
+            return httpx.Response(500)
+        await asyncio.sleep(delays[host])
+        return httpx.Response(200, json={"text": host})
+
+    async def _run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        pool = RemoteEndpointPool(
+            ["http://slow.test/v1", "http://fast.test/v1"],
+            hedge=True,
+            hedge_delay=0.05,
+            failure_threshold=2,
+            cooldown=60,
+        )
+        core = VexPersonalityCore(use_remote=True, http_client=client, endpoints=pool)
+        results = []
+
+        # The first request goes to the (unmeasured) slow endpoint and is
+        # hedged to the fast one, which wins.
+        metadata = {}
+        started = asyncio.get_running_loop().time()
+        results.append(await core.generate_response("ping", metadata=metadata))
+        assert asyncio.get_running_loop().time() - started < 0.4
+        assert metadata["endpoint"] == "http://fast.test/v1" and pool.hedges == 1
+
+        # Routing now prefers the measured fast endpoint; no hedge needed.
+        hits.clear()
+        results.append(await core.generate_response("ping"))
+        assert hits == ["fast.test"]
+
+        # Repeated failures open the circuit and traffic moves elsewhere.
+        broken.add("fast.test")
+        delays["slow.test"] = 0.0
+        for _ in range(2):
+            results.append(await core.generate_response("ping"))
+        assert pool.endpoints[1].state == "open"
+        hits.clear()
+        results.append(await core.generate_response("ping"))
+        assert hits == ["slow.test"]
+
+        broken.add("slow.test")
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await core.generate_response("ping")
+        with pytest.raises(RemoteUnavailable):
+            await core.generate_response("ping")
+        await client.aclose()
+        return results
+
+    assert asyncio.run(_run()) == ["fast.test"] * 2 + ["slow.test"] * 3
+
+
+def test_cancelled_local_call_keeps_lease_until_model_returns():
+    import threading
+    import time
+
+    class CountingLlama:
+        def __init__(self):
+            self.active = self.peak = 0
+            self.lock = threading.Lock()
+
+        def __call__(self, prompt, stream=False):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.05)
+            with self.lock:
+                self.active -= 1
+            return {"choices": [{"text": "ok", "finish_reason": "stop"}]}
+
+    async def _run():
+        core = VexPersonalityCore()
+        core._llama = llama = CountingLlama()
+        first = asyncio.ensure_future(core.generate_response("one"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        # The first call is still running in its thread; the second must wait.
+        second = await core.generate_response("two")
+        return llama.peak, second, core.scheduler.stats()
+
+    peak, second, stats = asyncio.run(_run())
+    assert peak == 1 and second == "ok"
+    assert stats["in_flight"] == 0
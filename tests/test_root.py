@@ -12,3 +12,189 @@ def test_root_endpoint():
     resp = client.get('/')
     assert resp.status_code == 200
     assert resp.json() == {'status': 'ok'}
+
+
+def test_backend_import_defers_heavy_backends(tmp_path):
+    import json
+    import subprocess
+    import time
+
+    # Importable stand-ins, so the check means something even when the
+    # real packages are not installed.
+    for name in ('sentence_transformers', 'llama_cpp', 'torch'):
+        (tmp_path / f'{name}.py').write_text('')
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    script = (
+        'import json, sys, time; t0 = time.perf_counter(); import backend.main; '
+        'print(json.dumps({"seconds": time.perf_counter() - t0, "loaded": sorted('
+        '{"sentence_transformers", "llama_cpp", "torch"} & set(sys.modules))}))'
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), root]),
+               LOCAL_MODEL_PATH='model.gguf', EMBEDDING_MODEL='MiniLM')
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', script], env=env, cwd=str(tmp_path),
+                         capture_output=True, text=True, check=True).stdout
+    report = json.loads(out.strip().splitlines()[-1])
+    assert report['loaded'] == []
+    assert report['seconds'] < 5.0 and time.perf_counter() - started < 15.0
+
+
+def test_ready_reports_lazily_loaded_models(monkeypatch):
+    import importlib.machinery
+    import time
+    import types
+
+    from backend.components import VexComponents
+    from backend.config.settings import Settings
+    from backend.main import create_app
+
+    loads = []
+
+    class Llama:
+        def __init__(self, model_path):
+            loads.append(model_path)
+            if model_path == 'broken.gguf':
+                raise OSError('not a gguf file')
+
+        def __call__(self, prompt, stream=False, **kwargs):
+            return {'choices': [{'text': 'hi', 'finish_reason': 'stop'}]}
+
+    module = types.ModuleType('llama_cpp')
+    module.__spec__ = importlib.machinery.ModuleSpec('llama_cpp', None)
+    module.Llama = Llama
+    monkeypatch.setitem(sys.modules, 'llama_cpp', module)
+
+    def _settings(**overrides):
+        return Settings(local_model_path='model.gguf', embedding_model='', remote_url=None,
+                        local_prefix_cache_bytes=0, response_cache_enabled=False, **overrides)
+
+    app = create_app(VexComponents(_settings(warmup_models=False)))
+    with TestClient(app) as client:
+        resp = client.get('/ready')
+        assert resp.status_code == 200
+        assert resp.json()['components']['local_model'] == 'lazy' and loads == []
+        client.post('/api/chat/', json={'message': 'hello', 'mode': 'local', 'cache': False})
+        assert client.get('/ready').json()['components']['local_model'] == 'loaded'
+    assert loads == ['model.gguf']
+
+    app = create_app(VexComponents(_settings(warmup_models=True)))
+    with TestClient(app) as client:
+        for _ in range(100):
+            report = client.get('/ready').json()
+            if report['ready']:
+                break
+            time.sleep(0.01)
+        assert report['components']['local_model'] == 'loaded'
+    assert len(loads) == 2
+
+    # Without a remote endpoint nothing can answer once the local model failed.
+    config = Settings(local_model_path='broken.gguf', embedding_model='', remote_url=None,
+                      response_cache_enabled=False, warmup_models=True)
+    with TestClient(create_app(VexComponents(config))) as client:
+        for _ in range(100):
+            resp = client.get('/ready')
+            if not resp.json()['warming_up']:
+                break
+            time.sleep(0.01)
+    assert resp.status_code == 503
+    assert resp.json()['components']['local_model'] == 'failed'
+
+
+def test_failed_embedding_model_is_not_reloaded_and_reported(monkeypatch):
+    import importlib.machinery
+    import types
+
+    from backend.agents.vex_personality_core import VexPersonalityCore
+    from backend.components import VexComponents
+    from backend.config.settings import Settings
+    from backend.main import create_app
+
+    class Llama:
+        def __call__(self, prompt, stream=False):
+            return {'choices': [{'text': 'ok', 'finish_reason': 'stop'}]}
+
+    core = VexPersonalityCore()
+    core._llama = Llama()
+    attempts = []
+
+    def SentenceTransformer(name, device=None):
+        attempts.append(name)
+        raise OSError(f"{name} is not a sentence-transformers model")
+
+    module = types.ModuleType('sentence_transformers')
+    module.__spec__ = importlib.machinery.ModuleSpec('sentence_transformers', None)
+    module.SentenceTransformer = SentenceTransformer
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', module)
+
+    config = Settings(embedding_model='text-embedding-3-large', vector_backend='local',
+                      embedding_cache_max_bytes=0, response_cache_enabled=True)
+    components = VexComponents(config, personality_core=core)
+    with TestClient(create_app(components)) as client:
+        for message in ('first', 'second', 'first'):
+            client.post('/api/chat/', json={'message': message, 'mode': 'local'})
+        resp = client.get('/ready')
+        manager, queue = components.memory_manager, components.ingest_queue
+    assert attempts == ['text-embedding-3-large']
+    # Keyword memory still works, so the app stays ready while degraded.
+    assert resp.status_code == 200
+    report = resp.json()
+    assert report['ready'] is True and report['degraded'] is True
+    assert report['components']['embedder'] == 'failed'
+    # Memory falls back to the keyword index instead of dropping writes.
+    assert not manager.semantic
+    assert 'second' in manager.keyword_index
+    assert queue.failed == 0
+
+
+def test_restart_rebuilds_the_memory_stack_and_persists_writes(monkeypatch, tmp_path):
+    import importlib.machinery
+    import types
+
+    from backend.agents.vex_memory_manager import VexMemoryManager
+    from backend.agents.vex_personality_core import VexPersonalityCore
+    from backend.components import VexComponents
+    from backend.config.settings import Settings
+    from backend.main import create_app
+    from backend.memory import LocalVectorIndex
+
+    class Llama:
+        def __call__(self, prompt, stream=False):
+            return {'choices': [{'text': 'ok', 'finish_reason': 'stop'}]}
+
+    class SentenceTransformer:
+        def __init__(self, name, device=None):
+            pass
+
+        def encode(self, texts, batch_size=32):
+            return [[float(len(t)), 1.0] for t in texts]
+
+    module = types.ModuleType('sentence_transformers')
+    module.__spec__ = importlib.machinery.ModuleSpec('sentence_transformers', None)
+    module.SentenceTransformer = SentenceTransformer
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', module)
+
+    core = VexPersonalityCore()
+    core._llama = Llama()
+    config = Settings(embedding_model='all-MiniLM-L6-v2', vector_backend='local',
+                      vector_persist_directory=tmp_path, embedding_cache_max_bytes=0,
+                      response_cache_enabled=False, warmup_models=False)
+    components = VexComponents(config, personality_core=core)
+    app = create_app(components)
+    managers = []
+    for message in ('first', 'second'):
+        with TestClient(app) as client:
+            client.post('/api/chat/', json={'message': message, 'mode': 'local'})
+            managers.append(components.memory_manager)
+        assert components.memory_manager is None and components.vector_store is None
+    assert managers[0] is not managers[1]
+    # Both runs reached the disk, the one after the restart included.
+    index = LocalVectorIndex(path=str(tmp_path))
+    assert index.count(VexMemoryManager.COLLECTION) == 4
+    index.close()
+
+    # An injected memory manager belongs to the caller and stays open.
+    manager = VexMemoryManager()
+    components = VexComponents(config, personality_core=core, memory_manager=manager)
+    with TestClient(create_app(components)):
+        pass
+    assert components.memory_manager is manager